@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class HomeConfig(AppConfig):
     name = 'aplications.home'
+
+    def ready(self):
+        """ Medir las consultas de todas las conexiones para el MetricasMiddleware """
+        from django.db.backends.signals import connection_created # pylint: disable=import-outside-toplevel
+        from .metricas import instalar_medicion_sql # pylint: disable=import-outside-toplevel
+        connection_created.connect(instalar_medicion_sql, dispatch_uid='metricas_sql')
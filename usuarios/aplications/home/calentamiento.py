@@ -0,0 +1,123 @@
+""" Precarga de templates, urls y conexiones para evitar el costo de la primera peticion de cada worker.
+
+precargar() no abre conexiones y es segura antes del fork (gunicorn --preload);
+abrir_conexiones() debe correr en cada worker despues del fork (post_fork) y
+cerrar_conexiones() en el master, antes del fork, si este uso la base de datos.
+"""
+
+import re
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connections
+from django.template import engines
+from django.urls import NoReverseMatch, URLPattern, URLResolver, get_resolver, reverse
+
+NAMESPACES = ('users', 'home') # Rutas que se resuelven en el calentamiento
+
+Importacion = namedtuple('Importacion', ['modulo', 'nivel', 'propio_us', 'acumulado_us'])
+
+
+def compilar_templates():
+    """ Compila los templates de DIRS (templates/) de cada motor; el cached loader los conserva
+
+    Returns:
+        list: Nombres de los templates compilados.
+    """
+    compilados = []
+    for motor in engines.all():
+        for directorio in motor.dirs:
+            directorio = Path(directorio)
+            for archivo in sorted(directorio.rglob('*.html')):
+                nombre = archivo.relative_to(directorio).as_posix()
+                motor.get_template(nombre)
+                compilados.append(nombre)
+    return compilados
+
+
+def _rutas(patrones, prefijo=''):
+    """ Recorre el URLconf y retorna los nombres con namespace de las rutas sin argumentos """
+    for patron in patrones:
+        if isinstance(patron, URLResolver):
+            namespace = f'{prefijo}{patron.namespace}:' if patron.namespace else prefijo
+            yield from _rutas(patron.url_patterns, namespace)
+        elif isinstance(patron, URLPattern) and patron.name and not patron.pattern.regex.groups:
+            yield prefijo + patron.name
+
+
+def resolver_rutas(namespaces=NAMESPACES):
+    """ Construye el resolver y resuelve ida y vuelta cada ruta de los namespaces
+
+    Returns:
+        list: (nombre, path) de las rutas resueltas.
+    """
+    resolver = get_resolver()
+    resueltas = []
+    for nombre in _rutas(resolver.url_patterns):
+        if nombre.split(':', 1)[0] not in namespaces:
+            continue
+        try:
+            path = reverse(nombre) # Llena reverse_dict y el cache de namespaces
+        except NoReverseMatch: # Rutas con argumentos opcionales
+            continue
+        resolver.resolve(path) # Compila las expresiones regulares del camino
+        resueltas.append((nombre, path))
+    return resueltas
+
+
+def abrir_conexiones():
+    """ Abre una conexion (o el pool de psycopg) por cada alias de DATABASES
+
+    Returns:
+        dict: {alias: milisegundos en abrir la conexion}.
+    """
+    tiempos = {}
+    for alias in connections:
+        inicio = time.perf_counter()
+        connections[alias].ensure_connection()
+        tiempos[alias] = (time.perf_counter() - inicio) * 1000
+    return tiempos
+
+
+def cerrar_conexiones():
+    """ Cierra las conexiones del proceso y los pools de psycopg, con sus conexiones ociosas
+
+    connections.close_all() solo devuelve la conexion al pool; el pool y sus sockets
+    seguirian abiertos y los workers los heredarian por fork.
+    """
+    connections.close_all()
+    for alias in connections:
+        # close_pool() no hace nada sin OPTIONS['pool'] y un pool sin abrir no tiene sockets
+        if connections[alias].vendor == 'postgresql':
+            connections[alias].close_pool()
+
+
+def precargar():
+    """ Todo lo que se puede hacer antes del fork: templates y urls, sin conexiones """
+    compilar_templates()
+    resolver_rutas()
+
+
+def medir_importaciones(modulo='usuarios.wsgi'):
+    """Importa el modulo en un proceso nuevo con -X importtime y retorna el costo por modulo.
+
+    Returns:
+        list: Importacion(modulo, nivel, propio_us, acumulado_us) ordenadas por tiempo acumulado;
+        nivel 0 son las importaciones de primer nivel, cuya suma es el tiempo total.
+    """
+    codigo = f'import django; django.setup(); import {modulo}'
+    proceso = subprocess.run([sys.executable, '-X', 'importtime', '-c', codigo], cwd=settings.BASE_DIR,
+                             capture_output=True, text=True, check=True)
+    patron = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$')
+    importaciones = []
+    for linea in proceso.stderr.splitlines():
+        coincidencia = patron.match(linea)
+        if coincidencia:
+            propio, acumulado, sangria, nombre = coincidencia.groups()
+            nivel = len(sangria) // 2 # importtime sangra dos espacios por nivel
+            importaciones.append(Importacion(nombre, nivel, int(propio), int(acumulado)))
+    return sorted(importaciones, key=lambda i: i.acumulado_us, reverse=True)
@@ -0,0 +1,340 @@
+""" Metricas por peticion en formato de texto de Prometheus, sin dependencias externas.
+
+Cada proceso acumula los incrementos en memoria y los vuelca cada METRICAS_VOLCADO
+segundos a la cache compartida (METRICAS_CACHE) con incr atomicos. /metrics lee los
+totales de la cache, asi que cualquier worker de gunicorn responde con los de todos
+los procesos, incluido el worker de correos (enviar_correos).
+"""
+
+import hashlib
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+
+# Buckets por defecto de los clientes oficiales de Prometheus (segundos)
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100)
+MICRO = 1000000 # Las sumas se guardan en millonesimas: incr de la cache solo acepta enteros
+
+# Tiempos de la peticion en curso, None fuera del MetricasMiddleware
+tiempos_actuales = ContextVar('tiempos_actuales', default=None)
+
+
+class Tiempos:
+    """ Tiempos acumulados de una peticion: {nombre: [segundos, cantidad]} """
+
+    __slots__ = ('valores',)
+
+    def __init__(self):
+        """ Constructor sin tiempos registrados """
+        self.valores = {}
+
+    def sumar(self, nombre, segundos, cantidad=1):
+        """ Suma una medicion al componente nombre """
+        valor = self.valores.setdefault(nombre, [0.0, 0])
+        valor[0] += segundos
+        valor[1] += cantidad
+
+    def segundos(self, nombre)-> float:
+        """ Segundos acumulados del componente """
+        return self.valores.get(nombre, (0.0, 0))[0]
+
+    def cantidad(self, nombre)-> int:
+        """ Mediciones acumuladas del componente """
+        return self.valores.get(nombre, (0.0, 0))[1]
+
+
+
+def medir_sql(execute, sql, params, many, context):
+    """ Wrapper de ejecucion que suma cada consulta a la peticion en curso
+
+    Se instala en cada conexion (ver instalar_medicion_sql) en lugar de usar
+    connection.execute_wrapper por peticion: en las vistas async las consultas corren
+    en el hilo de sync_to_async, con otra conexion, pero con el mismo contexto.
+    """
+    tiempos = tiempos_actuales.get()
+    if tiempos is None: # Fuera de una peticion (comandos, workers)
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        tiempos.sumar('sql', time.perf_counter() - inicio)
+
+
+def instalar_medicion_sql(sender, connection, **kwargs):
+    """ Receptor de connection_created: agrega medir_sql a la conexion una sola vez """
+    if medir_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.append(medir_sql)
+
+
+@contextmanager
+def medir(nombre, histograma=None):
+    """Mide el bloque y lo suma a la peticion en curso y al histograma dado.
+
+    Ejemplo:
+        with medir('correo', CORREO_SEGUNDOS):
+            mensaje.send()
+    """
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        segundos = time.perf_counter() - inicio
+        tiempos = tiempos_actuales.get()
+        if tiempos is not None:
+            tiempos.sumar(nombre, segundos)
+        if histograma is not None:
+            histograma.observar(segundos)
+
+
+def escapar(valor)-> str:
+    """ Escapa barras, comillas y saltos de linea en el valor de una etiqueta """
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _cache():
+    """ Cache donde se acumulan las metricas de todos los procesos (METRICAS_CACHE) """
+    return caches[settings.METRICAS_CACHE]
+
+
+def _incrementar(cache, clave, delta):
+    """ Suma delta a un contador de cache sin expiracion, creandolo si no existe """
+    try:
+        cache.incr(clave, delta)
+    except ValueError: # Primera vez que se vuelca la serie
+        cache.add(clave, 0, timeout=None)
+        cache.incr(clave, delta)
+
+
+class Metrica:
+    """Base de las metricas con etiquetas.
+
+    series guarda, bajo un lock por metrica, lo acumulado por este proceso desde el
+    ultimo volcado; los totales viven en la cache, una clave por serie y campo, y un
+    indice por metrica lista las series para leerlas en el scrape.
+    """
+
+    tipo = None
+    campos = ('',) # Sufijos de las claves de cada serie en la cache
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        """ Registra la metrica en el REGISTRO global """
+        self.nombre, self.ayuda, self.etiquetas = nombre, ayuda, tuple(etiquetas)
+        self.series = {} # {valores de etiquetas: estado pendiente de volcar}
+        self.conocidas = set() # Series que este proceso debe ver en el indice
+        self.lock = threading.Lock()
+        REGISTRO.append(self)
+
+    def formatear_etiquetas(self, valores, extra=''):
+        """ Retorna {a="x",b="y"} escapando comillas y barras """
+        pares = [f'{k}="{escapar(v)}"' for k, v in zip(self.etiquetas, valores)]
+        if extra:
+            pares.append(extra)
+        return '{' + ','.join(pares) + '}' if pares else ''
+
+    def clave(self, valores, campo='')-> str:
+        """ Clave de cache de un campo de la serie; las etiquetas se hashean para memcached/redis """
+        serie = hashlib.sha256(json.dumps(valores).encode()).hexdigest()[:32]
+        return f'metricas:{self.nombre}:{serie}{campo}'
+
+    @property
+    def clave_indice(self)-> str:
+        """ Clave de cache con la lista de series de la metrica """
+        return f'metricas:{self.nombre}:series'
+
+    def volcar(self, cache):
+        """ Suma a la cache lo acumulado desde el ultimo volcado y completa el indice """
+        with self.lock:
+            pendientes, self.series = self.series, {}
+            self.conocidas.update(pendientes)
+            conocidas = set(self.conocidas)
+        for valores, estado in pendientes.items():
+            self.escribir(cache, valores, estado)
+        if not conocidas:
+            return
+        indice = {tuple(valores) for valores in cache.get(self.clave_indice, [])}
+        if not conocidas <= indice:
+            # get + set no es atomico: si otro proceso pisa el indice se completa en el proximo volcado
+            cache.set(self.clave_indice, sorted(indice | conocidas), timeout=None)
+
+    def escribir(self, cache, valores, estado):
+        """ Suma el estado acumulado a los campos de la serie """
+        for campo, delta in zip(self.campos, self.deltas(estado)):
+            if delta:
+                _incrementar(cache, self.clave(valores, campo), delta)
+
+    def deltas(self, estado)-> list:
+        """ Incrementos enteros por campo a partir del estado en memoria """
+        return [estado]
+
+    def leer(self, cache)-> dict:
+        """ Totales de todos los procesos: {valores de etiquetas: estado} """
+        series = [tuple(valores) for valores in cache.get(self.clave_indice, [])]
+        claves = {valores: [self.clave(valores, campo) for campo in self.campos] for valores in series}
+        guardados = cache.get_many([clave for lista in claves.values() for clave in lista])
+        return {valores: self.estado([guardados.get(clave, 0) for clave in lista])
+                for valores, lista in claves.items()}
+
+    def estado(self, guardados):
+        """ Estado de la serie a partir de los valores guardados por campo """
+        return guardados[0]
+
+    def lineas(self, cache):
+        """ Lineas de exposicion de la metrica """
+        yield f'# HELP {self.nombre} {self.ayuda}'
+        yield f'# TYPE {self.nombre} {self.tipo}'
+        for valores, estado in sorted(self.leer(cache).items()):
+            yield from self.lineas_serie(valores, estado)
+
+
+class Contador(Metrica):
+    """ Contador monotono """
+
+    tipo = 'counter'
+
+    def sumar(self, *valores, cantidad=1):
+        """ Suma cantidad a la serie de las etiquetas dadas """
+        with self.lock:
+            self.series[valores] = self.series.get(valores, 0) + cantidad
+
+    def lineas_serie(self, valores, estado):
+        """ Una linea por serie """
+        yield f'{self.nombre}{self.formatear_etiquetas(valores)} {estado}'
+
+
+class ContadorCompartido(Contador):
+    """ Contador cuyo total ya lo mantiene otro modulo en la cache compartida
+
+    leer_totales() retorna {valores de etiquetas: total} y se llama en cada scrape; la
+    metrica no acumula nada en el proceso.
+    """
+
+    def __init__(self, nombre, ayuda, etiquetas, leer):
+        """ Registra la metrica con la funcion que lee los totales """
+        super().__init__(nombre, ayuda, etiquetas)
+        self.leer_totales = leer
+
+    def leer(self, cache)-> dict:
+        """ Totales actuales segun el modulo que los mantiene """
+        return dict(self.leer_totales())
+
+
+class Medidor(Metrica):
+    """ Valor que sube y baja (gauge), fijado por quien lo mide; en la cache queda el ultimo volcado """
+
+    tipo = 'gauge'
+
+    def fijar(self, valor, *valores):
+        """ Fija el valor de la serie de las etiquetas dadas """
+        with self.lock:
+            self.series[valores] = valor
+
+    def escribir(self, cache, valores, estado):
+        """ Reemplaza el valor guardado en lugar de sumarlo """
+        cache.set(self.clave(valores), estado, timeout=None)
+
+    def lineas_serie(self, valores, estado):
+        """ Una linea por serie """
+        yield f'{self.nombre}{self.formatear_etiquetas(valores)} {estado}'
+
+
+class Histograma(Metrica):
+    """ Histograma acumulado con buckets fijos """
+
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_SEGUNDOS):
+        """ Constructor con los limites superiores de los buckets """
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(buckets)
+        # Un campo por bucket (el ultimo es +Inf) y uno para la suma
+        self.campos = tuple(f':{indice}' for indice in range(len(self.buckets) + 1)) + (':suma',)
+
+    def observar(self, valor, *valores):
+        """ Registra una observacion en la serie de las etiquetas dadas """
+        indice = bisect_left(self.buckets, valor) # Primer bucket con limite >= valor
+        with self.lock:
+            estado = self.series.get(valores)
+            if estado is None:
+                # [conteos por bucket (el ultimo es +Inf), suma]
+                estado = self.series[valores] = [[0] * (len(self.buckets) + 1), 0.0]
+            estado[0][indice] += 1
+            estado[1] += valor
+
+    def deltas(self, estado)-> list:
+        """ Conteos por bucket y la suma en millonesimas """
+        return estado[0] + [round(estado[1] * MICRO)]
+
+    def estado(self, guardados):
+        """ [conteos por bucket, suma] """
+        return [guardados[:-1], guardados[-1] / MICRO]
+
+    def lineas_serie(self, valores, estado):
+        """ Buckets acumulados, suma y cantidad """
+        conteos, suma = estado
+        acumulado = 0
+        for limite, conteo in zip(self.buckets + ('+Inf',), conteos):
+            acumulado += conteo
+            le = f'le="{limite}"'
+            yield f'{self.nombre}_bucket{self.formatear_etiquetas(valores, le)} {acumulado}'
+        yield f'{self.nombre}_sum{self.formatear_etiquetas(valores)} {suma}'
+        yield f'{self.nombre}_count{self.formatear_etiquetas(valores)} {acumulado}'
+
+
+REGISTRO = [] # Metricas expuestas en /metrics
+
+PETICIONES = Contador('usuarios_http_peticiones_total', 'Peticiones atendidas por vista, metodo y estado.',
+                      ('vista', 'metodo', 'estado'))
+PETICION_SEGUNDOS = Histograma('usuarios_http_peticion_segundos', 'Tiempo total de la vista incluido el render.',
+                               ('vista', 'metodo'))
+SQL_SEGUNDOS = Histograma('usuarios_http_sql_segundos', 'Tiempo en consultas SQL por peticion.', ('vista',))
+SQL_CONSULTAS = Histograma('usuarios_http_sql_consultas', 'Consultas SQL por peticion.', ('vista',),
+                           buckets=BUCKETS_CONSULTAS)
+TEMPLATE_SEGUNDOS = Histograma('usuarios_http_template_segundos', 'Tiempo de render del template por peticion.',
+                               ('vista',))
+CORREO_SEGUNDOS = Histograma('usuarios_correo_segundos', 'Tiempo de envio SMTP por correo (worker enviar_correos).')
+DISPONIBILIDAD_CONSULTAS = Contador('usuarios_disponibilidad_consultas_total',
+                                    'Consultas de disponibilidad por campo y resultado del filtro de Bloom.',
+                                    ('campo', 'resultado'))
+DISPONIBILIDAD_FILTRO = Medidor('usuarios_disponibilidad_filtro',
+                                'Estado del filtro de Bloom del ultimo proceso que lo volco (bytes, elementos, falsos positivos).',
+                                ('dato',))
+
+
+_volcado = {'ultimo': time.monotonic()} # Momento del ultimo volcado de este proceso
+_volcado_lock = threading.Lock()
+
+
+def toca_volcar()-> bool:
+    """ Indica si pasaron METRICAS_VOLCADO segundos desde el ultimo volcado """
+    return time.monotonic() - _volcado['ultimo'] >= settings.METRICAS_VOLCADO
+
+
+def volcar():
+    """ Vuelca a la cache lo acumulado por este proceso en todas las metricas
+
+    Si otro hilo ya esta volcando no se espera: lo acumulado sale en el proximo volcado.
+    """
+    if not _volcado_lock.acquire(blocking=False):
+        return
+    try:
+        _volcado['ultimo'] = time.monotonic()
+        cache = _cache()
+        for metrica in REGISTRO:
+            metrica.volcar(cache)
+    finally:
+        _volcado_lock.release()
+
+
+def exportar()-> str:
+    """ Texto de exposicion de Prometheus con los totales de todos los procesos """
+    volcar() # Incluir lo pendiente del proceso que responde
+    cache = _cache()
+    return '\n'.join(linea for metrica in REGISTRO for linea in metrica.lineas(cache)) + '\n'
@@ -0,0 +1,102 @@
+""" Middleware de instrumentacion por peticion (Server-Timing y metricas de Prometheus) """
+
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+
+from . import metricas
+
+
+class MetricasMiddleware:
+    """ Mide SQL, render del template y tiempo total de las vistas de METRICAS_NAMESPACES
+
+    Debe ir primero en MIDDLEWARE para que el tiempo total incluya al resto de los
+    middlewares. El costo por peticion es un perf_counter por consulta y unos pocos
+    incrementos bajo lock; cada METRICAS_VOLCADO segundos una peticion vuelca lo
+    acumulado a la cache compartida. Funciona en WSGI y en ASGI sin pasar por el
+    adaptador sync -> async.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        """ Constructor del middleware """
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        """ Mide la peticion y agrega la cabecera Server-Timing """
+        if self.es_async:
+            return self.__acall__(request)
+        tiempos = metricas.Tiempos()
+        token = metricas.tiempos_actuales.set(tiempos) # Las consultas se suman con medir_sql
+        inicio = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metricas.tiempos_actuales.reset(token)
+        response = self.completar(request, response, time.perf_counter() - inicio, tiempos)
+        if metricas.toca_volcar():
+            metricas.volcar()
+        return response
+
+    async def __acall__(self, request):
+        """ Version async de __call__ """
+        tiempos = metricas.Tiempos()
+        token = metricas.tiempos_actuales.set(tiempos) # sync_to_async copia el contexto
+        inicio = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metricas.tiempos_actuales.reset(token)
+        response = self.completar(request, response, time.perf_counter() - inicio, tiempos)
+        if metricas.toca_volcar():
+            await sync_to_async(metricas.volcar)() # I/O de cache fuera del event loop
+        return response
+
+    def completar(self, request, response, total, tiempos):
+        """ Registrar la peticion y agregar Server-Timing """
+        vista = self.nombre_vista(request)
+        if vista is None: # Admin, /metrics y 404 no se registran para acotar las series
+            return response
+        self.registrar(vista, request.method, response.status_code, total, tiempos)
+        if settings.METRICAS_SERVER_TIMING:
+            response['Server-Timing'] = self.server_timing(total, tiempos)
+        return response
+
+    def process_template_response(self, request, response):
+        """ Medir el render del TemplateResponse, que ocurre despues de este metodo """
+        tiempos = metricas.tiempos_actuales.get()
+        if tiempos is not None:
+            inicio = time.perf_counter()
+            response.add_post_render_callback(
+                lambda _: tiempos.sumar('template', time.perf_counter() - inicio))
+        return response
+
+    def nombre_vista(self, request):
+        """ Nombre de la url (users:login) o None si no pertenece a METRICAS_NAMESPACES """
+        match = getattr(request, 'resolver_match', None)
+        if match is None or match.namespace not in settings.METRICAS_NAMESPACES:
+            return None
+        return match.view_name
+
+    def registrar(self, vista, metodo, estado, total, tiempos):
+        """ Acumula la peticion en las metricas de Prometheus """
+        metricas.PETICIONES.sumar(vista, metodo, estado)
+        metricas.PETICION_SEGUNDOS.observar(total, vista, metodo)
+        metricas.SQL_SEGUNDOS.observar(tiempos.segundos('sql'), vista)
+        metricas.SQL_CONSULTAS.observar(tiempos.cantidad('sql'), vista)
+        if tiempos.cantidad('template'):
+            metricas.TEMPLATE_SEGUNDOS.observar(tiempos.segundos('template'), vista)
+
+    def server_timing(self, total, tiempos):
+        """ Valor de la cabecera Server-Timing en milisegundos """
+        partes = [f'sql;dur={tiempos.segundos("sql") * 1000:.1f};desc="{tiempos.cantidad("sql")} consultas"']
+        if tiempos.cantidad('template'):
+            partes.append(f'template;dur={tiempos.segundos("template") * 1000:.1f}')
+        partes.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(partes)
@@ -1,3 +1,64 @@
-from django.test import TestCase
+""" Tests de la aplicacion home """
 
-# Create your tests here.
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from . import metricas
+
+
+class MetricasViewTest(TestCase):
+    """ Acceso a /metrics """
+
+    def test_ip_permitida(self):
+        """ Sin proxy se compara REMOTE_ADDR """
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1').status_code, 200)
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='203.0.113.9').status_code, 403)
+
+    @override_settings(LOGIN_LIMITE_IP_HEADER='HTTP_X_FORWARDED_FOR', LOGIN_LIMITE_PROXIES=1)
+    def test_detras_del_proxy(self):
+        """ Con el proxy en 127.0.0.1 decide la IP que el proxy agrego, no REMOTE_ADDR """
+        respuesta = self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1',
+                                    HTTP_X_FORWARDED_FOR='127.0.0.1, 203.0.113.9')
+        self.assertEqual(respuesta.status_code, 403)
+        respuesta = self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1', HTTP_X_FORWARDED_FOR='127.0.0.1')
+        self.assertEqual(respuesta.status_code, 200)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                       'LOCATION': 'metricas-tests'}},
+                   METRICAS_CACHE='default')
+class MetricasCompartidasTest(SimpleTestCase):
+    """ Totales sumados en la cache entre procesos """
+
+    def setUp(self):
+        metricas.volcar() # Lo acumulado por otros tests no cuenta
+        caches['default'].clear()
+
+    def metrica(self, clase, *args, **kwargs):
+        """ Metrica fuera del REGISTRO, como la veria cada proceso """
+        metrica = clase(*args, **kwargs)
+        metricas.REGISTRO.remove(metrica)
+        return metrica
+
+    def test_contador_de_dos_procesos(self):
+        """ Cada proceso vuelca sus incrementos y cualquiera lee el total """
+        web = self.metrica(metricas.Contador, 'prueba_total', 'Prueba.', ('vista',))
+        worker = self.metrica(metricas.Contador, 'prueba_total', 'Prueba.', ('vista',))
+        web.sumar('a')
+        worker.sumar('a', cantidad=2)
+        worker.sumar('b')
+        web.volcar(caches['default'])
+        worker.volcar(caches['default'])
+        self.assertEqual(web.leer(caches['default']), {('a',): 3, ('b',): 1})
+        web.sumar('a')
+        web.volcar(caches['default'])
+        self.assertIn('prueba_total{vista="a"} 4', list(worker.lineas(caches['default'])))
+
+    def test_correos_del_worker_en_metrics(self):
+        """ Los tiempos SMTP observados por el worker salen en /metrics de la web """
+        metricas.CORREO_SEGUNDOS.observar(0.2)
+        metricas.volcar() # Volcado del worker de correos
+        respuesta = self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1')
+        self.assertIn('usuarios_correo_segundos_bucket{le="0.25"} 1', respuesta.content.decode())
+        self.assertIn('usuarios_correo_segundos_sum 0.2', respuesta.content.decode())
@@ -1,7 +1,13 @@
 """ Vista para la pagina de inicio """
 
 
-from django.views.generic import TemplateView
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.generic import TemplateView, View
+
+from aplications.users.limitador import ip_cliente
+
+from .metricas import exportar
 # Create your views here.
 
 
@@ -11,3 +17,15 @@ class HomePageView(TemplateView):
     template_name = "home/index.html"
 
 
+class MetricasView(View):
+    """ Vista con las metricas en formato de texto de Prometheus """
+
+    def get(self, request):
+        """ Solo las IPs de METRICAS_IPS pueden leer las metricas
+
+        Detras del proxy REMOTE_ADDR es el proxy (127.0.0.1 en produccion): se compara la
+        IP del cliente que resuelve ip_cliente, la misma del limite de logins.
+        """
+        if ip_cliente(request) not in settings.METRICAS_IPS:
+            return HttpResponseForbidden()
+        return HttpResponse(exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,11 +1,39 @@
 """ Admin de la aplicacion users """
 
 from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
 
-from .models import User
+from django.db.models import Count
+
+from .busqueda import buscar_usuarios
+from .paginacion import PaginadorEstimado
+from .models import User, ContadorUsuarios, CorreoPendiente
 # Register your models here.
 
 
+class BusquedaChangeList(ChangeList):
+    """ ChangeList que conserva el orden por relevancia de la busqueda
+
+    ChangeList ordena con get_ordering (ordering del admin y -pk); con una busqueda
+    y sin columna elegida en el changelist se vuelve a ordenar por el rango.
+    """
+
+    def por_relevancia(self)-> bool:
+        """ Hay busqueda y el usuario no eligio una columna para ordenar """
+        return bool(self.query) and not self.params.get(ORDER_VAR)
+
+    def get_queryset(self, request, exclude_parameters=None):
+        """ Queryset del changelist, ordenado por rango cuando hay busqueda """
+        queryset = super().get_queryset(request, exclude_parameters)
+        if self.por_relevancia() and 'rango' in queryset.query.annotations:
+            return queryset.order_by('-rango', 'username')
+        return queryset
+
+    def get_ordering_field_columns(self):
+        """ Ordenando por relevancia ninguna columna aparece como ordenada """
+        return {} if self.por_relevancia() else super().get_ordering_field_columns()
+
+
 @admin.register(User)
 class UserAdmin(admin.ModelAdmin):
     """ Configuracion del admin para el modelo User """
@@ -14,6 +42,9 @@ class UserAdmin(admin.ModelAdmin):
     search_fields = ('username', 'email', 'nombres', 'apellidos')
     list_filter = ('genero', 'is_active', 'is_staff', 'is_superuser')
     ordering = ('username',)
+    paginator = PaginadorEstimado # Total estimado sobre PAGINACION_UMBRAL filas
+    show_full_result_count = False # Sin el segundo COUNT(*) de toda la tabla al filtrar o buscar
+    show_facets = admin.ShowFacets.NEVER # ?_facets= haria un COUNT exacto por cada opcion de list_filter
     fieldsets = (
         (None, {
             'fields': ('username', 'email', 'password')
@@ -24,4 +55,47 @@ class UserAdmin(admin.ModelAdmin):
         ('Permisos', {
             'fields': ('is_active', 'is_staff', 'is_superuser')
         }),
-    )
\ No newline at end of file
+    )
+
+    def get_changelist(self, request, **kwargs):
+        """ Changelist que ordena las busquedas por relevancia """
+        return BusquedaChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        """ Buscar con los indices trigram (PostgreSQL) o FTS5 (SQLite) en lugar de cuatro icontains """
+        if not search_term:
+            return queryset, False
+        resultados = buscar_usuarios(search_term, queryset) # Ordenados por relevancia (BusquedaChangeList)
+        if ORDER_VAR in request.GET: # Respetar la columna elegida en el changelist
+            resultados = resultados.order_by(*queryset.query.order_by)
+        return resultados, False
+
+    def save_model(self, request, obj, form, change):
+        """ Guardar el usuario y mantener los contadores por estado y genero """
+        antes = (form.initial.get('is_active'), form.initial.get('genero')) if change else None
+        super().save_model(request, obj, form, change)
+        if antes != (obj.is_active, obj.genero):
+            if antes is not None: # Restar del contador anterior
+                ContadorUsuarios.objects.ajustar(antes[0], antes[1], -1)
+            ContadorUsuarios.objects.ajustar(obj.is_active, obj.genero, 1) # Sumar al contador nuevo
+
+    def delete_model(self, request, obj):
+        """ Eliminar el usuario y restarlo de su contador """
+        super().delete_model(request, obj)
+        ContadorUsuarios.objects.ajustar(obj.is_active, obj.genero, -1)
+
+    def delete_queryset(self, request, queryset):
+        """ Eliminar varios usuarios y restarlos de sus contadores """
+        grupos = list(queryset.order_by().values('is_active', 'genero').annotate(total=Count('id')))
+        super().delete_queryset(request, queryset)
+        for grupo in grupos:
+            ContadorUsuarios.objects.ajustar(grupo['is_active'], grupo['genero'], -grupo['total'])
+
+@admin.register(CorreoPendiente)
+class CorreoPendienteAdmin(admin.ModelAdmin):
+    """ Configuracion del admin para la cola de correos """
+
+    list_display = ('asunto', 'destinatario', 'estado', 'intentos', 'proximo_intento', 'enviado')
+    list_filter = ('estado',)
+    search_fields = ('destinatario',)
+    ordering = ('-creado',)
@@ -0,0 +1,87 @@
+""" Backend de autenticacion con cache del usuario autenticado. """
+
+import time
+
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+from django.db import transaction
+
+from .models import User
+
+# Campos del registro liviano; password queda diferido y se carga solo si se usa
+CAMPOS_CACHE = ('id', 'username', 'email', 'nombres', 'apellidos', 'genero',
+                'is_active', 'is_staff', 'is_superuser', 'last_login', 'date_joined')
+
+_local = {} # Cache local del proceso: {user_id: (expira, datos)}
+
+
+def _clave(user_id)-> str:
+    """ Clave del usuario en la cache compartida """
+    return f'auth:usuario:{user_id}'
+
+
+def _guardar_local(user_id, datos):
+    """ Guarda el registro en la cache local, acotando su tamaño """
+    if len(_local) >= settings.AUTH_CACHE_LOCAL_MAX: # Vaciar si crecio demasiado
+        _local.clear()
+    _local[user_id] = (time.monotonic() + settings.AUTH_CACHE_LOCAL_TIMEOUT, datos)
+
+
+def _leer_local(user_id):
+    """ Retorna el registro de la cache local si no expiro """
+    entrada = _local.get(user_id)
+    if entrada and entrada[0] > time.monotonic():
+        return entrada[1]
+    return None
+
+
+def invalidar_usuarios(*ids, using=None):
+    """Elimina usuarios de la cache local y de la compartida despues del commit.
+
+    Antes del commit una peticion concurrente puede volver a leer la fila vieja (de la
+    replica o de la primaria sin el cambio) y guardarla otra vez con su session_auth_hash.
+    Fuera de una transaccion se elimina en el momento.
+    """
+    def invalidar():
+        for user_id in ids:
+            _local.pop(user_id, None)
+        caches[settings.AUTH_CACHE].delete_many([_clave(user_id) for user_id in ids])
+    transaction.on_commit(invalidar, using=using)
+
+
+def _registro(usuario)-> dict:
+    """ Registro liviano del usuario, con el hash de sesion en lugar del hash de la contraseña """
+    datos = {campo: getattr(usuario, campo) for campo in CAMPOS_CACHE}
+    datos['session_auth_hash'] = usuario.get_session_auth_hash()
+    return datos
+
+
+def _instancia(datos):
+    """ Reconstruye un User con los campos de la cache (password queda diferido) """
+    # from_db espera los valores en el orden de los campos del modelo
+    campos = [f.attname for f in User._meta.concrete_fields if f.attname in datos]
+    usuario = User.from_db(User.objects.db, campos, [datos[campo] for campo in campos])
+    session_auth_hash = datos['session_auth_hash']
+    usuario.session_auth_hash_cache = session_auth_hash
+    return usuario
+
+
+class UsuarioCacheBackend(ModelBackend):
+    """ ModelBackend cuyo get_user lee primero la cache local, luego la compartida y al final la BD """
+
+    def get_user(self, user_id):
+        """ Retorna el usuario autenticado sin consultar la base de datos si esta en cache """
+        datos = _leer_local(user_id)
+        if datos is None:
+            datos = caches[settings.AUTH_CACHE].get(_clave(user_id))
+            if datos is None:
+                try:
+                    usuario = User._default_manager.get(pk=user_id)
+                except User.DoesNotExist:
+                    return None
+                datos = _registro(usuario)
+                caches[settings.AUTH_CACHE].set(_clave(user_id), datos, settings.AUTH_CACHE_TIMEOUT)
+            _guardar_local(user_id, datos)
+        usuario = _instancia(datos)
+        return usuario if self.user_can_authenticate(usuario) else None
@@ -0,0 +1,64 @@
+""" Archivo para la busqueda de usuarios por subcadena con indices trigram. """
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, When, Value, Q, FloatField
+from django.db.models.functions import Greatest
+
+from .models import User
+
+CAMPOS_BUSQUEDA = ('username', 'email', 'nombres', 'apellidos')
+
+
+def _filtro_icontains(q):
+    """ OR de icontains sobre los campos de busqueda """
+    filtro = Q()
+    for campo in CAMPOS_BUSQUEDA:
+        filtro |= Q(**{f'{campo}__icontains': q})
+    return filtro
+
+
+def _buscar_postgresql(q, queryset):
+    """ icontains (UPPER(col::text) LIKE) sobre los indices GIN trigram de esa expresion, ordenado por similitud """
+    from django.contrib.postgres.search import TrigramWordSimilarity # pylint: disable=import-outside-toplevel
+    rango = Greatest(*[TrigramWordSimilarity(q, campo) for campo in CAMPOS_BUSQUEDA])
+    return queryset.filter(_filtro_icontains(q)).annotate(rango=rango).order_by('-rango', 'username')
+
+
+def _buscar_sqlite(q, queryset, limite):
+    """ MATCH sobre la tabla FTS5 trigram, ordenado por bm25 """
+    if len(q) < 3: # El tokenizer trigram necesita al menos tres caracteres
+        return queryset.filter(_filtro_icontains(q)).annotate(rango=Value(0.0)).order_by('username')
+    consulta = '"' + q.replace('"', '""') + '"' # Buscar la subcadena literal
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute(
+            'SELECT rowid FROM users_user_fts WHERE users_user_fts MATCH %s ORDER BY rank LIMIT %s',
+            [consulta, limite],
+        )
+        ids = [fila[0] for fila in cursor.fetchall()]
+    # Conservar el orden de bm25 en el queryset
+    rango = Case(*[When(id=id_, then=Value(float(-posicion))) for posicion, id_ in enumerate(ids)],
+                 default=Value(float('-inf')), output_field=FloatField())
+    return queryset.filter(id__in=ids).annotate(rango=rango).order_by('-rango')
+
+
+def buscar_usuarios(q, queryset=None, limite=None):
+    """Busca usuarios por subcadena en username, email, nombres y apellidos.
+
+    Args:
+        q (str): Texto a buscar.
+        queryset (QuerySet): Queryset sobre el cual buscar. Por defecto todos los usuarios.
+        limite (int): Maximo de resultados en SQLite. Por defecto BUSQUEDA_LIMITE.
+    Returns:
+        QuerySet: Usuarios que coinciden, ordenados por relevancia (anotados con rango).
+    """
+    queryset = User.objects.all() if queryset is None else queryset
+    q = (q or '').strip()
+    if not q:
+        return queryset
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        return _buscar_postgresql(q, queryset)
+    if vendor == 'sqlite':
+        return _buscar_sqlite(q, queryset, limite or settings.BUSQUEDA_LIMITE)
+    return queryset.filter(_filtro_icontains(q)).annotate(rango=Value(0.0)).order_by('username')
@@ -0,0 +1,108 @@
+""" Archivo para el envio de correos encolados en el outbox. """
+
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+from aplications.home.metricas import CORREO_SEGUNDOS, medir
+
+from .models import CorreoPendiente
+
+
+class ResultadoLote(namedtuple('ResultadoLote', ['enviados', 'fallidos', 'segundos'])):
+    """ Resultado del envio de un lote de correos """
+
+    @property
+    def por_segundo(self)-> float:
+        """ Correos enviados por segundo en el lote """
+        return self.enviados / self.segundos if self.segundos else 0.0
+
+
+def encolar_codigo_verificador(user, codigo, remitente):
+    """Encola el correo con el codigo verificador de un usuario recien registrado.
+
+    Debe llamarse dentro de la misma transaccion que guarda al usuario para que
+    el correo exista si y solo si el usuario existe.
+    """
+    return CorreoPendiente.objects.encolar(
+        'Codigo Verificador', # Asunto del correo
+        f'Tu codigo verificador es: {codigo}', # Mensaje del correo
+        remitente, # Correo remitente
+        user.email, # Correo destinatario
+    )
+
+
+def hay_lote_listo(lote, ultimo_envio, flush):
+    """Indica si conviene enviar ahora: hay un lote completo o vencio el flush.
+
+    Args:
+        lote (int): Tamaño del lote.
+        ultimo_envio (float): time.monotonic() del ultimo envio.
+        flush (float): Segundos maximos que un correo espera a completar un lote.
+    Returns:
+        bool: True si hay correos y el lote esta completo o vencio el flush.
+    """
+    # Conteo acotado al tamaño del lote, no recorre toda la cola
+    listos = CorreoPendiente.objects.pendientes().order_by()[:lote].count()
+    if not listos: # Sin correos no hay nada que enviar
+        return False
+    return listos >= lote or time.monotonic() - ultimo_envio >= flush
+
+
+def enviar_por_conexion(mensajes, connection):
+    """Envia los mensajes por una conexion ya abierta, uno a uno.
+
+    Args:
+        mensajes (list): Lista de (id, EmailMessage).
+        connection: Backend de correo abierto.
+    Returns:
+        tuple: (ids enviados, lista de (id, error)).
+    """
+    enviados, errores = [], []
+    for id_, mensaje in mensajes:
+        mensaje.connection = connection # Reutilizar la conexion abierta
+        try:
+            with medir('correo', CORREO_SEGUNDOS): # Tiempo SMTP; el worker lo vuelca a /metrics
+                mensaje.send(fail_silently=False) # Enviar el correo
+        except Exception as e: # pylint: disable=broad-except
+            errores.append((id_, str(e)))
+        else:
+            enviados.append(id_)
+    return enviados, errores
+
+
+def despachar_pendientes(lote=None):
+    """Reserva un lote de correos pendientes y lo envia por una sola conexion.
+
+    Args:
+        lote (int): Numero maximo de correos a reservar. Por defecto CORREOS_LOTE.
+    Returns:
+        ResultadoLote: enviados, fallidos y segundos del lote procesado.
+    """
+    lote = lote or settings.CORREOS_LOTE # Tamaño del lote
+    bloqueo = timedelta(seconds=settings.CORREOS_BLOQUEO) # Tiempo de reserva de cada correo
+    correos = CorreoPendiente.objects.reclamar(lote, bloqueo) # Reservar los correos del lote
+    if not correos: # Sin correos no se abre conexion
+        return ResultadoLote(0, 0, 0.0)
+
+    inicio = time.perf_counter()
+    mensajes = [(c.id, EmailMessage(c.asunto, c.mensaje, c.remitente, [c.destinatario])) for c in correos]
+    try:
+        # Una sola conexion (y un solo handshake STARTTLS) para todo el lote
+        with get_connection(fail_silently=False) as connection:
+            enviados, errores = enviar_por_conexion(mensajes, connection)
+    except Exception as e: # pylint: disable=broad-except
+        # No se pudo abrir la conexion: todo el lote se reintenta
+        enviados, errores = [], [(c.id, str(e)) for c in correos]
+
+    CorreoPendiente.objects.marcar_enviados(enviados) # Marcar los enviados en una sola consulta
+    por_id = {c.id: c for c in correos}
+    for id_, error in errores:
+        # Reprogramar el correo con backoff o marcarlo como fallido
+        CorreoPendiente.objects.marcar_fallido(por_id[id_], error,
+                                               settings.CORREOS_MAX_INTENTOS,
+                                               settings.CORREOS_BACKOFF)
+    return ResultadoLote(len(enviados), len(errores), time.perf_counter() - inicio)
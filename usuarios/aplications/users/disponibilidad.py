@@ -0,0 +1,208 @@
+""" Disponibilidad de username y email con un filtro de Bloom en memoria.
+
+El filtro guarda los usernames y emails en minusculas de todo el directorio. Si dice
+que un valor no esta, esta libre sin consultar la base de datos; solo un probable
+acierto se confirma con una consulta. La respuesta es orientativa: al registrar, las
+restricciones unicas de User siguen siendo las que deciden.
+
+Cada proceso agrega sus propias altas y cambios al guardar, y cada
+DISPONIBILIDAD_REFRESCO segundos las altas de otros procesos por id. Ese recorrido
+no ve un id menor que confirmo tarde ni un email cambiado en otro proceso; por eso
+el filtro se reconstruye completo cada DISPONIBILIDAD_RECONSTRUCCION segundos.
+"""
+
+import hashlib
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.db.models.functions import Lower
+
+from aplications.home import metricas
+
+from .models import User
+
+CAMPOS_DISPONIBILIDAD = ('username', 'email') # Campos que se pueden consultar
+TAMANO_LOTE = 2000 # Filas por vez en el recorrido del directorio
+
+
+class FiltroBloom:
+    """ Filtro de Bloom sobre un bytearray: sin falsos negativos y con falsos positivos acotados """
+
+    def __init__(self, capacidad, falsos_positivos):
+        """Dimensiona el filtro.
+
+        Args:
+            capacidad (int): Elementos esperados.
+            falsos_positivos (float): Tasa de falsos positivos con la capacidad llena.
+        """
+        self.capacidad = capacidad
+        # m = -n ln p / (ln 2)^2 bits y k = m/n ln 2 funciones de hash
+        self.bits = max(8, math.ceil(-capacidad * math.log(falsos_positivos) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.bits / capacidad * math.log(2)))
+        self.arreglo = bytearray((self.bits + 7) // 8)
+        self.elementos = 0
+        self.lock = threading.Lock() # Dos hilos pueden escribir el mismo byte
+
+    def posiciones(self, valor):
+        """ Las k posiciones del valor, por doble hashing sobre un solo blake2b """
+        digest = hashlib.blake2b(valor.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def agregar(self, valor):
+        """ Agrega el valor al filtro """
+        posiciones = self.posiciones(valor)
+        with self.lock:
+            for posicion in posiciones:
+                self.arreglo[posicion >> 3] |= 1 << (posicion & 7)
+            self.elementos += 1
+
+    def __contains__(self, valor):
+        """ False si el valor seguro no esta; True si probablemente esta """
+        arreglo = self.arreglo
+        return all(arreglo[posicion >> 3] & (1 << (posicion & 7)) for posicion in self.posiciones(valor))
+
+    def tasa_falsos_positivos(self)-> float:
+        """ Tasa de falsos positivos estimada con los elementos actuales """
+        return (1 - math.exp(-self.hashes * self.elementos / self.bits)) ** self.hashes
+
+    def estadisticas(self)-> dict:
+        """ Memoria, elementos y falsos positivos estimados, para reportar """
+        return {
+            'bytes': len(self.arreglo),
+            'bits': self.bits,
+            'hashes': self.hashes,
+            'capacidad': self.capacidad,
+            'elementos': self.elementos,
+            'falsos_positivos': self.tasa_falsos_positivos(),
+        }
+
+
+class Directorio:
+    """ Filtro del proceso y la posicion del ultimo recorrido del directorio """
+
+    def __init__(self, filtro, ultimo_id):
+        """ Estado inicial despues de construir el filtro """
+        self.filtro = filtro
+        self.ultimo_id = ultimo_id # Mayor id recorrido, los siguientes se agregan al refrescar
+        self.construido = self.refrescado = time.monotonic()
+        self.lock = threading.Lock() # Un solo refresco a la vez
+
+
+_directorio = None # Se construye en el master de gunicorn (when_ready) o en la primera consulta
+_lock_construir = threading.Lock()
+
+
+def clave(campo, valor)-> str:
+    """ Clave del valor en el filtro, en minusculas y con el campo como prefijo """
+    return f'{campo}:{valor.lower()}'
+
+
+def recorrer(filtro, desde_id=0):
+    """ Agrega al filtro los usuarios con id mayor a desde_id y retorna el mayor id visto """
+    ultimo_id = desde_id
+    usuarios = (User.objects.lectura().filter(pk__gt=desde_id).order_by('pk')
+                .values_list('pk', 'username', 'email'))
+    for pk, username, email in usuarios.iterator(chunk_size=TAMANO_LOTE): # Sin instancias ni listas en memoria
+        filtro.agregar(clave('username', username))
+        filtro.agregar(clave('email', email))
+        ultimo_id = pk
+    return ultimo_id
+
+
+def reportar(filtro):
+    """ Publica memoria, elementos y falsos positivos estimados en /metrics """
+    for dato, valor in filtro.estadisticas().items():
+        metricas.DISPONIBILIDAD_FILTRO.fijar(valor, dato)
+
+
+def construir(capacidad=None)-> FiltroBloom:
+    """Construye el filtro con un recorrido en streaming de todo el directorio.
+
+    Args:
+        capacidad (int): Elementos esperados, por defecto DISPONIBILIDAD_CAPACIDAD.
+    Returns:
+        FiltroBloom: El filtro nuevo, que reemplaza al anterior del proceso.
+    """
+    global _directorio # pylint: disable=global-statement
+    filtro = FiltroBloom(capacidad or settings.DISPONIBILIDAD_CAPACIDAD, settings.DISPONIBILIDAD_FALSOS_POSITIVOS)
+    _directorio = Directorio(filtro, recorrer(filtro))
+    reportar(filtro)
+    return filtro
+
+
+def directorio()-> Directorio:
+    """ Directorio del proceso, construyendolo en la primera consulta si no se hizo al arrancar """
+    if _directorio is None:
+        with _lock_construir:
+            if _directorio is None:
+                construir()
+    return _directorio
+
+
+def refrescar(estado):
+    """Agrega los usuarios creados por otros procesos cada DISPONIBILIDAD_REFRESCO segundos.
+
+    Los creados en este proceso ya se agregan con agregar_usuario. Si el filtro paso
+    su capacidad se reconstruye con el doble, para no degradar la tasa de falsos positivos,
+    y pasados DISPONIBILIDAD_RECONSTRUCCION segundos se reconstruye completo.
+
+    Returns:
+        Directorio: El vigente despues del refresco, nuevo si se reconstruyo.
+    """
+    if time.monotonic() - estado.refrescado < settings.DISPONIBILIDAD_REFRESCO:
+        return estado
+    if not estado.lock.acquire(blocking=False): # Otro hilo ya esta refrescando
+        return estado
+    try:
+        if estado.filtro.elementos > estado.filtro.capacidad:
+            construir(estado.filtro.capacidad * 2)
+            return _directorio
+        if time.monotonic() - estado.construido >= settings.DISPONIBILIDAD_RECONSTRUCCION:
+            construir(estado.filtro.capacidad) # Ids confirmados fuera de orden y emails cambiados
+            return _directorio
+        estado.ultimo_id = recorrer(estado.filtro, estado.ultimo_id)
+        estado.refrescado = time.monotonic()
+        reportar(estado.filtro)
+        return estado
+    finally:
+        estado.lock.release()
+
+
+def agregar_usuario(username=None, email=None):
+    """ Agrega al filtro del proceso un usuario creado o modificado, si el filtro ya existe """
+    if _directorio is None: # Se cargara completo al construirlo
+        return
+    if username:
+        _directorio.filtro.agregar(clave('username', username))
+    if email:
+        _directorio.filtro.agregar(clave('email', email))
+
+
+def existe(campo, valor)-> bool:
+    """ Confirma un probable acierto con la misma regla que la restriccion unica del campo """
+    usuarios = User.objects.lectura()
+    if campo == 'email': # user_email_lower_unico
+        return usuarios.alias(email_minusculas=Lower('email')).filter(email_minusculas=valor.lower()).exists()
+    return usuarios.filter(username=valor).exists()
+
+
+def disponible(campo, valor)-> bool:
+    """Indica si el username o email esta libre.
+
+    Args:
+        campo (str): 'username' o 'email'.
+        valor (str): Valor a consultar.
+    Returns:
+        bool: True si nadie lo usa.
+    """
+    estado = refrescar(directorio())
+    if clave(campo, valor) not in estado.filtro: # Seguro libre, sin consultar la base de datos
+        metricas.DISPONIBILIDAD_CONSULTAS.sumar(campo, 'descartado')
+        return True
+    ocupado = existe(campo, valor)
+    metricas.DISPONIBILIDAD_CONSULTAS.sumar(campo, 'ocupado' if ocupado else 'falso_positivo')
+    return not ocupado
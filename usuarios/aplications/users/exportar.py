@@ -0,0 +1,76 @@
+""" Archivo para exportar el directorio de usuarios en streaming (CSV o JSONL). """
+
+import csv
+import json
+
+from .models import User
+
+CAMPOS_EXPORTACION = ('username', 'email', 'nombres', 'apellidos', 'genero', 'is_active')
+
+
+class Eco:
+    """ Buffer que retorna lo escrito, para que csv.writer produzca cadenas una a una """
+
+    def write(self, valor):
+        """ Retornar el valor en lugar de guardarlo """
+        return valor
+
+
+def filas_usuarios(is_active=None, genero=None, chunk_size=2000):
+    """Genera las filas de usuarios como tuplas, sin crear instancias del modelo.
+
+    Args:
+        is_active (bool): Filtrar por estado, None para todos.
+        genero (str): Filtrar por genero, None para todos.
+        chunk_size (int): Filas que se traen de la base de datos por vez.
+    """
+    usuarios = User.objects.exportar_usuarios(CAMPOS_EXPORTACION, is_active=is_active, genero=genero)
+    return usuarios.iterator(chunk_size=chunk_size) # Cursor del lado del servidor en PostgreSQL
+
+
+async def afilas_usuarios(is_active=None, genero=None, chunk_size=2000):
+    """ Version asincrona de filas_usuarios: trae chunk_size filas por vez en sync_to_async """
+    usuarios = User.objects.exportar_usuarios(CAMPOS_EXPORTACION, is_active=is_active, genero=genero)
+    # values_list().aiterator() ejecuta la consulta en el event loop; values() no
+    async for fila in usuarios.values(*CAMPOS_EXPORTACION).aiterator(chunk_size=chunk_size):
+        yield tuple(fila.values())
+
+
+def exportar_csv(filas):
+    """ Genera el CSV linea a linea, empezando por el encabezado """
+    writer = csv.writer(Eco())
+    yield writer.writerow(CAMPOS_EXPORTACION)
+    for fila in filas:
+        yield writer.writerow(fila)
+
+
+async def aexportar_csv(filas):
+    """ Version asincrona de exportar_csv, para StreamingHttpResponse bajo ASGI """
+    writer = csv.writer(Eco())
+    yield writer.writerow(CAMPOS_EXPORTACION)
+    async for fila in filas:
+        yield writer.writerow(fila)
+
+
+def linea_jsonl(fila):
+    """ Una fila como objeto JSON terminado en salto de linea """
+    return json.dumps(dict(zip(CAMPOS_EXPORTACION, fila)), ensure_ascii=False) + '\n'
+
+
+def exportar_jsonl(filas):
+    """ Genera un objeto JSON por linea """
+    for fila in filas:
+        yield linea_jsonl(fila)
+
+
+async def aexportar_jsonl(filas):
+    """ Version asincrona de exportar_jsonl """
+    async for fila in filas:
+        yield linea_jsonl(fila)
+
+
+def convertir_booleano(valor):
+    """ Convierte 'true'/'false'/'1'/'0' en booleano, None si viene vacio """
+    if valor in (None, ''):
+        return None
+    return str(valor).lower() in ('1', 'true', 'si', 'yes')
@@ -1,8 +1,54 @@
 """ Formularios para la aplicacion de usuarios """
 
+import re
+from functools import lru_cache
+
 from django import forms
+from django.contrib.auth.forms import AuthenticationForm
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import F, UniqueConstraint
 from .models import User
 
+# Mensaje de SQLite (no se traduce): "UNIQUE constraint failed: tabla.columna" o "...: index 'nombre'"
+SQLITE_UNIQUE = re.compile(r"UNIQUE constraint failed: (?:index '(?P<restriccion>\w+)'|\w+\.(?P<columna>\w+))")
+
+
+@lru_cache(maxsize=None)
+def restricciones_unicas(alias=DEFAULT_DB_ALIAS)-> dict:
+    """ {nombre de restriccion o indice unico de users_user: campo}, leido una vez por proceso """
+    campos_por_columna = {campo.column: campo.name for campo in User._meta.concrete_fields}
+    restricciones = {}
+    with connections[alias].cursor() as cursor: # Las generadas por unique=True tienen nombre del motor
+        for nombre, datos in connections[alias].introspection.get_constraints(cursor, User._meta.db_table).items():
+            if datos['unique'] and len(datos['columns']) == 1 and datos['columns'][0] in campos_por_columna:
+                restricciones[nombre] = campos_por_columna[datos['columns'][0]]
+    for restriccion in User._meta.constraints: # Las del modelo, como user_email_lower_unico(Lower('email'))
+        if isinstance(restriccion, UniqueConstraint):
+            referencias = list(restriccion.fields) + [expresion.name for regla in restriccion.expressions
+                                                      for expresion in regla.flatten() if isinstance(expresion, F)]
+            if len(referencias) == 1:
+                restricciones[restriccion.name] = referencias[0]
+    return restricciones
+
+
+def campo_repetido(error):
+    """Campo de User cuya restriccion unica violo el IntegrityError, o None si no es de unicidad.
+
+    Usa el nombre de la restriccion que informa el motor (diag.constraint_name en
+    PostgreSQL) en lugar del texto del mensaje, que depende del motor y del idioma.
+    """
+    causa = error.__cause__
+    restriccion = getattr(getattr(causa, 'diag', None), 'constraint_name', None) # psycopg
+    if restriccion is None:
+        coincidencia = SQLITE_UNIQUE.search(str(causa))
+        if coincidencia is None:
+            return None
+        if coincidencia['columna']:
+            return next((campo.name for campo in User._meta.concrete_fields
+                         if campo.column == coincidencia['columna'] and campo.unique), None)
+        restriccion = coincidencia['restriccion']
+    return restricciones_unicas().get(restriccion)
+
 
 class UserRegisterForm(forms.ModelForm):
     """ Formulario para el registro de usuarios """
@@ -31,11 +77,8 @@ class UserRegisterForm(forms.ModelForm):
         return username
 
     def clean_email(self):
-        """ Validar que el correo electronico sea unico """
-        email = self.cleaned_data.get('email') # Obtener el correo electronico
-        if User.objects.filter(email=email).exists(): # Verificar si el correo ya existe
-            raise forms.ValidationError('El correo electronico ya esta en uso.') # Si existe, lanzar error
-        return email # Retornar el correo electronico validado
+        """ Normalizar el correo (dominio en minusculas); no consulta la base de datos """
+        return User.objects.normalize_email(self.cleaned_data.get('email')) # Retornar el correo normalizado
 
     def clean_password(self):
         """ Validar que la contraseña tenga al menos 8 caracteres """
@@ -75,16 +118,58 @@ class UserRegisterForm(forms.ModelForm):
             raise forms.ValidationError('Seleccione un genero valido.')
         return genero
 
+    def validate_unique(self):
+        """ Sin consultas previas: la unicidad de username y email la garantizan sus restricciones
+
+        La vista guarda al usuario y, si el INSERT viola una de ellas, convierte el
+        IntegrityError en el error del campo con agregar_error_unicidad (segun el
+        nombre de la restriccion violada, ver campo_repetido).
+        """
+
+    def _get_validation_exclusions(self):
+        """ Excluir email de la validacion del modelo para no consultar user_email_lower_unico
+
+        El formato del correo ya lo valida el campo del formulario.
+        """
+        exclude = super()._get_validation_exclusions()
+        exclude.add('email')
+        return exclude
+
+    def agregar_error_unicidad(self, error)-> bool:
+        """ Agrega al formulario el error del campo repetido; False si el error no es de unicidad """
+        campo = campo_repetido(error)
+        if campo == 'username': # Mismo mensaje que daba validate_unique
+            self.add_error('username', self.instance.unique_error_message(User, ('username',)))
+        elif campo == 'email':
+            self.add_error('email', 'El correo electronico ya esta en uso.')
+        else:
+            return False
+        return True
+
     def save(self, commit=True):
         """ Guardar el usuario con la contraseña hasheada """
         user = super().save(commit=False) # Crear el usuario sin guardar
-        user.set_password(self.cleaned_data['password']) # Establecer la contraseña hasheada
+        user.set_password(self.cleaned_data['password']) # Unico hash de la contraseña del registro
         if commit: # Guardar el usuario si commit es True
             user.save() # Guardar el usuario en la base de datos
         return user # Retornar el usuario guardado
 
 
 
+class UserImportForm(UserRegisterForm):
+    """ Formulario para validar una fila de la importacion masiva de usuarios
+
+    Aplica las mismas reglas que UserRegisterForm; la unicidad de username y email
+    tampoco se consulta por fila, el comando import_users la verifica por lote con una sola consulta.
+    """
+
+    def __init__(self, data, **kwargs):
+        """ La importacion no trae confirmacion de contraseña """
+        data = dict(data) # Copiar la fila para no modificar la original
+        data.setdefault('password2', data.get('password'))
+        super().__init__(data, **kwargs)
+
+
 class CodigoVerificacionForm(forms.Form):
     """ Formulario para verificar el codigo de verificacion """
     # Campos del formulario
@@ -109,25 +194,10 @@ class CodigoVerificacionForm(forms.Form):
         )
     )
 
-    def clean(self):
-        """ Validar el codigo de verificacion """
-        cleaned_data = super().clean() # Obtener los datos limpios del formulario
-        username = cleaned_data.get('username') # Obtener el nombre de usuario
-        codigo_verificador = cleaned_data.get('codigo_verificador') # Obtener el codigo de verificacion del usuario
-        # Validar que ambos campos esten completos
-        if not username or not codigo_verificador:
-            return cleaned_data # Si no, retornar los datos limpios sin mas validacion
-
-        # Verificar si el usuario existe y si el código coincide
-        user = User.objects.filter(username=username).first()
-        if not user:
-            self.add_error('username', 'El usuario no existe.') # Agregar error si el usuario no existe
-            return cleaned_data # Retornar los datos limpios
-        # Verificar si el código de verificación coincide
-        if user.codigo_verificador != codigo_verificador:
-            self.add_error('codigo_verificador', 'El código de verificación es incorrecto.')
-        # Si todo es correcto, retornar los datos limpios
-        return cleaned_data
+    def clean_codigo_verificador(self):
+        """ Normalizar el codigo de verificacion """
+        # El codigo se compara contra su hash al redimirlo en la vista, en un solo UPDATE
+        return self.cleaned_data.get('codigo_verificador', '').strip().upper()
 
 
 # No la use....
@@ -216,6 +286,25 @@ class UpdatePasswordForm(forms.Form):
                 self.add_error('password_nueva', 'La nueva contraseña no puede ser igual a la actual.')
 
 
+class LoginAsyncForm(AuthenticationForm):
+    """ AuthenticationForm para la vista async: recibe el usuario ya autenticado con aauthenticate
 
+    AuthenticationForm.clean llama a authenticate(), que es sincronico; aqui solo se
+    validan los campos y se reutilizan los mensajes de error del formulario original.
+    """
 
+    def __init__(self, request=None, *args, usuario=None, **kwargs):
+        """ Constructor que recibe el resultado de aauthenticate """
+        self.usuario = usuario # Usuario autenticado o None
+        super().__init__(request, *args, **kwargs)
 
+    def clean(self):
+        """ Validar con el usuario recibido en lugar de autenticar de nuevo """
+        username = self.cleaned_data.get('username')
+        password = self.cleaned_data.get('password')
+        if username is not None and password:
+            self.user_cache = self.usuario
+            if self.user_cache is None:
+                raise self.get_invalid_login_error()
+            self.confirm_login_allowed(self.user_cache)
+        return self.cleaned_data
@@ -0,0 +1,78 @@
+""" Cache de fragmentos renderizados de las paginas de usuarios. """
+
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.utils.safestring import mark_safe
+
+FRAGMENTO_LISTA = 'users:lista' # Nombre del fragmento de la lista de usuarios
+CLAVE_VERSION = 'users:lista:version' # Version actual de la lista, cambia con cada escritura
+CAMPOS_LISTA = frozenset(('username', 'email')) # Campos de User que se muestran en la lista
+
+
+def _cache():
+    """ Cache donde se guardan los fragmentos """
+    return caches[settings.FRAGMENTOS_CACHE]
+
+
+def rol_usuario(user)-> str:
+    """ Rol con el que se cachean los fragmentos: anonimo, usuario o staff """
+    if not user.is_authenticated:
+        return 'anonimo'
+    return 'staff' if user.is_staff else 'usuario'
+
+
+def version_lista()-> int:
+    """ Version actual de la lista; las claves de los fragmentos la incluyen """
+    version = _cache().get(CLAVE_VERSION)
+    if version is None:
+        # Partir de un valor nuevo si la clave se perdio, para no revivir fragmentos viejos
+        _cache().add(CLAVE_VERSION, time.time_ns(), None)
+        version = _cache().get(CLAVE_VERSION)
+    return version
+
+
+async def aversion_lista()-> int:
+    """ Version asincrona de version_lista para las vistas async """
+    version = await _cache().aget(CLAVE_VERSION)
+    if version is None:
+        await _cache().aadd(CLAVE_VERSION, time.time_ns(), None)
+        version = await _cache().aget(CLAVE_VERSION)
+    return version
+
+
+def invalidar_lista():
+    """ Invalida todas las paginas cacheadas de la lista cambiando su version """
+    try:
+        _cache().incr(CLAVE_VERSION)
+    except ValueError: # La clave no existe: no hay fragmentos que invalidar
+        _cache().add(CLAVE_VERSION, time.time_ns(), None)
+
+
+def clave_fragmento(nombre, *partes)-> str:
+    """ Clave del fragmento nombre para las partes dadas (pagina, cursor, rol, version) """
+    return make_template_fragment_key(nombre, partes)
+
+
+def leer_fragmento(clave):
+    """ Retorna el HTML cacheado o None """
+    html = _cache().get(clave)
+    return mark_safe(html) if html is not None else None # HTML ya escapado al renderizarlo
+
+
+async def aleer_fragmento(clave):
+    """ Version asincrona de leer_fragmento """
+    html = await _cache().aget(clave)
+    return mark_safe(html) if html is not None else None # HTML ya escapado al renderizarlo
+
+
+def guardar_fragmento(clave, html):
+    """ Guarda el HTML renderizado por FRAGMENTOS_TIMEOUT segundos """
+    _cache().set(clave, str(html), settings.FRAGMENTOS_TIMEOUT)
+
+
+async def aguardar_fragmento(clave, html):
+    """ Version asincrona de guardar_fragmento """
+    await _cache().aset(clave, str(html), settings.FRAGMENTOS_TIMEOUT)
@@ -0,0 +1,47 @@
+""" Hashers de contraseñas con factor de trabajo configurable desde settings.
+
+Mantienen el nombre de algoritmo de Django, por lo que verifican los hashes existentes;
+cuando el factor configurado cambia, must_update() devuelve True y check_password()
+vuelve a hashear la contraseña en el siguiente login exitoso (migracion gradual).
+"""
+
+from django.conf import settings
+from django.contrib.auth.hashers import (Argon2PasswordHasher, PBKDF2PasswordHasher,
+                                         ScryptPasswordHasher)
+
+
+class PBKDF2AjustadoHasher(PBKDF2PasswordHasher):
+    """ PBKDF2-SHA256 con iteraciones en HASHER_PBKDF2_ITERACIONES """
+
+    @property
+    def iterations(self):
+        """ Iteraciones configuradas o las de Django """
+        return getattr(settings, 'HASHER_PBKDF2_ITERACIONES', None) or PBKDF2PasswordHasher.iterations
+
+
+class Argon2AjustadoHasher(Argon2PasswordHasher):
+    """ Argon2id con time_cost y memory_cost en HASHER_ARGON2_TIME_COST / HASHER_ARGON2_MEMORY_COST """
+
+    @property
+    def time_cost(self):
+        """ Pasadas configuradas o las de Django """
+        return getattr(settings, 'HASHER_ARGON2_TIME_COST', None) or Argon2PasswordHasher.time_cost
+
+    @property
+    def memory_cost(self):
+        """ Memoria en KiB configurada o la de Django """
+        return getattr(settings, 'HASHER_ARGON2_MEMORY_COST', None) or Argon2PasswordHasher.memory_cost
+
+
+class ScryptAjustadoHasher(ScryptPasswordHasher):
+    """ Scrypt con work_factor (N) en HASHER_SCRYPT_WORK_FACTOR """
+
+    @property
+    def work_factor(self):
+        """ Factor N configurado o el de Django """
+        return getattr(settings, 'HASHER_SCRYPT_WORK_FACTOR', None) or ScryptPasswordHasher.work_factor
+
+    @property
+    def maxmem(self):
+        """ Memoria maxima para hashlib.scrypt: 128 * N * r mas margen (0 usa el limite de OpenSSL) """
+        return 0 if self.work_factor <= ScryptPasswordHasher.work_factor else 256 * self.work_factor * self.block_size
@@ -0,0 +1,60 @@
+""" Archivo para hashear contraseñas en paralelo con un pool de procesos. """
+
+import atexit
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+_pools = {} # Pools de procesos reutilizados, por numero de workers
+
+
+def _iniciar_worker():
+    """ Prepara Django en el proceso hijo cuando se inicia con spawn """
+    if not settings.configured or not django.apps.apps.ready:
+        django.setup()
+
+
+def _hashear(password):
+    """ Hashea una contraseña con el hasher por defecto (se ejecuta en el proceso hijo) """
+    return make_password(password)
+
+
+def numero_workers(workers=None)-> int:
+    """ Retorna el numero de procesos a usar: argumento, HASH_WORKERS o todos los nucleos """
+    return workers or getattr(settings, 'HASH_WORKERS', None) or os.cpu_count() or 1
+
+
+def obtener_pool(workers):
+    """ Retorna (creandolo una sola vez) el pool de procesos con el numero de workers dado """
+    if workers not in _pools:
+        _pools[workers] = ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_worker)
+    return _pools[workers]
+
+
+@atexit.register
+def cerrar_pools():
+    """ Cierra los pools de procesos al terminar el programa """
+    for pool in _pools.values():
+        pool.shutdown(wait=False, cancel_futures=True)
+    _pools.clear()
+
+
+def hashear_contraseñas(passwords, workers=None)-> list:
+    """Hashea varias contraseñas repartiendolas entre todos los nucleos.
+
+    Args:
+        passwords (list): Contraseñas en texto plano.
+        workers (int): Procesos a usar. Por defecto HASH_WORKERS o os.cpu_count().
+    Returns:
+        list: Contraseñas codificadas, en el mismo orden, listas para bulk_create/bulk_update.
+    """
+    passwords = list(passwords)
+    workers = numero_workers(workers)
+    if workers == 1 or len(passwords) < 2: # No vale la pena repartir
+        return [make_password(password) for password in passwords]
+    # Repartir en bloques para reducir la comunicacion entre procesos
+    chunksize = max(1, len(passwords) // (workers * 4))
+    return list(obtener_pool(workers).map(_hashear, passwords, chunksize=chunksize))
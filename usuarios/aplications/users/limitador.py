@@ -0,0 +1,145 @@
+""" Archivo para limitar los intentos de login antes de hashear la contraseña. """
+
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+from aplications.home import metricas
+
+logger = logging.getLogger(__name__)
+
+
+def _cache():
+    """ Cache donde se guardan los contadores (LOGIN_LIMITE_CACHE) """
+    return caches[settings.LOGIN_LIMITE_CACHE]
+
+
+def _clave(tipo, valor)-> str:
+    """ Clave de cache segura para memcached/redis a partir de una IP o un username """
+    return f'login:{tipo}:' + hashlib.sha256(str(valor).lower().encode()).hexdigest()[:32]
+
+
+def _contar(clave, ventana, ahora)-> float:
+    """Cuenta los intentos en una ventana deslizante aproximada con dos ventanas fijas.
+
+    El conteo de la ventana anterior pesa segun cuanto de ella sigue dentro de la ventana deslizante.
+    """
+    actual = int(ahora // ventana)
+    transcurrido = (ahora % ventana) / ventana # Fraccion ya transcurrida de la ventana actual
+    valores = _cache().get_many([f'{clave}:{actual}', f'{clave}:{actual - 1}'])
+    return valores.get(f'{clave}:{actual - 1}', 0) * (1 - transcurrido) + valores.get(f'{clave}:{actual}', 0)
+
+
+def _incrementar(clave, timeout):
+    """ Incrementa un contador de cache, creandolo si no existe """
+    cache = _cache()
+    cache.add(clave, 0, timeout=timeout) # Crear el contador si no existe
+    try:
+        cache.incr(clave)
+    except ValueError: # El contador expiro entre add e incr
+        cache.set(clave, 1, timeout=timeout)
+
+
+def _sumar(clave, ventana, ahora):
+    """ Suma un intento a la ventana fija actual """
+    _incrementar(f'{clave}:{int(ahora // ventana)}', ventana * 2)
+
+
+def _registrar_rechazo(motivo, clave, ventana, ahora):
+    """ Cuenta los intentos rechazados por motivo, para las metricas
+
+    El aviso en el log sale solo en el primer rechazo de la clave en cada ventana:
+    un ataque no llena el log con una linea por intento.
+    """
+    _incrementar(f'login:rechazos:{motivo}', None) # Sin expiracion
+    if _cache().add(f'{clave}:avisado:{int(ahora // ventana)}', True, timeout=ventana * 2):
+        logger.warning('Login rechazado por limite de %s (se omiten los siguientes de la ventana)', motivo)
+
+
+def verificar_login(ip, username):
+    """Indica si se permite un intento de login. No toca la base de datos ni el hasher.
+
+    Args:
+        ip (str): IP del cliente.
+        username (str): Nombre de usuario enviado.
+    Returns:
+        str: None si el intento esta permitido, o el motivo del rechazo ('ip' o 'usuario').
+    """
+    ahora = time.time()
+    ventana = settings.LOGIN_LIMITE_VENTANA
+    clave = _clave('ip', ip)
+    if _contar(clave, ventana, ahora) >= settings.LOGIN_LIMITE_IP:
+        _registrar_rechazo('ip', clave, ventana, ahora)
+        return 'ip'
+    clave = _clave('usuario', username)
+    if username and _contar(clave, ventana, ahora) >= settings.LOGIN_LIMITE_USUARIO:
+        _registrar_rechazo('usuario', clave, ventana, ahora)
+        return 'usuario'
+    return None
+
+
+def limitar_disponibilidad(ip)-> bool:
+    """Cuenta una consulta de /users/disponible/ de la IP e indica si supera el limite.
+
+    La vista es anonima y responde si un username o email existe: sin limite
+    serviria para enumerar las cuentas.
+    """
+    ahora = time.time()
+    ventana = settings.LOGIN_LIMITE_VENTANA
+    clave = _clave('disponibilidad', ip)
+    if _contar(clave, ventana, ahora) >= settings.DISPONIBILIDAD_LIMITE_IP:
+        return True
+    _sumar(clave, ventana, ahora)
+    return False
+
+
+def registrar_intento(ip, username):
+    """ Suma un intento de login a los contadores de la IP y del usuario """
+    ahora = time.time()
+    ventana = settings.LOGIN_LIMITE_VENTANA
+    _sumar(_clave('ip', ip), ventana, ahora)
+    if username:
+        _sumar(_clave('usuario', username), ventana, ahora)
+
+
+def limpiar_usuario(username):
+    """ Reinicia el contador del usuario despues de un login exitoso """
+    ventana = settings.LOGIN_LIMITE_VENTANA
+    actual = int(time.time() // ventana)
+    clave = _clave('usuario', username)
+    _cache().delete_many([f'{clave}:{actual}', f'{clave}:{actual - 1}'])
+
+
+def metricas_rechazos()-> dict:
+    """ Retorna el total de logins rechazados por motivo """
+    claves = {motivo: f'login:rechazos:{motivo}' for motivo in ('ip', 'usuario')}
+    valores = _cache().get_many(list(claves.values()))
+    return {motivo: valores.get(clave, 0) for motivo, clave in claves.items()}
+
+
+# Total de todos los workers, leido de la cache compartida en cada scrape de /metrics
+LOGIN_RECHAZOS = metricas.ContadorCompartido(
+    'usuarios_login_rechazos_total', 'Intentos de login rechazados por el limite, por motivo.', ('motivo',),
+    lambda: {(motivo,): total for motivo, total in metricas_rechazos().items()})
+
+
+def ip_cliente(request)-> str:
+    """IP del cliente segun LOGIN_LIMITE_IP_HEADER y LOGIN_LIMITE_PROXIES.
+
+    Con REMOTE_ADDR se usa la IP de la conexion. Con X-Forwarded-For se toma la
+    entrada que agrego el proxy confiable mas externo: cada uno de los
+    LOGIN_LIMITE_PROXIES proxies agrega una IP a la derecha, y lo que esta a la
+    izquierda lo pudo escribir el cliente (no sirve para limitar por IP).
+    """
+    remote_addr = request.META.get('REMOTE_ADDR', '')
+    if settings.LOGIN_LIMITE_IP_HEADER == 'REMOTE_ADDR':
+        return remote_addr
+    valor = request.META.get(settings.LOGIN_LIMITE_IP_HEADER, '')
+    ips = [ip.strip() for ip in valor.split(',') if ip.strip()]
+    proxies = settings.LOGIN_LIMITE_PROXIES
+    if proxies < 1 or len(ips) < proxies: # Cabecera ausente o mas corta: no paso por los proxies
+        return remote_addr
+    return ips[-proxies]
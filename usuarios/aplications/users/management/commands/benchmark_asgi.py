@@ -0,0 +1,143 @@
+""" Comando para comparar el throughput con conexiones concurrentes en WSGI y en ASGI """
+
+import asyncio
+import io
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+from django.urls import include, path, reverse
+
+from aplications.home import urls as home_urls
+from aplications.users import urls as users_urls
+from aplications.users.models import User
+
+from .benchmark_carga import percentil
+
+
+def urlconf(patrones):
+    """ URLconf con los patrones de users dados y los de home, para cambiar de vistas sin reiniciar """
+    modulo = types.ModuleType('urls_benchmark')
+    modulo.urlpatterns = [
+        path('users/', include((patrones, 'users'))),
+        path('', include(home_urls, namespace='home')),
+    ]
+    return modulo
+
+
+class Command(BaseCommand):
+    """ Benchmark en proceso: WSGIHandler con un hilo por conexion vs ASGIHandler en un event loop
+
+    WSGI usa las vistas sincronicas y ASGI las async (las mismas urls que elige
+    VISTAS_ASYNC), sin servidor de por medio, para aislar el costo de Django.
+
+    Ejemplo:
+        python manage.py benchmark_asgi --usuario admin --peticiones 1000 --concurrencia 10 50 100
+    """
+
+    help = 'Compara peticiones por segundo con N conexiones concurrentes bajo WSGI y ASGI'
+
+    def add_arguments(self, parser):
+        """ Argumentos del comando """
+        parser.add_argument('--usuario', help='Username con el que se autentican las peticiones.')
+        parser.add_argument('--ruta', default=None, help='Ruta a pedir (por defecto la lista de usuarios).')
+        parser.add_argument('--peticiones', type=int, default=500, help='Peticiones por corrida.')
+        parser.add_argument('--concurrencia', type=int, nargs='+', default=[1, 10, 50],
+                            help='Conexiones concurrentes a probar.')
+
+    def cookie_sesion(self, username):
+        """ Cookie de una sesion autenticada del usuario dado """
+        usuarios = User.objects.filter(is_active=True)
+        usuario = usuarios.filter(username=username).first() if username else usuarios.first()
+        if usuario is None:
+            raise CommandError('No hay un usuario activo para autenticar las peticiones')
+        client = Client()
+        client.force_login(usuario)
+        return f'{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}'
+
+    def wsgi(self, ruta, cookie, peticiones, concurrencia):
+        """ Latencias en ms con un hilo por conexion, como gunicorn con workers de hilos """
+        handler = WSGIHandler()
+        ruta, _, query = ruta.partition('?')
+
+        def peticion(_):
+            environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': ruta, 'QUERY_STRING': query,
+                       'HTTP_COOKIE': cookie, 'SERVER_NAME': 'localhost', 'wsgi.input': io.BytesIO()}
+            setup_testing_defaults(environ)
+            estados = []
+            inicio = time.perf_counter()
+            respuesta = handler(environ, lambda estado, cabeceras, exc_info=None: estados.append(estado))
+            try:
+                b''.join(respuesta)
+            finally:
+                respuesta.close() # request_finished: cierra o conserva la conexion
+            self.verificar(estados[0].split()[0])
+            return (time.perf_counter() - inicio) * 1000
+
+        with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+            return list(pool.map(peticion, range(peticiones)))
+
+    async def asgi(self, ruta, cookie, peticiones, concurrencia):
+        """ Latencias en ms con conexiones concurrentes en un solo event loop """
+        handler = ASGIHandler()
+        ruta, _, query = ruta.partition('?')
+        semaforo = asyncio.Semaphore(concurrencia)
+
+        async def peticion():
+            scope = {'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                     'scheme': 'http', 'path': ruta, 'raw_path': ruta.encode(), 'query_string': query.encode(),
+                     'root_path': '', 'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+                     'headers': [(b'host', b'localhost'), (b'cookie', cookie.encode())]}
+            cuerpo = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+            desconexion = asyncio.get_running_loop().create_future() # El cliente nunca se desconecta
+            estados = []
+
+            async def receive():
+                return cuerpo.pop() if cuerpo else await desconexion
+
+            async def send(mensaje):
+                if mensaje['type'] == 'http.response.start':
+                    estados.append(mensaje['status'])
+
+            async with semaforo:
+                inicio = time.perf_counter()
+                await handler(scope, receive, send)
+                self.verificar(str(estados[0]))
+                return (time.perf_counter() - inicio) * 1000
+
+        return await asyncio.gather(*(peticion() for _ in range(peticiones)))
+
+    def verificar(self, estado):
+        """ Falla si una peticion no respondio 200 """
+        if estado != '200':
+            raise CommandError(f'La ruta respondio {estado}; revise --usuario y --ruta')
+
+    def reportar(self, nombre, latencias, segundos):
+        """ Imprime throughput y percentiles de una corrida """
+        latencias = sorted(latencias)
+        self.stdout.write(f'  {nombre}: {len(latencias) / segundos:8.1f} req/s  p50 {percentil(latencias, 50):7.1f}ms  '
+                          f'p95 {percentil(latencias, 95):7.1f}ms  p99 {percentil(latencias, 99):7.1f}ms')
+        return len(latencias) / segundos
+
+    def handle(self, *args, **options):
+        """ Ejecutar cada concurrencia en WSGI y en ASGI """
+        ruta = options['ruta'] or reverse('users:user-list')
+        cookie = self.cookie_sesion(options['usuario'])
+        peticiones = options['peticiones']
+        for concurrencia in options['concurrencia']:
+            self.stdout.write(f'Concurrencia {concurrencia} - {peticiones} peticiones a {ruta}')
+            with override_settings(ROOT_URLCONF=urlconf(users_urls.urlpatterns_sync)):
+                inicio = time.perf_counter()
+                latencias = self.wsgi(ruta, cookie, peticiones, concurrencia)
+                wsgi = self.reportar('WSGI', latencias, time.perf_counter() - inicio)
+            with override_settings(ROOT_URLCONF=urlconf(users_urls.urlpatterns_async)):
+                inicio = time.perf_counter()
+                latencias = asyncio.run(self.asgi(ruta, cookie, peticiones, concurrencia))
+                asgi = self.reportar('ASGI', latencias, time.perf_counter() - inicio)
+            self.stdout.write(self.style.SUCCESS(f'  ASGI/WSGI: {asgi / wsgi:.2f}x'))
@@ -0,0 +1,218 @@
+""" Comando para medir los endpoints de usuarios bajo carga de punta a punta """
+
+import json
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from aplications.users.managers import TAMANO_LOTE
+from aplications.users.models import ContadorUsuarios, CorreoPendiente, User
+
+ENDPOINTS = ('register', 'verificar-codigo', 'login', 'user-list', 'update-password')
+PATRON_USUARIOS = r'^(seed|bench)[0-9]+$' # Usuarios sinteticos creados por el benchmark
+DOMINIO = '@bench.local' # Dominio de sus emails
+PASSWORD = 'benchmark-123'
+
+
+def percentil(valores, p):
+    """Percentil por rango mas cercano de una lista ordenada.
+
+    Args:
+        valores (list): Valores ordenados de menor a mayor.
+        p (float): Percentil entre 0 y 100.
+    Returns:
+        float: El valor del percentil, 0.0 si la lista esta vacia.
+    """
+    if not valores:
+        return 0.0
+    indice = max(0, -(-len(valores) * p // 100) - 1) # ceil(n * p / 100) - 1
+    return valores[int(indice)]
+
+
+class Command(BaseCommand):
+    """ Benchmark de carga: register -> verificar-codigo -> login -> lista -> update-password
+
+    Cada flujo usa su propio Client y su propia IP para no chocar con el limite de
+    intentos de login. Con --baseline el comando falla si algun endpoint empeora.
+
+    Escribe y borra usuarios en la base de datos configurada: con DEBUG = False
+    se niega a correr sin --confirmar.
+
+    Ejemplo:
+        python manage.py benchmark_carga --semilla 10000 --flujos 200 --salida resultados.json
+        python manage.py benchmark_carga --flujos 200 --baseline resultados.json --tolerancia 0.25
+    """
+
+    help = 'Mide latencia (p50/p95/p99), throughput y consultas SQL por endpoint de usuarios'
+
+    def add_arguments(self, parser):
+        """ Argumentos del comando """
+        parser.add_argument('--semilla', type=int, default=1000, help='Usuarios sinteticos a insertar antes de medir.')
+        parser.add_argument('--flujos', type=int, default=50, help='Flujos completos a ejecutar.')
+        parser.add_argument('--calentamiento', type=int, default=3, help='Flujos previos que no se miden.')
+        parser.add_argument('--concurrencia', type=int, default=1, help='Flujos ejecutados en paralelo (hilos).')
+        parser.add_argument('--salida', help='Archivo JSON donde escribir los resultados.')
+        parser.add_argument('--baseline', help='Archivo JSON de una corrida anterior para comparar.')
+        parser.add_argument('--tolerancia', type=float, default=0.25,
+                            help='Aumento relativo del p95 permitido respecto al baseline (0.25 = 25%%).')
+        parser.add_argument('--conservar', action='store_true', help='No borrar los usuarios sinteticos al terminar.')
+        parser.add_argument('--confirmar', action='store_true',
+                            help='Correr aunque DEBUG sea False (crea y borra usuarios en esa base de datos).')
+
+    def sembrar(self, cantidad):
+        """ Inserta usuarios activos con una misma contraseña hasheada una sola vez """
+        password = make_password(PASSWORD) # Un solo hash para todos los usuarios sinteticos
+        generos = [clave for clave, _ in User.genero_choice]
+        for inicio in range(0, cantidad, TAMANO_LOTE):
+            User.objects.crear_usuarios([
+                User(username=f'seed{i:06d}', email=f'seed{i:06d}{DOMINIO}', password=password,
+                     genero=generos[i % len(generos)], is_active=True)
+                for i in range(inicio, min(inicio + TAMANO_LOTE, cantidad))
+            ])
+
+    def limpiar(self):
+        """ Borra los usuarios y correos del benchmark y recalcula los contadores """
+        # Username y dominio del email: un usuario real llamado seed1 no se borra
+        usuarios = User.objects.filter(username__regex=PATRON_USUARIOS, email__endswith=DOMINIO)
+        CorreoPendiente.objects.filter(destinatario__endswith=DOMINIO).delete()
+        usuarios.delete() # Las señales de post_delete invalidan el cache de autenticacion
+        ContadorUsuarios.objects.reconciliar(User.objects.all())
+
+    def medir(self, client, muestras, nombre, metodo, url, datos=None, esperado=302):
+        """ Ejecuta una peticion y guarda (segundos, consultas) en muestras[nombre] """
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            respuesta = getattr(client, metodo)(url, datos or {})
+            segundos = time.perf_counter() - inicio
+        if respuesta.status_code != esperado: # Un error no debe medirse como una respuesta rapida
+            raise CommandError(f'{nombre}: se esperaba {esperado} y se obtuvo {respuesta.status_code}')
+        muestras[nombre].append((segundos, len(consultas)))
+        return respuesta
+
+    def flujo(self, i, muestras):
+        """ Ejecuta un flujo completo para el usuario bench<i> """
+        username, email = f'bench{i:05d}', f'bench{i:05d}{DOMINIO}'
+        client = Client(SERVER_NAME='localhost', REMOTE_ADDR=f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}')
+        try:
+            self.medir(client, muestras, 'register', 'post', reverse('users:register'), {
+                'username': username, 'email': email, 'nombres': 'Carga', 'apellidos': 'Sintetica',
+                'genero': 'O', 'password': PASSWORD, 'password2': PASSWORD,
+            })
+            # El codigo viaja en claro solo en el correo encolado, la tabla guarda su hash
+            mensaje = CorreoPendiente.objects.filter(destinatario=email).values_list('mensaje', flat=True).last()
+            self.medir(client, muestras, 'verificar-codigo', 'post', reverse('users:verificar-codigo'), {
+                'username': username, 'codigo_verificador': mensaje.rsplit(' ', 1)[-1],
+            })
+            self.medir(client, muestras, 'login', 'post', reverse('users:login'),
+                       {'username': username, 'password': PASSWORD})
+            self.medir(client, muestras, 'user-list', 'get', reverse('users:user-list'), esperado=200)
+            self.medir(client, muestras, 'update-password', 'post', reverse('users:update-password'), {
+                'password_actual': PASSWORD, 'password_nueva': PASSWORD[::-1], 'password_nueva2': PASSWORD[::-1],
+            })
+        finally:
+            if threading.current_thread() is not threading.main_thread():
+                close_old_connections() # Cada hilo abre su propia conexion
+
+    def ejecutar(self, inicio, cantidad, concurrencia):
+        """ Ejecuta los flujos y retorna (muestras por endpoint, segundos totales) """
+        muestras = {nombre: [] for nombre in ENDPOINTS}
+        comienzo = time.perf_counter()
+        if concurrencia == 1:
+            for i in range(inicio, inicio + cantidad):
+                self.flujo(i, muestras)
+        else:
+            with ThreadPoolExecutor(max_workers=concurrencia) as pool:
+                list(pool.map(lambda i: self.flujo(i, muestras), range(inicio, inicio + cantidad)))
+        return muestras, time.perf_counter() - comienzo
+
+    def resumir(self, muestras, segundos):
+        """Calcula percentiles, throughput y consultas por endpoint.
+
+        El throughput es peticiones / segundos de reloj de la corrida, no 1 / latencia
+        media: con --concurrencia > 1 las peticiones se solapan.
+        """
+        endpoints = {}
+        for nombre, valores in muestras.items():
+            latencias = sorted(s * 1000 for s, _ in valores)
+            consultas = [c for _, c in valores]
+            endpoints[nombre] = {
+                'peticiones': len(valores),
+                'p50_ms': round(percentil(latencias, 50), 3),
+                'p95_ms': round(percentil(latencias, 95), 3),
+                'p99_ms': round(percentil(latencias, 99), 3),
+                'por_segundo': round(len(valores) / segundos, 2) if segundos else 0.0,
+                'consultas_mediana': statistics.median(consultas) if consultas else 0,
+                'consultas_max': max(consultas, default=0),
+            }
+        flujos = len(muestras[ENDPOINTS[0]])
+        peticiones = sum(datos['peticiones'] for datos in endpoints.values())
+        return {'endpoints': endpoints, 'flujos': flujos, 'segundos': round(segundos, 3),
+                'flujos_por_segundo': round(flujos / segundos, 2) if segundos else 0.0,
+                'peticiones_por_segundo': round(peticiones / segundos, 2) if segundos else 0.0}
+
+    def comparar(self, resultados, baseline, tolerancia):
+        """ Retorna la lista de regresiones respecto al baseline """
+        regresiones = []
+        for nombre, actual in resultados['endpoints'].items():
+            anterior = baseline.get('endpoints', {}).get(nombre)
+            if not anterior:
+                continue
+            if actual['p95_ms'] > anterior['p95_ms'] * (1 + tolerancia):
+                regresiones.append(f"{nombre}: p95 {anterior['p95_ms']:.1f}ms -> {actual['p95_ms']:.1f}ms")
+            # Las consultas son deterministas, cualquier consulta extra es una regresion
+            if actual['consultas_max'] > anterior['consultas_max']:
+                regresiones.append(f"{nombre}: consultas {anterior['consultas_max']} -> {actual['consultas_max']}")
+        return regresiones
+
+    def handle(self, *args, **options):
+        """ Sembrar, calentar, medir, reportar y comparar con el baseline """
+        if not settings.DEBUG and not options['confirmar']:
+            raise CommandError(f'DEBUG es False: el benchmark crea y borra usuarios en '
+                               f'{connection.settings_dict["NAME"]}; use --confirmar si es una base de pruebas')
+        if options['concurrencia'] > 1 and connection.vendor == 'sqlite':
+            raise CommandError('SQLite bloquea las escrituras concurrentes, use --concurrencia 1 o PostgreSQL')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as archivo:
+                baseline = json.load(archivo)
+
+        self.limpiar() # Restos de una corrida interrumpida
+        try:
+            inicio = time.perf_counter()
+            self.sembrar(options['semilla'])
+            self.stdout.write(f"Semilla: {options['semilla']} usuarios en {time.perf_counter() - inicio:.2f}s")
+            self.ejecutar(0, options['calentamiento'], 1)
+            muestras, segundos = self.ejecutar(options['calentamiento'], options['flujos'], options['concurrencia'])
+        finally:
+            if not options['conservar']:
+                self.limpiar()
+
+        resultados = self.resumir(muestras, segundos)
+        resultados.update(semilla=options['semilla'], concurrencia=options['concurrencia'],
+                          vendor=connection.vendor)
+        for nombre, datos in resultados['endpoints'].items():
+            self.stdout.write(f"{nombre:16s} p50 {datos['p50_ms']:8.1f}ms  p95 {datos['p95_ms']:8.1f}ms  "
+                              f"p99 {datos['p99_ms']:8.1f}ms  {datos['por_segundo']:7.1f} req/s  "
+                              f"consultas {datos['consultas_mediana']:g} (max {datos['consultas_max']})")
+        self.stdout.write(f"Flujos: {resultados['flujos']} en {resultados['segundos']:.2f}s "
+                          f"({resultados['flujos_por_segundo']:.1f} flujos/s, "
+                          f"{resultados['peticiones_por_segundo']:.1f} peticiones/s)")
+
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(resultados, archivo, indent=2)
+
+        if baseline is not None:
+            regresiones = self.comparar(resultados, baseline, options['tolerancia'])
+            if regresiones:
+                raise CommandError('Regresiones respecto al baseline:\n  ' + '\n  '.join(regresiones))
+            self.stdout.write(self.style.SUCCESS('Sin regresiones respecto al baseline'))
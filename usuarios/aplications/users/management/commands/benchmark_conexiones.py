@@ -0,0 +1,72 @@
+""" Comando para medir el costo de abrir una conexion a la base de datos por peticion """
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import connections
+
+from aplications.users.models import User
+
+from .benchmark_carga import percentil
+
+
+class Command(BaseCommand):
+    """ Compara una conexion nueva por peticion contra la configuracion de DATABASES
+
+    Cada iteracion reproduce el ciclo de una peticion: request_started, una consulta
+    y request_finished, que es donde Django cierra o conserva la conexion segun
+    CONN_MAX_AGE (o la devuelve al pool de psycopg).
+
+    Ejemplo:
+        DJANGO_SETTINGS_MODULE=usuarios.settings.produ python manage.py benchmark_conexiones --peticiones 500
+    """
+
+    help = 'Mide la latencia por peticion con y sin conexiones persistentes o en pool'
+
+    def add_arguments(self, parser):
+        """ Argumentos del comando """
+        parser.add_argument('--database', default='default', help='Alias de DATABASES a medir.')
+        parser.add_argument('--peticiones', type=int, default=200, help='Peticiones simuladas por modo.')
+
+    def alias_temporal(self, alias, nombre, **cambios):
+        """ Registra una copia de la configuracion de alias con los cambios dados """
+        configuracion = {**connections.settings[alias], **cambios}
+        connections.settings[nombre] = configuracion
+        return nombre
+
+    def medir(self, alias, peticiones):
+        """ Latencias en ms de peticiones simuladas sobre alias """
+        latencias = []
+        for i in range(peticiones + 1):
+            inicio = time.perf_counter()
+            request_started.send(sender=self.__class__)
+            User.objects.using(alias).filter(pk=i).exists() # Consulta minima por indice
+            request_finished.send(sender=self.__class__) # close_old_connections
+            if i: # La primera peticion abre la conexion (o el pool) en ambos modos
+                latencias.append((time.perf_counter() - inicio) * 1000)
+        connections[alias].close()
+        return sorted(latencias)
+
+    def handle(self, *args, **options):
+        """ Medir ambos modos y reportar la diferencia """
+        alias, peticiones = options['database'], options['peticiones']
+        opciones = {k: v for k, v in connections.settings[alias].get('OPTIONS', {}).items() if k != 'pool'}
+        modos = {
+            # Lo que hacia settings.local: una conexion nueva por peticion
+            'conexion nueva': self.alias_temporal(alias, f'{alias}_sin_persistencia',
+                                                  CONN_MAX_AGE=0, OPTIONS=opciones),
+            'configurada': alias,
+        }
+        config = connections.settings[alias]
+        self.stdout.write(f"{config['ENGINE']} - CONN_MAX_AGE={config['CONN_MAX_AGE']} "
+                          f"- pool={'pool' in config.get('OPTIONS', {})} - {peticiones} peticiones")
+
+        resultados = {}
+        for nombre, alias_modo in modos.items():
+            latencias = resultados[nombre] = self.medir(alias_modo, peticiones)
+            self.stdout.write(f'{nombre:15s} p50 {percentil(latencias, 50):7.3f}ms  '
+                              f'p95 {percentil(latencias, 95):7.3f}ms  p99 {percentil(latencias, 99):7.3f}ms')
+
+        ahorro = percentil(resultados['conexion nueva'], 50) - percentil(resultados['configurada'], 50)
+        self.stdout.write(self.style.SUCCESS(f'Conexion por peticion evitada: {ahorro:.3f}ms en el p50'))
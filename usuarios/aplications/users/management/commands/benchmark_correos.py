@@ -0,0 +1,68 @@
+""" Comando para medir el envio de correos por conexion compartida vs una conexion por correo """
+
+import time
+
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+
+from aplications.users.correos import enviar_por_conexion
+
+
+class Command(BaseCommand):
+    """ Benchmark de envio SMTP contra un servidor local de depuracion
+
+    Ejemplo con un servidor que descarta los correos:
+        python -m aiosmtpd -n -l localhost:1025
+        python manage.py benchmark_correos --port 1025 --cantidad 500 --lote 50
+    """
+
+    help = 'Compara correos/s con una conexion SMTP por correo y con una conexion por lote'
+
+    def add_arguments(self, parser):
+        """ Argumentos del comando """
+        parser.add_argument('--host', default='localhost', help='Servidor SMTP de prueba.')
+        parser.add_argument('--port', type=int, default=1025, help='Puerto del servidor SMTP de prueba.')
+        parser.add_argument('--tls', action='store_true', help='Usar STARTTLS como en produccion.')
+        parser.add_argument('--cantidad', type=int, default=200, help='Correos a enviar en cada modo.')
+        parser.add_argument('--lote', type=int, default=50, help='Correos por conexion en el modo por lote.')
+
+    def conexion(self, options):
+        """ Retorna una conexion SMTP al servidor de prueba """
+        return get_connection('django.core.mail.backends.smtp.EmailBackend',
+                              host=options['host'], port=options['port'],
+                              username='', password='', use_tls=options['tls'],
+                              fail_silently=False)
+
+    def mensajes(self, cantidad):
+        """ Genera mensajes sinteticos de codigo verificador """
+        return [(i, EmailMessage('Codigo Verificador', f'Tu codigo verificador es: {i:06d}',
+                                 'benchmark@localhost', [f'usuario{i}@localhost']))
+                for i in range(cantidad)]
+
+    def handle(self, *args, **options):
+        """ Ejecuta ambos modos y reporta el throughput """
+        cantidad, lote = options['cantidad'], options['lote']
+
+        # Modo individual: una conexion (y un handshake) por correo
+        inicio = time.perf_counter()
+        for item in self.mensajes(cantidad):
+            with self.conexion(options) as connection:
+                enviar_por_conexion([item], connection)
+        individual = time.perf_counter() - inicio
+        self.stdout.write(f'Individual: {cantidad} correos en {individual:.2f}s '
+                          f'({cantidad / individual:.1f} correos/s)')
+
+        # Modo por lote: una conexion reutilizada por cada lote
+        mensajes = self.mensajes(cantidad)
+        inicio = time.perf_counter()
+        for i in range(0, cantidad, lote):
+            inicio_lote = time.perf_counter()
+            with self.conexion(options) as connection:
+                enviados, errores = enviar_por_conexion(mensajes[i:i + lote], connection)
+            segundos = time.perf_counter() - inicio_lote
+            self.stdout.write(f'  Lote {i // lote + 1}: {len(enviados)} enviados, {len(errores)} errores, '
+                              f'{len(enviados) / segundos:.1f} correos/s')
+        por_lote = time.perf_counter() - inicio
+        self.stdout.write(f'Por lote: {cantidad} correos en {por_lote:.2f}s '
+                          f'({cantidad / por_lote:.1f} correos/s)')
+        self.stdout.write(self.style.SUCCESS(f'Aceleracion: {individual / por_lote:.1f}x'))
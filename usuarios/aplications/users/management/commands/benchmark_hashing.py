@@ -0,0 +1,41 @@
+""" Comando para medir como escala el hash de contraseñas con el numero de nucleos """
+
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from aplications.users.hashing import hashear_contraseñas
+
+
+class Command(BaseCommand):
+    """ Benchmark del pool de hashing con distintos numeros de workers
+
+    Ejemplo:
+        python manage.py benchmark_hashing --cantidad 200 --workers 1 2 4 8
+    """
+
+    help = 'Mide contraseñas hasheadas por segundo segun el numero de procesos'
+
+    def add_arguments(self, parser):
+        """ Argumentos del comando """
+        parser.add_argument('--cantidad', type=int, default=100, help='Contraseñas a hashear por corrida.')
+        parser.add_argument('--workers', type=int, nargs='+', default=None,
+                            help='Numeros de workers a probar (por defecto 1, 2, 4, ... hasta los nucleos).')
+
+    def handle(self, *args, **options):
+        """ Hashear la misma carga con cada numero de workers y comparar """
+        nucleos = os.cpu_count() or 1
+        workers = options['workers'] or sorted({2 ** i for i in range(nucleos.bit_length())} | {nucleos})
+        passwords = [f'contraseña-{i}' for i in range(options['cantidad'])]
+
+        base = None
+        self.stdout.write(f'Nucleos: {nucleos} - Contraseñas: {len(passwords)}')
+        for n in workers:
+            hashear_contraseñas(passwords[:n * 2], n) # Calentar el pool antes de medir
+            inicio = time.perf_counter()
+            hashear_contraseñas(passwords, n)
+            segundos = time.perf_counter() - inicio
+            base = base or segundos
+            self.stdout.write(f'Workers: {n:3d} - {segundos:7.2f}s - {len(passwords) / segundos:8.1f} hash/s '
+                              f'- aceleracion {base / segundos:4.1f}x')
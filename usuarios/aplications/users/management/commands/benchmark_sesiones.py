@@ -0,0 +1,80 @@
+""" Comando para comparar la I/O de sesiones por peticion con distintos SESSION_ENGINE """
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from aplications.users.models import User
+
+MOTORES = [
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+    'aplications.users.sesiones',
+]
+
+
+class Command(BaseCommand):
+    """ Login, peticiones autenticadas, peticiones anonimas y logout con cada motor de sesiones
+
+    Cuenta las consultas a django_session de cada fase (lo que el motor agrega a la
+    peticion) y el tiempo medio de las peticiones autenticadas.
+
+    Ejemplo:
+        python manage.py benchmark_sesiones --usuario admin --peticiones 200
+    """
+
+    help = 'Compara consultas a django_session por peticion entre motores de sesion'
+
+    def add_arguments(self, parser):
+        """ Argumentos del comando """
+        parser.add_argument('--usuario', help='Username con el que se inicia sesion.')
+        parser.add_argument('--ruta', default=None, help='Ruta autenticada a pedir (por defecto la lista).')
+        parser.add_argument('--peticiones', type=int, default=100, help='Peticiones por fase.')
+        parser.add_argument('--motores', nargs='+', default=MOTORES, help='Valores de SESSION_ENGINE a comparar.')
+
+    def usuario(self, username):
+        """ Usuario activo con el que se mide """
+        usuarios = User.objects.filter(is_active=True)
+        usuario = usuarios.filter(username=username).first() if username else usuarios.first()
+        if usuario is None:
+            raise CommandError('No hay un usuario activo para iniciar sesion')
+        return usuario
+
+    def fase(self, funcion, veces=1):
+        """ Ejecuta funcion veces; retorna (consultas a django_session por vez, ms por vez) """
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            for _ in range(veces):
+                funcion()
+            milisegundos = (time.perf_counter() - inicio) * 1000 / veces
+        sesion = [c for c in consultas.captured_queries if 'django_session' in c['sql']]
+        return len(sesion) / veces, milisegundos
+
+    def medir(self, usuario, ruta, peticiones):
+        """ Las cuatro fases con el SESSION_ENGINE actual """
+        client = Client()
+        home = reverse('home:home')
+        resultados = {'anonima': self.fase(lambda: client.get(home), peticiones)}
+        resultados['login'] = self.fase(lambda: client.force_login(usuario))
+        client.get(ruta) # Llenar la cache de la sesion, como cualquier peticion despues del login
+        resultados['autenticada'] = self.fase(lambda: client.get(ruta), peticiones)
+        resultados['logout'] = self.fase(lambda: client.get(reverse('users:logout')))
+        return resultados
+
+    def handle(self, *args, **options):
+        """ Medir cada motor y mostrar la tabla """
+        usuario = self.usuario(options['usuario'])
+        ruta = options['ruta'] or reverse('users:user-list')
+        self.stdout.write(f'Consultas a django_session por peticion (ms por peticion), {options["peticiones"]} '
+                          f'peticiones a {ruta}; cache de sesiones: {settings.SESSION_CACHE_ALIAS}')
+        self.stdout.write(f'{"motor":45s} {"anonima":>16s} {"login":>16s} {"autenticada":>16s} {"logout":>16s}')
+        for motor in options['motores']:
+            with override_settings(SESSION_ENGINE=motor):
+                resultados = self.medir(usuario, ruta, options['peticiones'])
+            columnas = ' '.join(f'{consultas:6.2f} ({ms:6.2f}ms)' for consultas, ms in resultados.values())
+            self.stdout.write(f'{motor:45s} {columnas}')
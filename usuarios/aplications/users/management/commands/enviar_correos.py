@@ -0,0 +1,49 @@
+""" Comando para drenar la cola de correos pendientes """
+
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from aplications.home import metricas
+from aplications.users.correos import despachar_pendientes, hay_lote_listo
+
+
+class Command(BaseCommand):
+    """ Worker que envia los correos encolados en lotes, con reintentos y backoff """
+
+    help = 'Envia los correos pendientes del outbox (python manage.py enviar_correos)'
+
+    def add_arguments(self, parser):
+        """ Argumentos del comando """
+        parser.add_argument('--lote', type=int, default=None,
+                            help='Correos por lote y por conexion SMTP (por defecto CORREOS_LOTE).')
+        parser.add_argument('--flush', type=float, default=None,
+                            help='Segundos maximos que se espera a completar un lote (por defecto CORREOS_FLUSH).')
+        parser.add_argument('--intervalo', type=float, default=1.0,
+                            help='Segundos entre revisiones de la cola.')
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Drenar la cola una vez, sin esperar lotes completos, y terminar.')
+
+    def handle(self, *args, **options):
+        """ Ciclo principal del worker """
+        lote = options['lote'] or settings.CORREOS_LOTE # Tamaño del lote
+        flush = options['flush'] if options['flush'] is not None else settings.CORREOS_FLUSH
+        ultimo_envio = time.monotonic() # Momento del ultimo envio
+
+        while True:
+            if metricas.toca_volcar(): # Tiempos SMTP visibles en el /metrics de la web
+                metricas.volcar()
+            if options['una_vez'] or hay_lote_listo(lote, ultimo_envio, flush):
+                resultado = despachar_pendientes(lote) # Enviar un lote por una conexion
+                ultimo_envio = time.monotonic()
+                if resultado.enviados or resultado.fallidos:
+                    self.stdout.write(
+                        f'Enviados: {resultado.enviados} - Fallidos: {resultado.fallidos} - '
+                        f'{resultado.segundos:.2f}s ({resultado.por_segundo:.1f} correos/s)'
+                    )
+                    continue # Seguir drenando mientras haya correos
+                if options['una_vez']: # Terminar si solo se queria drenar la cola
+                    metricas.volcar()
+                    break
+            time.sleep(options['intervalo']) # Esperar antes de volver a revisar la cola
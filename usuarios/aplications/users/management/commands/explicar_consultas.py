@@ -0,0 +1,102 @@
+""" Comando para revisar los planes de ejecucion de las consultas de UserManager """
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from aplications.users.busqueda import CAMPOS_BUSQUEDA, buscar_usuarios
+from aplications.users.models import User
+from aplications.users.processor import hash_code
+
+# Indices que cada consulta debe poder usar en PostgreSQL
+INDICES_ESPERADOS = {
+    'buscar_usuarios': [f'users_user_{campo}_upper_trgm' for campo in CAMPOS_BUSQUEDA],
+}
+
+
+def consultas():
+    """ Consultas de UserManager y del admin, con valores de ejemplo """
+    usuarios = User.objects
+    return {
+        'listar_usuarios (primera pagina)': usuarios.listar_usuarios().order_by('username')[:11],
+        'pagina_por_username (after)': usuarios.filter(username__gt='m').order_by('username')[:11],
+        'buscar_por_email': usuarios.filter(email='usuario@example.com'),
+        'buscar_por_username': usuarios.filter(username='usuario'),
+        'buscar_por_codigo_verificador': usuarios.filter(
+            is_active=False, codigo_verificacion__codigo_hash=hash_code('ABC123'),
+            codigo_verificacion__expira__gt=timezone.now()),
+        'usuarios_activos': usuarios.usuarios_activos().order_by('username')[:100],
+        'usuarios_inactivos': usuarios.usuarios_inactivos().order_by('username')[:100],
+        'contar_usuarios (exacto)': usuarios.order_by().values('is_active').annotate(total=Count('id')),
+        'admin: genero + is_active': usuarios.filter(genero='F', is_active=True).order_by('username')[:100],
+        'admin: is_staff + is_superuser': usuarios.filter(is_staff=True, is_superuser=False).order_by('username')[:100],
+        'admin: genero': usuarios.filter(genero='M').order_by('username')[:100],
+        'buscar_usuarios': buscar_usuarios('maria')[:100],
+    }
+
+
+def indices_faltantes(queryset, indices):
+    """Indices de la lista que el plan de la consulta no usa.
+
+    El plan se pide con enable_seqscan = off: con una tabla chica el planner prefiere
+    recorrerla completa, pero si un indice sirve para la consulta lo elige.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SET LOCAL enable_seqscan = off')
+        plan = queryset.explain()
+    return [indice for indice in indices if indice not in plan]
+
+
+class Command(BaseCommand):
+    """ Imprime el EXPLAIN de cada consulta, para comparar antes y despues de migrar los indices
+
+    Ejemplo:
+        python manage.py migrate users 0006
+        python manage.py explicar_consultas --guardar antes.json
+        python manage.py migrate users
+        python manage.py explicar_consultas --comparar antes.json
+    """
+
+    help = 'Imprime los planes EXPLAIN de las consultas de UserManager'
+
+    def add_arguments(self, parser):
+        """ Argumentos del comando """
+        parser.add_argument('--guardar', default=None, help='Guardar los planes en un archivo JSON.')
+        parser.add_argument('--comparar', default=None, help='Archivo JSON con los planes anteriores.')
+        parser.add_argument('--analyze', action='store_true', help='Usar EXPLAIN ANALYZE (solo PostgreSQL).')
+
+    def handle(self, *args, **options):
+        """ Imprimir (y guardar o comparar) los planes """
+        anteriores = {}
+        if options['comparar']:
+            with open(options['comparar'], 'r', encoding='utf-8') as f:
+                anteriores = json.load(f)
+
+        opciones = {'analyze': True} if options['analyze'] else {}
+        planes = {}
+        for nombre, queryset in consultas().items():
+            planes[nombre] = queryset.explain(**opciones)
+            self.stdout.write(self.style.MIGRATE_HEADING(nombre))
+            if nombre in anteriores:
+                self.stdout.write(self.style.WARNING('-- antes'))
+                self.stdout.write(anteriores[nombre])
+                self.stdout.write(self.style.SUCCESS('-- despues'))
+            self.stdout.write(planes[nombre] + '\n')
+
+        if connection.vendor == 'postgresql':
+            errores = []
+            for nombre, indices in INDICES_ESPERADOS.items():
+                faltantes = indices_faltantes(consultas()[nombre], indices)
+                if faltantes:
+                    errores.append(f'{nombre}: no usa {", ".join(faltantes)}')
+            if errores:
+                raise CommandError('Consultas sin los indices esperados:\n  ' + '\n  '.join(errores))
+            self.stdout.write(self.style.SUCCESS('Las busquedas usan los indices trigram'))
+
+        if options['guardar']:
+            with open(options['guardar'], 'w', encoding='utf-8') as f:
+                json.dump(planes, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'Planes guardados en {options["guardar"]}'))
@@ -0,0 +1,37 @@
+""" Comando para exportar el directorio de usuarios en streaming """
+
+from django.core.management.base import BaseCommand
+
+from aplications.users.exportar import filas_usuarios, exportar_csv, exportar_jsonl, convertir_booleano
+from aplications.users.routers import usar_replicas
+
+
+class Command(BaseCommand):
+    """ Exporta los usuarios a CSV o JSONL con memoria constante
+
+    Ejemplo:
+        python manage.py export_users --formato jsonl --is-active true --salida activos.jsonl
+    """
+
+    help = 'Exporta username, email, nombres, apellidos, genero e is_active de todos los usuarios'
+
+    def add_arguments(self, parser):
+        """ Argumentos del comando """
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], default='csv', help='Formato de salida.')
+        parser.add_argument('--salida', default=None, help='Archivo de salida (por defecto la salida estandar).')
+        parser.add_argument('--is-active', default=None, help='Filtrar por estado (true/false).')
+        parser.add_argument('--genero', default=None, help='Filtrar por genero (M/F/O).')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Filas por lectura a la base de datos.')
+
+    def handle(self, *args, **options):
+        """ Escribir las filas a medida que llegan de la base de datos (de una replica si hay) """
+        with usar_replicas():
+            filas = filas_usuarios(is_active=convertir_booleano(options['is_active']),
+                                   genero=options['genero'], chunk_size=options['chunk_size'])
+            lineas = exportar_jsonl(filas) if options['formato'] == 'jsonl' else exportar_csv(filas)
+            if options['salida']:
+                with open(options['salida'], 'w', encoding='utf-8', newline='') as salida:
+                    salida.writelines(lineas)
+            else:
+                for linea in lineas:
+                    self.stdout.write(linea, ending='')
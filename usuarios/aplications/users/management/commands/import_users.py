@@ -0,0 +1,125 @@
+""" Comando para importar usuarios de forma masiva desde CSV o JSONL """
+
+import csv
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models.functions import Lower
+
+from aplications.users.forms import UserImportForm
+from aplications.users.hashing import hashear_contraseñas
+from aplications.users.managers import en_lotes
+from aplications.users.models import User
+
+CAMPOS = ['username', 'email', 'nombres', 'apellidos', 'genero', 'password']
+
+
+class Command(BaseCommand):
+    """ Importa usuarios en lotes con bulk_create, en memoria constante
+
+    Ejemplo:
+        python manage.py import_users socios.csv --lote 2000 --rechazos rechazos.jsonl
+    """
+
+    help = 'Importa usuarios desde un archivo CSV o JSONL con las reglas de UserRegisterForm'
+
+    def add_arguments(self, parser):
+        """ Argumentos del comando """
+        parser.add_argument('archivo', help='Archivo CSV (con encabezado) o JSONL.')
+        parser.add_argument('--formato', choices=['csv', 'jsonl'], default=None,
+                            help='Formato del archivo (por defecto segun la extension).')
+        parser.add_argument('--lote', type=int, default=1000, help='Usuarios por INSERT.')
+        parser.add_argument('--rechazos', default=None,
+                            help='Archivo JSONL para las filas rechazadas (por defecto <archivo>.rechazos.jsonl).')
+        parser.add_argument('--workers', type=int, default=None,
+                            help='Procesos para hashear contraseñas (por defecto HASH_WORKERS).')
+        parser.add_argument('--inactivos', action='store_true',
+                            help='Crear los usuarios inactivos (por defecto se crean activos).')
+
+    def leer_filas(self, archivo, formato):
+        """ Genera las filas del archivo una a una, sin cargarlo completo """
+        with open(archivo, 'r', encoding='utf-8', newline='') as f:
+            if formato == 'csv':
+                yield from csv.DictReader(f)
+            else:
+                for numero, linea in enumerate(f, start=1):
+                    if not linea.strip(): # Saltar lineas vacias
+                        continue
+                    try:
+                        yield json.loads(linea)
+                    except json.JSONDecodeError as e:
+                        yield {'_error': f'Linea {numero}: JSON invalido ({e})'}
+
+    def rechazo(self, fila, errores)-> dict:
+        """ Linea del archivo de rechazos; la contraseña en texto plano no se escribe """
+        return {'fila': {campo: valor for campo, valor in fila.items() if campo != 'password'}, 'errores': errores}
+
+    def validar_lote(self, filas):
+        """ Valida un lote de filas y retorna (usuarios validos, rechazos) """
+        candidatos, rechazos = [], []
+        for fila in filas:
+            if '_error' in fila:
+                rechazos.append(self.rechazo(fila, {'__all__': [{'message': fila['_error'], 'code': 'invalid'}]}))
+                continue
+            form = UserImportForm({campo: (fila.get(campo) or '') for campo in CAMPOS})
+            if form.is_valid():
+                candidatos.append((fila, form.cleaned_data))
+            else:
+                rechazos.append(self.rechazo(fila, form.errors.get_json_data()))
+
+        # Unicidad contra la base de datos: una consulta por lote para cada campo.
+        # El email se compara en minusculas, como la restriccion user_email_lower_unico
+        usernames = {datos['username'] for _, datos in candidatos}
+        emails = {datos['email'].lower() for _, datos in candidatos}
+        usados_username = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        usados_email = set(User.objects.annotate(email_minusculas=Lower('email'))
+                           .filter(email_minusculas__in=emails).values_list('email_minusculas', flat=True))
+
+        validos = []
+        for fila, datos in candidatos:
+            errores = {}
+            if datos['username'] in usados_username:
+                errores['username'] = [{'message': 'El nombre de usuario ya esta en uso.', 'code': 'unique'}]
+            if datos['email'].lower() in usados_email:
+                errores['email'] = [{'message': 'El correo electronico ya esta en uso.', 'code': 'unique'}]
+            if errores:
+                rechazos.append(self.rechazo(fila, errores))
+                continue
+            # Marcar como usados para detectar duplicados dentro del mismo lote
+            usados_username.add(datos['username'])
+            usados_email.add(datos['email'].lower())
+            validos.append(datos)
+        return validos, rechazos
+
+    def handle(self, *args, **options):
+        """ Importar el archivo lote a lote """
+        archivo = Path(options['archivo'])
+        if not archivo.exists():
+            raise CommandError(f'No existe el archivo {archivo}')
+        formato = options['formato'] or ('csv' if archivo.suffix.lower() == '.csv' else 'jsonl')
+        ruta_rechazos = options['rechazos'] or f'{archivo}.rechazos.jsonl'
+        activos = not options['inactivos']
+
+        creados = rechazados = 0
+        with open(ruta_rechazos, 'w', encoding='utf-8') as salida_rechazos:
+            for filas in en_lotes(self.leer_filas(archivo, formato), options['lote']):
+                validos, rechazos = self.validar_lote(filas)
+                # Hashear las contraseñas del lote en paralelo en todos los nucleos
+                hashes = hashear_contraseñas([datos['password'] for datos in validos], options['workers'])
+                usuarios = [
+                    User(username=datos['username'], email=datos['email'],
+                         nombres=datos['nombres'], apellidos=datos['apellidos'],
+                         genero=datos['genero'], is_active=activos,
+                         password=password)
+                    for datos, password in zip(validos, hashes)
+                ]
+                User.objects.crear_usuarios(usuarios) # Un INSERT por lote
+                for rechazo in rechazos:
+                    salida_rechazos.write(json.dumps(rechazo, ensure_ascii=False) + '\n')
+                creados += len(usuarios)
+                rechazados += len(rechazos)
+                self.stdout.write(f'Creados: {creados} - Rechazados: {rechazados}')
+
+        self.stdout.write(self.style.SUCCESS(f'Importacion terminada: {creados} creados, '
+                                             f'{rechazados} rechazados ({ruta_rechazos})'))
@@ -0,0 +1,47 @@
+""" Comando para eliminar las sesiones expiradas de django_session """
+
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+
+from aplications.users.sesiones import borrar_expiradas
+
+
+class Command(BaseCommand):
+    """ Elimina las sesiones expiradas en lotes cortos, para no bloquear la tabla
+
+    A diferencia de clearsessions con los motores de Django, nunca borra todas las
+    expiradas en un solo DELETE. Las sesiones firmadas no estan en la tabla.
+
+    Ejemplo (cron cada hora, o como proceso con --intervalo):
+        python manage.py limpiar_sesiones --lote 1000 --pausa 0.05
+    """
+
+    help = 'Elimina en lotes las sesiones expiradas'
+
+    def add_arguments(self, parser):
+        """ Argumentos del comando """
+        parser.add_argument('--lote', type=int, default=settings.SESIONES_LOTE, help='Sesiones eliminadas por DELETE.')
+        parser.add_argument('--pausa', type=float, default=settings.SESIONES_PAUSA, help='Segundos entre lotes.')
+        parser.add_argument('--intervalo', type=float, default=None,
+                            help='Repetir la limpieza cada N segundos en lugar de terminar.')
+
+    def limpiar(self, lote, pausa):
+        """ Una pasada completa; reporta lotes, sesiones eliminadas y duracion """
+        inicio = time.perf_counter()
+        lotes = eliminadas = 0
+        for borradas in borrar_expiradas(Session, lote, pausa):
+            lotes += 1
+            eliminadas += borradas
+        self.stdout.write(f'Sesiones expiradas eliminadas: {eliminadas} en {lotes} lotes '
+                          f'({time.perf_counter() - inicio:.2f}s)')
+
+    def handle(self, *args, **options):
+        """ Limpiar las sesiones expiradas """
+        while True:
+            self.limpiar(options['lote'], options['pausa'])
+            if options['intervalo'] is None: # Una sola pasada
+                break
+            time.sleep(options['intervalo'])
@@ -0,0 +1,32 @@
+""" Comando para eliminar los codigos de verificacion expirados """
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from aplications.users.models import CodigoVerificacion
+
+
+class Command(BaseCommand):
+    """ Elimina los codigos expirados en lotes cortos, para no bloquear la tabla
+
+    Ejemplo (cron cada hora, o como proceso con --intervalo):
+        python manage.py purgar_codigos --lote 1000
+    """
+
+    help = 'Elimina en lotes los codigos de verificacion expirados'
+
+    def add_arguments(self, parser):
+        """ Argumentos del comando """
+        parser.add_argument('--lote', type=int, default=1000, help='Codigos eliminados por DELETE.')
+        parser.add_argument('--intervalo', type=float, default=None,
+                            help='Repetir la purga cada N segundos en lugar de terminar.')
+
+    def handle(self, *args, **options):
+        """ Purgar los codigos expirados """
+        while True:
+            eliminados = CodigoVerificacion.objects.purgar_expirados(options['lote'])
+            self.stdout.write(f'Codigos expirados eliminados: {eliminados}')
+            if options['intervalo'] is None: # Una sola pasada
+                break
+            time.sleep(options['intervalo'])
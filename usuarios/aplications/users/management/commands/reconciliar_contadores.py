@@ -0,0 +1,21 @@
+""" Comando para corregir la deriva de los contadores de usuarios """
+
+from django.core.management.base import BaseCommand
+
+from aplications.users.models import User, ContadorUsuarios
+
+
+class Command(BaseCommand):
+    """ Recalcula los contadores por is_active y genero con un solo GROUP BY """
+
+    help = 'Recalcula la tabla de contadores de usuarios desde la tabla de usuarios'
+
+    def handle(self, *args, **options):
+        """ Reconciliar los contadores y mostrar las diferencias corregidas """
+        diferencias = ContadorUsuarios.objects.reconciliar(User.objects.all())
+        for (is_active, genero), (antes, despues) in sorted(diferencias.items()):
+            self.stdout.write(f'activo={is_active} genero={genero or "-"}: {antes} -> {despues}')
+        if diferencias:
+            self.stdout.write(self.style.WARNING(f'Contadores corregidos: {len(diferencias)}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Los contadores estaban al dia.'))
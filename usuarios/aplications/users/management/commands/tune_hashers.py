@@ -0,0 +1,96 @@
+""" Comando para medir el costo de los hashers de contraseñas y recomendar su configuracion """
+
+import math
+import statistics
+import time
+
+from django.contrib.auth.hashers import BCryptSHA256PasswordHasher
+from django.core.management.base import BaseCommand
+
+from aplications.users.hashers import Argon2AjustadoHasher, PBKDF2AjustadoHasher, ScryptAjustadoHasher
+
+# algoritmo: (clase, atributo, factores a medir, setting, escala)
+CANDIDATOS = {
+    'pbkdf2_sha256': (PBKDF2AjustadoHasher, 'iterations', [100_000, 300_000, 600_000, 1_000_000],
+                      'HASHER_PBKDF2_ITERACIONES', 'lineal'),
+    'scrypt': (ScryptAjustadoHasher, 'work_factor', [2 ** 14, 2 ** 15, 2 ** 16],
+               'HASHER_SCRYPT_WORK_FACTOR', 'potencia'),
+    'argon2': (Argon2AjustadoHasher, 'time_cost', [1, 2, 3, 4], 'HASHER_ARGON2_TIME_COST', 'lineal'),
+    'bcrypt_sha256': (BCryptSHA256PasswordHasher, 'rounds', [10, 11, 12, 13], None, 'exponencial'),
+}
+
+
+class Command(BaseCommand):
+    """ Mide cada hasher disponible con varios factores de trabajo en esta maquina
+
+    Ejemplo:
+        python manage.py tune_hashers --objetivo-ms 250
+    """
+
+    help = 'Mide los hashers disponibles y recomienda un factor de trabajo para un presupuesto de latencia'
+
+    def add_arguments(self, parser):
+        """ Argumentos del comando """
+        parser.add_argument('--objetivo-ms', type=float, default=250.0,
+                            help='Latencia objetivo por hash en milisegundos.')
+        parser.add_argument('--repeticiones', type=int, default=3, help='Mediciones por factor (se usa la mediana).')
+        parser.add_argument('--algoritmos', nargs='+', choices=list(CANDIDATOS), default=list(CANDIDATOS),
+                            help='Algoritmos a medir.')
+
+    def medir(self, clase, atributo, factor, repeticiones)-> float:
+        """ Mediana en milisegundos de encode() con el factor dado """
+        hasher = type('HasherMedido', (clase,), {atributo: factor})() # Fijar el factor en una subclase
+        salt = hasher.salt()
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            hasher.encode('contraseña-de-prueba', salt)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+        return statistics.median(tiempos)
+
+    def recomendar(self, escala, factor, ms, objetivo):
+        """ Extrapola el factor que alcanza el objetivo a partir de una medicion """
+        if escala == 'lineal':
+            return max(1, int(factor * objetivo / ms))
+        if escala == 'potencia': # Potencias de dos (scrypt N)
+            return 2 ** max(1, int(math.log2(factor * objetivo / ms)))
+        return max(4, factor + int(math.log2(objetivo / ms))) # bcrypt: cada round duplica el costo
+
+    def handle(self, *args, **options):
+        """ Medir y recomendar """
+        objetivo = options['objetivo_ms']
+        recomendaciones = []
+        for algoritmo in options['algoritmos']:
+            clase, atributo, factores, setting, escala = CANDIDATOS[algoritmo]
+            if clase.library: # Verificar dependencias opcionales (argon2-cffi, bcrypt)
+                try:
+                    clase()._load_library()
+                except ValueError:
+                    libreria = clase.library[0] if isinstance(clase.library, tuple) else clase.library
+                    self.stdout.write(self.style.WARNING(f'{algoritmo}: no disponible (falta {libreria})'))
+                    continue
+
+            self.stdout.write(self.style.MIGRATE_HEADING(algoritmo))
+            mediciones = []
+            for factor in factores:
+                ms = self.medir(clase, atributo, factor, options['repeticiones'])
+                self.stdout.write(f'  {atributo}={factor:<10} {ms:9.1f} ms')
+                mediciones.append((factor, ms))
+                if ms > objetivo * 2: # No vale la pena seguir subiendo
+                    break
+            # Extrapolar desde la medicion mas cercana al objetivo
+            factor, ms = min(mediciones, key=lambda medicion: abs(math.log(medicion[1] / objetivo)))
+            recomendado = self.recomendar(escala, factor, ms, objetivo)
+            ms = self.medir(clase, atributo, recomendado, options['repeticiones'])
+            self.stdout.write(self.style.SUCCESS(f'  recomendado {atributo}={recomendado} ({ms:.1f} ms)'))
+            recomendaciones.append((algoritmo, setting, atributo, recomendado, ms))
+
+        if not recomendaciones:
+            return
+        self.stdout.write(self.style.MIGRATE_HEADING(f'\nConfiguracion sugerida para {objetivo:.0f} ms por hash:'))
+        for algoritmo, setting, atributo, recomendado, ms in recomendaciones:
+            if setting:
+                self.stdout.write(f'{setting} = {recomendado}  # {algoritmo}, {ms:.1f} ms')
+            else:
+                self.stdout.write(f'# {algoritmo}: subclase con {atributo} = {recomendado} ({ms:.1f} ms)')
+        self.stdout.write('Los usuarios existentes se re-hashean al iniciar sesion (check_password + must_update).')
@@ -0,0 +1,73 @@
+""" Comando para precalentar un worker y medir el costo de arranque """
+
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from aplications.home.calentamiento import abrir_conexiones, compilar_templates, medir_importaciones, resolver_rutas
+from aplications.users.disponibilidad import construir
+
+
+class Command(BaseCommand):
+    """ Compila los templates, resuelve las rutas de users: y home:, abre las conexiones y arma el filtro
+
+    En produccion wsgi.py/asgi.py ya llaman a precargar() al importarse (antes del fork
+    con gunicorn --preload), gunicorn.conf.py arma el filtro de disponibilidad en
+    when_ready y abre las conexiones en post_fork; este comando sirve para medir cada
+    paso y como chequeo de arranque del contenedor.
+
+    Ejemplo:
+        python manage.py warmup --importaciones 15 --salida arranque.json
+    """
+
+    help = 'Precalienta templates, urls, conexiones y el filtro de disponibilidad y reporta el tiempo de importacion por modulo'
+
+    def add_arguments(self, parser):
+        """ Argumentos del comando """
+        parser.add_argument('--sin-conexiones', action='store_true', help='No abrir conexiones a la base de datos.')
+        parser.add_argument('--importaciones', type=int, default=0,
+                            help='Mostrar los N modulos mas lentos de importar (0 no mide).')
+        parser.add_argument('--modulo', default='usuarios.wsgi', help='Modulo de arranque a medir.')
+        parser.add_argument('--salida', help='Archivo JSON con los tiempos, para comparar entre versiones.')
+
+    def paso(self, nombre, funcion):
+        """ Ejecuta un paso y retorna (resultado, milisegundos) """
+        inicio = time.perf_counter()
+        resultado = funcion()
+        milisegundos = (time.perf_counter() - inicio) * 1000
+        self.stdout.write(f'{nombre:14s} {milisegundos:8.1f}ms')
+        return resultado, milisegundos
+
+    def handle(self, *args, **options):
+        """ Ejecutar cada paso y reportar sus tiempos """
+        reporte = {}
+        templates, reporte['templates_ms'] = self.paso('Templates', compilar_templates)
+        rutas, reporte['rutas_ms'] = self.paso('Rutas', resolver_rutas)
+        self.stdout.write(f'  {len(templates)} templates, {len(rutas)} rutas')
+        if not options['sin_conexiones']:
+            conexiones, reporte['conexiones_ms'] = self.paso('Conexiones', abrir_conexiones)
+            for alias, milisegundos in conexiones.items():
+                self.stdout.write(f'  {alias}: {milisegundos:.1f}ms')
+            filtro, reporte['disponibilidad_ms'] = self.paso('Disponibilidad', construir)
+            reporte['disponibilidad'] = estadisticas = filtro.estadisticas()
+            self.stdout.write(f'  {estadisticas["elementos"]} elementos, {estadisticas["bytes"]} bytes, '
+                              f'{estadisticas["hashes"]} hashes, '
+                              f'{estadisticas["falsos_positivos"]:.4%} falsos positivos estimados')
+
+        if options['importaciones']:
+            importaciones = medir_importaciones(options['modulo'])
+            total = sum(i.acumulado_us for i in importaciones if i.nivel == 0)
+            self.stdout.write(f'Importaciones ({options["modulo"]}): {total / 1000:.1f}ms en total')
+            propios = [i for i in importaciones if i.modulo.split('.')[0] in ('aplications', 'usuarios')]
+            lentos = importaciones[:options['importaciones']]
+            for importacion in lentos + [i for i in propios if i not in lentos]:
+                self.stdout.write(f'  {importacion.acumulado_us / 1000:8.1f}ms  {importacion.propio_us / 1000:8.1f}ms  '
+                                  f'{importacion.modulo}')
+            reporte['importaciones_total_us'] = total
+            reporte['importaciones_us'] = {i.modulo: i.acumulado_us for i in importaciones}
+
+        if options['salida']:
+            with open(options['salida'], 'w', encoding='utf-8') as archivo:
+                json.dump(reporte, archivo, indent=2)
+        self.stdout.write(self.style.SUCCESS('Worker precalentado'))
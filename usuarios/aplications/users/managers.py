@@ -1,9 +1,56 @@
 
 
-from django.db import models
+from datetime import timedelta
+from itertools import islice
+
+from django.db import models, transaction, IntegrityError
+from django.conf import settings
+from django.db.models import F, Count, Sum, Case, When, Value, Exists, OuterRef
+from django.utils import timezone
 
 from django.contrib.auth.models import BaseUserManager
 
+from .fragmentos import invalidar_lista
+from .hashing import hashear_contraseñas
+from .routers import alias_lectura
+from .processor import hash_code
+
+
+
+TAMANO_LOTE = 1000 # Filas por sentencia en las operaciones masivas
+
+
+def en_lotes(valores, lote=TAMANO_LOTE):
+    """ Recorre un iterable (o un queryset de usernames) en listas de a lo mas lote elementos """
+    if isinstance(valores, models.QuerySet): # Un queryset se recorre por username sin cargar modelos
+        valores = valores.values_list('username', flat=True).iterator(chunk_size=lote)
+    iterador = iter(valores)
+    while True:
+        bloque = list(islice(iterador, lote))
+        if not bloque:
+            return
+        yield bloque
+
+
+def contadores():
+    """ Retorna el manager de contadores de usuarios (import diferido para evitar ciclos) """
+    from .models import ContadorUsuarios # pylint: disable=import-outside-toplevel
+    return ContadorUsuarios.objects
+
+
+def ocupar(usernames=(), emails=()):
+    """ Marca usernames y emails como ocupados en el filtro de disponibilidad, para escrituras sin post_save """
+    from .disponibilidad import agregar_usuario # pylint: disable=import-outside-toplevel
+    for username in usernames:
+        agregar_usuario(username=username)
+    for email in emails:
+        agregar_usuario(email=email)
+
+
+def invalidar_cache(*ids):
+    """ Quita usuarios de la cache de autenticacion al confirmar, para escrituras que no emiten post_save """
+    from .backends import invalidar_usuarios # pylint: disable=import-outside-toplevel
+    invalidar_usuarios(*ids)
 
 
 class UserManager(BaseUserManager, models.Manager):
@@ -21,7 +68,9 @@ class UserManager(BaseUserManager, models.Manager):
                           **extra_fields) # Asignar campos extra
 
         user.set_password(password) # Establecer la contraseña hasheada
-        user.save(using=self._db) # Guardar el usuario en la base de datos
+        with transaction.atomic(using=self._db):
+            user.save(using=self._db) # Guardar el usuario en la base de datos
+            contadores().ajustar(is_active, user.genero, 1) # Sumar el usuario a su contador
         return user # Retornar el usuario creado
 
     def create_user(self,  username, email, password=None, **extra_fields):
@@ -47,30 +96,112 @@ class UserManager(BaseUserManager, models.Manager):
             is_active=True, # Está activo
             **extra_fields) # Asignar campos extra
 
+    def crear_usuarios(self, usuarios):
+        """ Inserta una lista de usuarios ya armados (contraseña hasheada) con bulk_create
+
+        Returns:
+            list: Los usuarios insertados.
+        """
+        grupos = {} # Usuarios por (is_active, genero) para los contadores
+        for usuario in usuarios:
+            clave = (usuario.is_active, usuario.genero or '')
+            grupos[clave] = grupos.get(clave, 0) + 1
+        with transaction.atomic(using=self._db):
+            creados = self.bulk_create(usuarios) # Un INSERT multi-fila
+            for (is_active, genero), total in grupos.items():
+                contadores().ajustar(is_active, genero, total) # Sumar los usuarios a sus contadores
+        invalidar_lista() # bulk_create no emite post_save
+        ocupar([usuario.username for usuario in creados], [usuario.email for usuario in creados])
+        return creados
+
+    def lectura(self):
+        """ Queryset para lecturas del directorio: una replica si la peticion no escribio recientemente
+
+        Solo para leer; update() o delete() sobre este queryset escribirian en la replica.
+        """
+        return self.using(alias_lectura())
+
     def listar_usuarios(self):
         """ Retorna una lista de todos los usuarios """
-        return self.all() # Retornar todos los usuarios
+        return self.lectura() # Retornar todos los usuarios
+
+    def pagina_por_username(self, after=None, before=None, cantidad=10):
+        """ Retorna una pagina de usuarios por cursor (keyset) sobre el indice unico de username
+
+        Args:
+            after (str): Username despues del cual empieza la pagina.
+            before (str): Username antes del cual termina la pagina.
+            cantidad (int): Usuarios por pagina.
+        Returns:
+            tuple: (usuarios, cursor_anterior, cursor_siguiente), los cursores son None si no hay pagina.
+        """
+        usuarios = list(self._consulta_pagina(after, before, cantidad))
+        return self._armar_pagina(usuarios, after, before, cantidad)
+
+    async def apagina_por_username(self, after=None, before=None, cantidad=10):
+        """ Version asincrona de pagina_por_username, con iteracion asincrona del ORM """
+        usuarios = [usuario async for usuario in self._consulta_pagina(after, before, cantidad)]
+        return self._armar_pagina(usuarios, after, before, cantidad)
+
+    def _consulta_pagina(self, after, before, cantidad):
+        """ Queryset de la pagina con un usuario extra para saber si hay mas """
+        if before: # Pagina anterior: recorrer el indice hacia atras
+            return self.lectura().filter(username__lt=before).order_by('-username')[:cantidad + 1]
+        usuarios = self.lectura().order_by('username') # Primera pagina o pagina siguiente
+        if after:
+            usuarios = usuarios.filter(username__gt=after)
+        return usuarios[:cantidad + 1]
+
+    def _armar_pagina(self, usuarios, after, before, cantidad):
+        """ Recorta la pagina leida por _consulta_pagina y calcula los cursores """
+        if before: # Dar vuelta el resultado de la pagina anterior
+            hay_anterior = len(usuarios) > cantidad # Se pidio uno extra para saber si hay mas
+            usuarios = usuarios[:cantidad][::-1]
+            hay_siguiente = True # Existe al menos el usuario del cursor
+        else:
+            hay_siguiente = len(usuarios) > cantidad # Se pidio uno extra para saber si hay mas
+            usuarios = usuarios[:cantidad]
+            hay_anterior = bool(after)
+
+        anterior = usuarios[0].username if usuarios and hay_anterior else None
+        siguiente = usuarios[-1].username if usuarios and hay_siguiente else None
+        return usuarios, anterior, siguiente
+
+    def exportar_usuarios(self, campos, is_active=None, genero=None):
+        """ Retorna un queryset de tuplas con los campos dados, filtrado por estado y genero """
+        usuarios = self.lectura().order_by('username') # Orden estable sobre el indice unico
+        if is_active is not None:
+            usuarios = usuarios.filter(is_active=is_active)
+        if genero is not None:
+            usuarios = usuarios.filter(genero=genero)
+        return usuarios.values_list(*campos) # Tuplas en lugar de instancias del modelo
 
     def buscar_por_email(self, email):
         """ Retorna un usuario por su correo electrónico """
-        return self.get(email=email) # Retornar el usuario con el correo electrónico dado
+        return self.lectura().get(email=email) # Retornar el usuario con el correo electrónico dado
 
     def buscar_por_username(self, username):
         """ Retorna un usuario por su nombre de usuario """
-        return self.get(username=username) # Retornar el usuario con el nombre de usuario dado
+        return self.lectura().get(username=username) # Retornar el usuario con el nombre de usuario dado
 
     def eliminar_usuario(self, username):
         """ Elimina un usuario por su nombre de usuario """
-        usuario = self.get(username=username) # Obtener el usuario por su nombre de usuario
-        usuario.is_active = False # Desactivar el usuario
-        usuario.save() # Guardar los cambios en el usuario
+        with transaction.atomic(using=self._db):
+            usuario = self.select_for_update().get(username=username) # Obtener el usuario por su nombre de usuario
+            estaba_activo = usuario.is_active # Estado previo para actualizar los contadores
+            usuario.is_active = False # Desactivar el usuario
+            usuario.save() # Guardar los cambios en el usuario
+            contadores().mover(usuario.genero, estaba_activo, False) # Mover el usuario entre contadores
         return usuario # Retornar el usuario eliminado
 
     def activar_usuario(self, username):
         """ Activa un usuario por su nombre de usuario """
-        usuario = self.get(username=username) # Obtener el usuario por su nombre de usuario
-        usuario.is_active = True # Activar el usuario
-        usuario.save() # Guardar los cambios en el usuario
+        with transaction.atomic(using=self._db):
+            usuario = self.select_for_update().get(username=username) # Obtener el usuario por su nombre de usuario
+            estaba_activo = usuario.is_active # Estado previo para actualizar los contadores
+            usuario.is_active = True # Activar el usuario
+            usuario.save() # Guardar los cambios en el usuario
+            contadores().mover(usuario.genero, estaba_activo, True) # Mover el usuario entre contadores
         return usuario # Retornar el usuario activado
 
     def actualizar_contraseña(self, username, new_password):
@@ -94,29 +225,245 @@ class UserManager(BaseUserManager, models.Manager):
         usuario.save() # Guardar los cambios en el usuario
         return usuario # Retornar el usuario con el nombre completo actualizado
 
+    def _cambiar_estado_masivo(self, usernames, activo, lote):
+        """ Cambia is_active de varios usuarios con un UPDATE por lote y retorna las filas afectadas """
+        afectados = 0
+        for bloque in en_lotes(usernames, lote):
+            with transaction.atomic(using=self._db):
+                # Solo las filas que cambian de estado, para que los contadores cuadren
+                cambian = list(self.filter(username__in=bloque, is_active=not activo).values_list('id', 'genero'))
+                ids = [id_ for id_, _ in cambian]
+                filas = self.filter(id__in=ids).update(is_active=activo) # Un solo UPDATE por lote
+                grupos = {}
+                for _, genero in cambian:
+                    grupos[genero] = grupos.get(genero, 0) + 1
+                for genero, total in grupos.items():
+                    contadores().mover(genero, not activo, activo, total)
+            invalidar_cache(*ids) # update() no emite post_save
+            afectados += filas
+        return afectados
+
+    def eliminar_usuarios(self, usernames, lote=TAMANO_LOTE):
+        """ Desactiva varios usuarios (iterable de usernames o queryset) y retorna las filas afectadas """
+        return self._cambiar_estado_masivo(usernames, False, lote)
+
+    def activar_usuarios(self, usernames, lote=TAMANO_LOTE):
+        """ Activa varios usuarios (iterable de usernames o queryset) y retorna las filas afectadas """
+        return self._cambiar_estado_masivo(usernames, True, lote)
+
+    def actualizar_emails(self, cambios, lote=TAMANO_LOTE):
+        """ Actualiza el email de varios usuarios
+
+        Args:
+            cambios (dict): {username: nuevo_email}.
+        Returns:
+            int: Filas afectadas.
+        """
+        afectados = 0
+        for bloque in en_lotes(cambios, lote):
+            # Un solo UPDATE ... SET email = CASE username WHEN ... END WHERE username IN (...)
+            nuevo_email = Case(*[When(username=username, then=Value(cambios[username])) for username in bloque],
+                               output_field=models.EmailField())
+            afectados += self.filter(username__in=bloque).update(email=nuevo_email)
+            invalidar_cache(*self.filter(username__in=bloque).values_list('id', flat=True))
+            invalidar_lista() # El email se muestra en la lista
+            ocupar(emails=[cambios[username] for username in bloque])
+        return afectados
+
+    def actualizar_contraseñas(self, cambios, lote=TAMANO_LOTE):
+        """ Actualiza la contraseña de varios usuarios con bulk_update sobre la columna password
+
+        Args:
+            cambios (dict): {username: nueva_contraseña}.
+        Returns:
+            int: Filas afectadas.
+        """
+        afectados = 0
+        for bloque in en_lotes(cambios, lote):
+            usuarios = list(self.filter(username__in=bloque).only('id', 'username', 'password'))
+            # Hashear el lote en paralelo en todos los nucleos
+            hashes = hashear_contraseñas([cambios[usuario.username] for usuario in usuarios])
+            for usuario, password in zip(usuarios, hashes):
+                usuario.password = password # Asignar la contraseña ya hasheada
+            afectados += self.bulk_update(usuarios, ['password']) # Solo la columna password
+            invalidar_cache(*[usuario.id for usuario in usuarios]) # Cambia el hash de sesion
+        return afectados
+
     def usuarios_activos(self):
         """ Retorna una lista de usuarios activos """
-        return self.filter(is_active=True) # Retornar los usuarios que están activos
+        return self.lectura().filter(is_active=True) # Retornar los usuarios que están activos
 
     def usuarios_inactivos(self):
         """ Retorna una lista de usuarios inactivos """
-        return self.filter(is_active=False) # Retornar los usuarios que están inactivos
+        return self.lectura().filter(is_active=False) # Retornar los usuarios que están inactivos
 
-    def contar_usuarios(self):
-        """ Retorna el número total de usuarios """
-        return self.count() # Retornar el conteo de usuarios
+    def contar_usuarios(self, exacto=False):
+        """ Retorna el número total de usuarios
 
-    def contar_usuarios_activos(self):
+        Por defecto lee los contadores mantenidos; con exacto=True hace un COUNT(*).
+        """
+        if exacto:
+            return self.lectura().count() # Retornar el conteo exacto de usuarios
+        return contadores().total() # Retornar el conteo desde los contadores
+
+    def contar_usuarios_activos(self, exacto=False):
         """ Retorna el número de usuarios activos """
-        return self.filter(is_active=True).count() # Retornar el conteo de usuarios activos
+        if exacto:
+            return self.lectura().filter(is_active=True).count() # Retornar el conteo exacto de usuarios activos
+        return contadores().total(is_active=True) # Retornar el conteo desde los contadores
 
-    def contar_usuarios_inactivos(self):
+    def contar_usuarios_inactivos(self, exacto=False):
         """ Retorna el número de usuarios inactivos """
-        return self.filter(is_active=False).count() # Retornar el conteo de usuarios inactivos
+        if exacto:
+            return self.lectura().filter(is_active=False).count() # Retornar el conteo exacto de usuarios inactivos
+        return contadores().total(is_active=False) # Retornar el conteo desde los contadores
+
+    def buscar_por_codigo_verificador(self, codigo, solo_pendientes=True):
+        """ Retorna un usuario por su código verificador vigente
+
+        Con solo_pendientes=True (por defecto) busca solo entre usuarios inactivos.
+        """
+        usuarios = self.lectura().filter(codigo_verificacion__codigo_hash=hash_code(codigo), # Comparar contra el hash
+                               codigo_verificacion__expira__gt=timezone.now()) # Solo codigos vigentes
+        if solo_pendientes:
+            usuarios = usuarios.filter(is_active=False)
+        return usuarios.get() # Retornar el usuario con el código verificador dado
+
+
+class CodigoVerificacionManager(models.Manager):
+    """ Manager para los codigos de verificacion con expiracion """
+
+    def emitir(self, user, codigo):
+        """ Guarda el hash del codigo de un usuario con su fecha de expiracion """
+        expira = timezone.now() + timedelta(seconds=settings.CODIGO_VERIFICACION_TTL)
+        return self.create(user=user, codigo_hash=hash_code(codigo), expira=expira)
+
+    def redimir(self, username, codigo):
+        """ Activa al usuario si el codigo coincide, no expiro y no agoto los intentos
+
+        La activacion es un unico UPDATE condicional sobre users_user; el resto
+        (borrar el codigo y mover los contadores) solo ocurre si el UPDATE afecto una fila.
+
+        Returns:
+            bool: True si el usuario quedo activado.
+        """
+        User = self.model._meta.get_field('user').related_model # pylint: disable=invalid-name
+        vigente = self.filter(user=OuterRef('pk'), # Codigo del mismo usuario
+                              codigo_hash=hash_code(codigo), # Que coincida con el hash
+                              expira__gt=timezone.now(), # Que no haya expirado
+                              intentos__lt=settings.CODIGO_VERIFICACION_MAX_INTENTOS) # Con intentos disponibles
+        with transaction.atomic(using=self.db):
+            filas = (User._default_manager.filter(username=username, is_active=False)
+                     .filter(Exists(vigente)).update(is_active=True))
+            if not filas: # Codigo incorrecto, expirado o usuario inexistente: sumar un intento
+                self.filter(user__username=username).update(intentos=F('intentos') + 1)
+                return False
+            self.filter(user__username=username).delete() # El codigo ya se uso
+            user_id, genero = User._default_manager.values_list('id', 'genero').get(username=username)
+            contadores().mover(genero, False, True) # Mover el usuario al contador de activos
+        invalidar_cache(user_id) # update() no emite post_save
+        return True
+
+    def purgar_expirados(self, lote=TAMANO_LOTE):
+        """ Elimina los codigos expirados en lotes y retorna cuantos elimino """
+        eliminados = 0
+        while True:
+            ids = list(self.filter(expira__lte=timezone.now()).values_list('id', flat=True)[:lote])
+            if not ids: # No quedan codigos expirados
+                return eliminados
+            eliminados += self.filter(id__in=ids).delete()[0] # Un DELETE corto por lote
+
+
+class ContadorUsuariosManager(models.Manager):
+    """ Manager para los contadores de usuarios por is_active y genero """
+
+    def ajustar(self, is_active, genero, delta):
+        """ Suma delta al contador de (is_active, genero), creandolo si no existe """
+        genero = genero or '' # El genero puede venir vacio
+        filas = self.filter(is_active=is_active, genero=genero).update(total=F('total') + delta)
+        if filas: # El contador ya existia
+            return
+        try:
+            with transaction.atomic(using=self.db):
+                self.create(is_active=is_active, genero=genero, total=delta) # Crear el contador
+        except IntegrityError:
+            # Otra peticion creo el contador al mismo tiempo, sumar sobre el existente
+            self.filter(is_active=is_active, genero=genero).update(total=F('total') + delta)
+
+    def mover(self, genero, estaba_activo, esta_activo, cantidad=1):
+        """ Mueve usuarios entre el contador activo y el inactivo de un genero """
+        if estaba_activo == esta_activo: # Si no cambio el estado, no hay nada que mover
+            return
+        self.ajustar(estaba_activo, genero, -cantidad) # Restar del contador anterior
+        self.ajustar(esta_activo, genero, cantidad) # Sumar al contador nuevo
+
+    def total(self, **filtros):
+        """ Retorna la suma de los contadores que cumplen los filtros (is_active, genero) """
+        # En una replica salvo despues de una escritura reciente o dentro de una transaccion
+        return self.using(alias_lectura()).filter(**filtros).aggregate(total=Sum('total'))['total'] or 0
+
+    def reconciliar(self, usuarios):
+        """ Recalcula los contadores desde el queryset de usuarios y retorna las diferencias
+
+        Returns:
+            dict: {(is_active, genero): (antes, despues)} solo para los contadores que cambiaron.
+        """
+        with transaction.atomic(using=self.db):
+            antes = {(c.is_active, c.genero): c.total for c in self.select_for_update()}
+            # Un solo GROUP BY sobre la tabla de usuarios
+            reales = {(fila['is_active'], fila['genero']): fila['total']
+                      for fila in usuarios.order_by().values('is_active', 'genero').annotate(total=Count('id'))}
+            diferencias = {}
+            for clave in set(antes) | set(reales):
+                if antes.get(clave, 0) != reales.get(clave, 0):
+                    diferencias[clave] = (antes.get(clave, 0), reales.get(clave, 0))
+                    self.update_or_create(is_active=clave[0], genero=clave[1],
+                                          defaults={'total': reales.get(clave, 0)})
+        return diferencias
+
+
+class CorreoPendienteManager(models.Manager):
+    """ Manager para la cola de correos pendientes (outbox) """
+
+    def encolar(self, asunto, mensaje, remitente, destinatario):
+        """ Encola un correo para que lo envie el worker """
+        return self.create(asunto=asunto, # Asunto del correo
+                           mensaje=mensaje, # Mensaje del correo
+                           remitente=remitente, # Correo remitente
+                           destinatario=destinatario) # Correo destinatario
 
-    def buscar_por_codigo_verificador(self, codigo):
-        """ Retorna un usuario por su código verificador """
-        return self.get(codigo_verificador=codigo) # Retornar el usuario con el código verificador dado
+    def pendientes(self, ahora=None):
+        """ Retorna los correos pendientes cuyo proximo intento ya vencio """
+        ahora = ahora or timezone.now() # Momento de referencia
+        return self.filter(estado=self.model.PENDIENTE, proximo_intento__lte=ahora)
 
+    def reclamar(self, lote, bloqueo):
+        """ Reserva un lote de correos pendientes para un worker y los retorna """
+        ahora = timezone.now() # Momento de referencia
+        with transaction.atomic(using=self.db):
+            # skip_locked permite que varios workers drenen la cola sin pisarse
+            ids = list(self.pendientes(ahora)
+                       .select_for_update(skip_locked=True)
+                       .order_by('proximo_intento')
+                       .values_list('id', flat=True)[:lote])
+            if not ids: # Si no hay correos por enviar, retornar lista vacia
+                return []
+            # Posponer los correos reservados para que otro worker no los tome
+            self.filter(id__in=ids).update(proximo_intento=ahora + bloqueo,
+                                           intentos=F('intentos') + 1)
+        return list(self.filter(id__in=ids).order_by('id')) # Retornar los correos reservados
 
+    def marcar_enviados(self, ids):
+        """ Marca como enviados los correos con los ids dados """
+        return self.filter(id__in=ids).update(estado=self.model.ENVIADO, # Estado enviado
+                                              enviado=timezone.now(), # Fecha de envio
+                                              ultimo_error='') # Limpiar el ultimo error
 
+    def marcar_fallido(self, correo, error, max_intentos, backoff):
+        """ Reprograma un correo con backoff exponencial o lo marca como fallido """
+        if correo.intentos >= max_intentos: # Si se agotaron los intentos, marcar como fallido
+            return self.filter(id=correo.id).update(estado=self.model.FALLIDO, ultimo_error=error)
+        # Esperar backoff * 2^(intentos - 1) antes del siguiente intento
+        espera = timedelta(seconds=backoff * 2 ** (correo.intentos - 1))
+        return self.filter(id=correo.id).update(proximo_intento=timezone.now() + espera,
+                                                ultimo_error=error)
@@ -0,0 +1,54 @@
+""" Middleware de lecturas en replicas con lectura de las propias escrituras """
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .routers import EstadoReplica, estado_replica
+
+
+class ReplicaMiddleware:
+    """ Habilita las replicas durante la peticion y fija al cliente a la primaria si escribio
+
+    Una peticion que escribe (POST de registro, login, cambio de contraseña) deja la
+    cookie REPLICA_COOKIE por REPLICA_LAG_TOLERANCIA segundos; mientras exista, las
+    lecturas de ese cliente van a la primaria y no ven una replica atrasada.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        """ Constructor del middleware """
+        self.get_response = get_response
+        self.es_async = iscoroutinefunction(get_response)
+        if self.es_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        """ Ejecuta la peticion con su EstadoReplica """
+        if self.es_async:
+            return self.__acall__(request)
+        estado = EstadoReplica(primaria=settings.REPLICA_COOKIE in request.COOKIES)
+        token = estado_replica.set(estado)
+        try:
+            response = self.get_response(request)
+        finally:
+            estado_replica.reset(token)
+        return self.fijar_primaria(estado, response)
+
+    async def __acall__(self, request):
+        """ Version async de __call__ """
+        estado = EstadoReplica(primaria=settings.REPLICA_COOKIE in request.COOKIES)
+        token = estado_replica.set(estado) # sync_to_async copia el contexto
+        try:
+            response = await self.get_response(request)
+        finally:
+            estado_replica.reset(token)
+        return self.fijar_primaria(estado, response)
+
+    def fijar_primaria(self, estado, response):
+        """ Renovar la cookie si la peticion escribio """
+        if estado.escribio and settings.DATABASE_REPLICAS:
+            response.set_cookie(settings.REPLICA_COOKIE, '1', max_age=settings.REPLICA_LAG_TOLERANCIA,
+                                httponly=True, samesite='Lax')
+        return response
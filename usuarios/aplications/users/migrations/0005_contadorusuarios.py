@@ -0,0 +1,39 @@
+# Generated by Django 6.0.1 on 2026-10-18 09:10
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def poblar_contadores(apps, schema_editor):
+    """ Inicializa los contadores con los usuarios existentes """
+    User = apps.get_model('users', 'User')
+    ContadorUsuarios = apps.get_model('users', 'ContadorUsuarios')
+    grupos = User.objects.order_by().values('is_active', 'genero').annotate(total=Count('id'))
+    ContadorUsuarios.objects.bulk_create(
+        [ContadorUsuarios(is_active=g['is_active'], genero=g['genero'], total=g['total']) for g in grupos]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0004_correopendiente'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContadorUsuarios',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('is_active', models.BooleanField(verbose_name='Activo')),
+                ('genero', models.CharField(blank=True, choices=[('M', 'Masculino'), ('F', 'Femenino'), ('O', 'Otro')], max_length=1, verbose_name='Genero')),
+                ('total', models.BigIntegerField(default=0, verbose_name='Total')),
+            ],
+            options={
+                'verbose_name': 'Contador de Usuarios',
+                'verbose_name_plural': 'Contadores de Usuarios',
+                'constraints': [models.UniqueConstraint(fields=('is_active', 'genero'), name='contador_activo_genero_unico')],
+            },
+        ),
+        migrations.RunPython(poblar_contadores, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,61 @@
+from django.db import migrations
+
+CAMPOS_BUSQUEDA = ('username', 'email', 'nombres', 'apellidos')
+
+SQL_SQLITE = [
+    # Tabla FTS5 de contenido externo con tokenizer trigram (busqueda por subcadena)
+    "CREATE VIRTUAL TABLE users_user_fts USING fts5("
+    "username, email, nombres, apellidos, content='users_user', content_rowid='id', tokenize='trigram')",
+    # Triggers para mantener la tabla FTS5 sincronizada con users_user
+    "CREATE TRIGGER users_user_fts_ai AFTER INSERT ON users_user BEGIN "
+    "INSERT INTO users_user_fts(rowid, username, email, nombres, apellidos) "
+    "VALUES (new.id, new.username, new.email, new.nombres, new.apellidos); END",
+    "CREATE TRIGGER users_user_fts_ad AFTER DELETE ON users_user BEGIN "
+    "INSERT INTO users_user_fts(users_user_fts, rowid, username, email, nombres, apellidos) "
+    "VALUES ('delete', old.id, old.username, old.email, old.nombres, old.apellidos); END",
+    "CREATE TRIGGER users_user_fts_au AFTER UPDATE OF username, email, nombres, apellidos ON users_user BEGIN "
+    "INSERT INTO users_user_fts(users_user_fts, rowid, username, email, nombres, apellidos) "
+    "VALUES ('delete', old.id, old.username, old.email, old.nombres, old.apellidos); "
+    "INSERT INTO users_user_fts(rowid, username, email, nombres, apellidos) "
+    "VALUES (new.id, new.username, new.email, new.nombres, new.apellidos); END",
+    # Indexar los usuarios existentes
+    "INSERT INTO users_user_fts(users_user_fts) VALUES ('rebuild')",
+]
+
+SQL_SQLITE_REVERSA = [
+    "DROP TRIGGER IF EXISTS users_user_fts_ai",
+    "DROP TRIGGER IF EXISTS users_user_fts_ad",
+    "DROP TRIGGER IF EXISTS users_user_fts_au",
+    "DROP TABLE IF EXISTS users_user_fts",
+]
+
+SQL_POSTGRESQL = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"] + [
+    # Un indice GIN trigram por columna. icontains compila a UPPER(col::text) LIKE UPPER(%s) y no
+    # los usa: 0009 los reemplaza por indices sobre esa expresion
+    f"CREATE INDEX IF NOT EXISTS users_user_{campo}_trgm ON users_user USING gin ({campo} gin_trgm_ops)"
+    for campo in CAMPOS_BUSQUEDA
+]
+
+SQL_POSTGRESQL_REVERSA = [f"DROP INDEX IF EXISTS users_user_{campo}_trgm" for campo in CAMPOS_BUSQUEDA]
+
+
+def ejecutar(sql_por_motor):
+    """ Retorna una funcion que ejecuta el SQL correspondiente al motor de la base de datos """
+    def operacion(apps, schema_editor):
+        for sentencia in sql_por_motor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sentencia)
+    return operacion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_contadorusuarios'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            ejecutar({'postgresql': SQL_POSTGRESQL, 'sqlite': SQL_SQLITE}),
+            ejecutar({'postgresql': SQL_POSTGRESQL_REVERSA, 'sqlite': SQL_SQLITE_REVERSA}),
+        ),
+    ]
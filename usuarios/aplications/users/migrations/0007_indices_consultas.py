@@ -0,0 +1,34 @@
+# Generated by Django 6.0.1 on 2026-10-18 10:40
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_busqueda_usuarios'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_active', False), models.Q(('codigo_verificador', ''), _negated=True)), fields=['codigo_verificador'], name='user_verificacion_pend_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_active', 'genero', 'username'], name='user_activo_genero_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['genero', 'username'], name='user_genero_username_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(fields=['is_staff', 'is_superuser', 'username'], name='user_staff_super_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(django.db.models.functions.text.Lower('email'), name='user_email_lower_unico'),
+        ),
+    ]
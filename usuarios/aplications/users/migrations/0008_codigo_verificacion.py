@@ -0,0 +1,64 @@
+# Generated by Django 6.0.1 on 2026-10-18 11:20
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+
+
+def hash_code(codigo):
+    """ Copia de aplications.users.processor.hash_code al crear esta migracion: no debe cambiar con ella """
+    return salted_hmac('aplications.users.codigo_verificacion', codigo.strip().upper(),
+                       algorithm='sha256').hexdigest()
+
+
+def mover_codigos(apps, schema_editor):
+    """ Pasa los codigos de los usuarios pendientes a la tabla de codigos, como hash """
+    User = apps.get_model('users', 'User')
+    CodigoVerificacion = apps.get_model('users', 'CodigoVerificacion')
+    expira = timezone.now() + timedelta(seconds=settings.CODIGO_VERIFICACION_TTL)
+    pendientes = (User.objects.filter(is_active=False).exclude(codigo_verificador='')
+                  .values_list('id', 'codigo_verificador').iterator(chunk_size=1000))
+    lote = []
+    for user_id, codigo in pendientes:
+        lote.append(CodigoVerificacion(user_id=user_id, codigo_hash=hash_code(codigo), expira=expira))
+        if len(lote) >= 1000:
+            CodigoVerificacion.objects.bulk_create(lote)
+            lote = []
+    CodigoVerificacion.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0007_indices_consultas'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CodigoVerificacion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('codigo_hash', models.CharField(db_index=True, max_length=64, verbose_name='Hash del Codigo')),
+                ('expira', models.DateTimeField(db_index=True, verbose_name='Expira')),
+                ('intentos', models.PositiveSmallIntegerField(default=0, verbose_name='Intentos')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='codigo_verificacion', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Codigo de Verificacion',
+                'verbose_name_plural': 'Codigos de Verificacion',
+            },
+        ),
+        migrations.RunPython(mover_codigos, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='user',
+            name='user_verificacion_pend_idx',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='codigo_verificador',
+        ),
+    ]
@@ -0,0 +1,41 @@
+""" Indices trigram sobre la expresion que usa la busqueda en PostgreSQL
+
+En PostgreSQL, icontains compila a UPPER("users_user"."campo"::text) LIKE UPPER(%s).
+Los indices de 0006 son sobre la columna y el planner no los puede usar para esa
+expresion; estos si (un Bitmap Index Scan por campo, combinados con BitmapOr).
+"""
+
+from django.db import migrations
+
+CAMPOS_BUSQUEDA = ('username', 'email', 'nombres', 'apellidos')
+
+SQL_POSTGRESQL = [f"DROP INDEX IF EXISTS users_user_{campo}_trgm" for campo in CAMPOS_BUSQUEDA] + [
+    f"CREATE INDEX IF NOT EXISTS users_user_{campo}_upper_trgm ON users_user "
+    f"USING gin ((UPPER({campo}::text)) gin_trgm_ops)"
+    for campo in CAMPOS_BUSQUEDA
+]
+
+SQL_POSTGRESQL_REVERSA = [f"DROP INDEX IF EXISTS users_user_{campo}_upper_trgm" for campo in CAMPOS_BUSQUEDA] + [
+    f"CREATE INDEX IF NOT EXISTS users_user_{campo}_trgm ON users_user USING gin ({campo} gin_trgm_ops)"
+    for campo in CAMPOS_BUSQUEDA
+]
+
+
+def ejecutar(sentencias):
+    """ Retorna una funcion que ejecuta las sentencias solo en PostgreSQL (SQLite usa la tabla FTS5) """
+    def operacion(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            for sentencia in sentencias:
+                schema_editor.execute(sentencia)
+    return operacion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_codigo_verificacion'),
+    ]
+
+    operations = [
+        migrations.RunPython(ejecutar(SQL_POSTGRESQL), ejecutar(SQL_POSTGRESQL_REVERSA)),
+    ]
@@ -1,8 +1,10 @@
 """ Modelos de la aplicacion de usuarios """
 
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import AbstractUser, PermissionsMixin
-from .managers import UserManager
+from django.utils import timezone
+from .managers import UserManager, CodigoVerificacionManager, ContadorUsuariosManager, CorreoPendienteManager
 # Create your models here.
 
 class User(AbstractUser, PermissionsMixin):
@@ -17,7 +19,6 @@ class User(AbstractUser, PermissionsMixin):
     nombres = models.CharField('First Names', max_length=100, blank=True)
     apellidos = models.CharField('Last Names', max_length=100, blank=True)
     genero = models.CharField('Genero', max_length=1, choices=(genero_choice), blank=True)
-    codigo_verificador = models.CharField('Codigo Verificador', max_length=6, blank=True)
     is_active = models.BooleanField('Activo', default=False)
 
     USERNAME_FIELD = 'username'
@@ -25,6 +26,29 @@ class User(AbstractUser, PermissionsMixin):
 
     objects = UserManager()
 
+    class Meta(AbstractUser.Meta):
+        """ Indices segun las consultas de UserManager y del admin """
+        indexes = [
+            # usuarios_activos/inactivos y filtros del admin por estado y genero, ordenados por username
+            models.Index(fields=['is_active', 'genero', 'username'], name='user_activo_genero_idx'),
+            models.Index(fields=['genero', 'username'], name='user_genero_username_idx'),
+            # Filtros del admin por permisos, ordenados por username
+            models.Index(fields=['is_staff', 'is_superuser', 'username'], name='user_staff_super_idx'),
+        ]
+        constraints = [
+            # El correo es unico sin importar mayusculas y minusculas
+            models.UniqueConstraint(Lower('email'), name='user_email_lower_unico'),
+        ]
+
+    def get_session_auth_hash(self)-> str:
+        """ Retorna el hash de sesion, usando el precalculado si el usuario viene de la cache """
+        return getattr(self, 'session_auth_hash_cache', None) or super().get_session_auth_hash()
+
+    def set_password(self, raw_password):
+        """ Establece la contraseña y descarta el hash de sesion precalculado """
+        self.session_auth_hash_cache = None
+        super().set_password(raw_password)
+
     def get_short_name(self)-> str:
         """ Retorna el nombre corto del usuario """
         return self.username
@@ -33,3 +57,79 @@ class User(AbstractUser, PermissionsMixin):
         """ Retorna el nombre completo del usuario """
         return f"{self.nombres} {self.apellidos}"
 
+
+class CodigoVerificacion(models.Model):
+    """ Codigo de verificacion pendiente de un usuario, guardado como hash y con expiracion """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='codigo_verificacion')
+    codigo_hash = models.CharField('Hash del Codigo', max_length=64, db_index=True)
+    expira = models.DateTimeField('Expira', db_index=True)
+    intentos = models.PositiveSmallIntegerField('Intentos', default=0)
+
+    objects = CodigoVerificacionManager()
+
+    class Meta:
+        """ Metadatos del modelo de codigos de verificacion """
+        verbose_name = 'Codigo de Verificacion'
+        verbose_name_plural = 'Codigos de Verificacion'
+
+    def __str__(self)-> str:
+        """ Representacion del codigo (nunca muestra el codigo) """
+        return f"{self.user_id} expira {self.expira:%Y-%m-%d %H:%M}"
+
+
+class ContadorUsuarios(models.Model):
+    """ Conteo mantenido de usuarios por estado y genero, evita COUNT(*) sobre User """
+    is_active = models.BooleanField('Activo')
+    genero = models.CharField('Genero', max_length=1, choices=User.genero_choice, blank=True)
+    total = models.BigIntegerField('Total', default=0)
+
+    objects = ContadorUsuariosManager()
+
+    class Meta:
+        """ Metadatos del modelo de contadores """
+        verbose_name = 'Contador de Usuarios'
+        verbose_name_plural = 'Contadores de Usuarios'
+        constraints = [
+            models.UniqueConstraint(fields=['is_active', 'genero'], name='contador_activo_genero_unico'),
+        ]
+
+    def __str__(self)-> str:
+        """ Representacion del contador """
+        return f"activo={self.is_active} genero={self.genero or '-'}: {self.total}"
+
+
+class CorreoPendiente(models.Model):
+    """ Correo encolado para ser enviado por el worker de correos """
+    PENDIENTE = 'P'
+    ENVIADO = 'E'
+    FALLIDO = 'F'
+    estado_choice = (
+        (PENDIENTE, 'Pendiente'),
+        (ENVIADO, 'Enviado'),
+        (FALLIDO, 'Fallido'),
+    )
+    asunto = models.CharField('Asunto', max_length=255)
+    mensaje = models.TextField('Mensaje')
+    remitente = models.CharField('Remitente', max_length=254)
+    destinatario = models.EmailField('Destinatario')
+    estado = models.CharField('Estado', max_length=1, choices=estado_choice, default=PENDIENTE)
+    intentos = models.PositiveSmallIntegerField('Intentos', default=0)
+    proximo_intento = models.DateTimeField('Proximo Intento', default=timezone.now)
+    ultimo_error = models.TextField('Ultimo Error', blank=True)
+    creado = models.DateTimeField('Creado', auto_now_add=True)
+    enviado = models.DateTimeField('Enviado', null=True, blank=True)
+
+    objects = CorreoPendienteManager()
+
+    class Meta:
+        """ Metadatos del modelo de correos pendientes """
+        verbose_name = 'Correo Pendiente'
+        verbose_name_plural = 'Correos Pendientes'
+        indexes = [
+            # Indice para que el worker encuentre rapido los correos por enviar
+            models.Index(fields=['estado', 'proximo_intento'], name='correo_estado_proximo_idx'),
+        ]
+
+    def __str__(self)-> str:
+        """ Representacion del correo pendiente """
+        return f"{self.asunto} -> {self.destinatario} ({self.get_estado_display()})"
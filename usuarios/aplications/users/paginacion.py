@@ -0,0 +1,78 @@
+""" Paginacion con total estimado para tablas grandes (admin y lista de usuarios). """
+
+import json
+
+from django.conf import settings
+from django.core.paginator import EmptyPage, Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+
+def filas_estimadas(queryset)-> int:
+    """Filas que el planner de PostgreSQL estima para el queryset, sin recorrer la tabla.
+
+    Sin filtros lee reltuples de pg_class (actualizado por ANALYZE/autovacuum);
+    con filtros toma las filas estimadas del plan de EXPLAIN.
+    """
+    with connections[queryset.db].cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                           [queryset.model._meta.db_table])
+            return max(cursor.fetchone()[0], 0) # -1 si la tabla nunca se analizo
+        sql, params = queryset.order_by().values('pk').query.sql_with_params()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+        if isinstance(plan, str): # Segun el adaptador el JSON llega sin decodificar
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows'])
+
+
+def contar(queryset):
+    """Total del queryset: estimado desde PAGINACION_UMBRAL filas en PostgreSQL, exacto si no.
+
+    Returns:
+        tuple: (total, aproximado).
+    """
+    if connections[queryset.db].vendor != 'postgresql': # SQLite no tiene estadisticas del planner
+        return queryset.count(), False
+    estimado = filas_estimadas(queryset)
+    if estimado < settings.PAGINACION_UMBRAL: # Tabla o resultado chico: el COUNT(*) es barato
+        return queryset.count(), False
+    return estimado, True
+
+
+class PaginadorEstimado(Paginator):
+    """ Paginator que evita el COUNT(*) sobre tablas grandes
+
+    aproximado indica si count es una estimacion, para mostrarlo asi en el template.
+    Con un total estimado se permiten paginas despues de la ultima calculada: pueden
+    venir vacias o tener resultados si la estimacion quedo corta.
+    """
+
+    aproximado = False
+
+    @cached_property
+    def count(self):
+        """ Total estimado o exacto segun contar() """
+        if not isinstance(self.object_list, QuerySet):
+            return super().count
+        total, self.aproximado = contar(self.object_list)
+        return total
+
+    def validate_number(self, number):
+        """ Con total estimado no se rechazan paginas mas alla de la ultima calculada """
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if not self.aproximado or int(number) < 1:
+                raise
+            return int(number)
+
+    def page(self, number):
+        """ Con total estimado la pagina no se recorta al total """
+        number = self.validate_number(number)
+        if not self.aproximado:
+            return super().page(number)
+        inicio = (number - 1) * self.per_page
+        return self._get_page(self.object_list[inicio:inicio + self.per_page], number, self)
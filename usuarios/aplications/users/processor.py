@@ -3,6 +3,8 @@
 import random # Importar el módulo random para generar números aleatorios
 import string # Importar el módulo string para obtener caracteres predefinidos
 
+from django.utils.crypto import salted_hmac # Importar HMAC con la SECRET_KEY del proyecto
+
 def code_generator(size=6, chars=string.ascii_uppercase + string.digits):
     """Generates a random code consisting of uppercase letters and digits.
 
@@ -15,3 +17,16 @@ def code_generator(size=6, chars=string.ascii_uppercase + string.digits):
     # Generate a random code by selecting 'size' characters from 'chars'
     return ''.join(random.choice(chars) for _ in range(size)) # Generar el código aleatorio
 
+
+def hash_code(code):
+    """Returns the keyed hash (HMAC-SHA256 with SECRET_KEY) of a verification code.
+
+    Args:
+        code (str): The verification code in plain text.
+    Returns:
+        str: The hexadecimal digest stored instead of the code.
+    """
+    # HMAC is enough for short-lived codes with an attempt limit; without
+    # SECRET_KEY a leaked hash cannot be brute forced offline
+    return salted_hmac('aplications.users.codigo_verificacion', code.strip().upper(), # Hashear el código
+                       algorithm='sha256').hexdigest()
@@ -0,0 +1,79 @@
+""" Enrutamiento de las lecturas del directorio de usuarios a las replicas de lectura. """
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class EstadoReplica:
+    """ Estado de una peticion: replica elegida y si debe leer de la primaria """
+
+    __slots__ = ('replica', 'primaria', 'escribio')
+
+    def __init__(self, primaria=False):
+        """ Elige una replica para toda la peticion, para que sus lecturas sean consistentes entre si """
+        replicas = settings.DATABASE_REPLICAS
+        self.replica = random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+        self.primaria = primaria # Escribio hace menos de REPLICA_LAG_TOLERANCIA segundos
+        self.escribio = False # Escribio en esta peticion
+
+
+# Estado de la peticion en curso; None fuera de una peticion (comandos, workers)
+estado_replica = ContextVar('estado_replica', default=None)
+
+
+def alias_lectura()-> str:
+    """Alias desde donde leer el directorio de usuarios.
+
+    Retorna la primaria fuera de una peticion (salvo dentro de usar_replicas), despues
+    de una escritura reciente del mismo cliente y dentro de una transaccion de la
+    primaria (la lectura debe ver lo que la transaccion escribio).
+    """
+    estado = estado_replica.get()
+    if estado is None or estado.primaria or estado.escribio:
+        return DEFAULT_DB_ALIAS
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        return DEFAULT_DB_ALIAS
+    return estado.replica
+
+
+@contextmanager
+def usar_replicas():
+    """ Permite leer de las replicas fuera de una peticion, por ejemplo en export_users """
+    token = estado_replica.set(EstadoReplica())
+    try:
+        yield
+    finally:
+        estado_replica.reset(token)
+
+
+class ReplicaRouter:
+    """ Router de DATABASE_ROUTERS: escrituras y migraciones solo en la primaria
+
+    Las lecturas no se enrutan aqui sino en los metodos de lectura de UserManager
+    (ver UserManager.lectura); el router solo registra que la peticion escribio
+    para que sus lecturas siguientes, y las del mismo cliente durante
+    REPLICA_LAG_TOLERANCIA segundos, vayan a la primaria.
+    """
+
+    def db_for_read(self, model, **hints):
+        """ Sin preferencia: las lecturas implicitas van a la primaria """
+        return None
+
+    def db_for_write(self, model, **hints):
+        """ Toda escritura va a la primaria y vuelve pegajosa la peticion """
+        estado = estado_replica.get()
+        if estado is not None:
+            estado.escribio = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        """ Primaria y replicas tienen los mismos datos """
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        """ Las replicas reciben el esquema por replicacion, no por migrate """
+        return db not in settings.DATABASE_REPLICAS
@@ -0,0 +1,144 @@
+""" Motor de sesiones (SESSION_ENGINE): cookie firmada sin login y cached_db con login.
+
+Las sesiones anonimas viajan firmadas en la cookie y no tocan la base de datos ni la
+cache; al iniciar sesion pasan a cached_db, que se puede invalidar en el servidor
+(logout, cambio de contraseña). Sus lecturas salen de la cache y solo las escrituras
+van a django_session.
+"""
+
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.core import signing
+from django.utils import timezone
+
+SAL_FIRMADA = 'aplications.users.sesiones' # Sal de la firma de las sesiones anonimas
+
+
+def es_firmada(session_key)-> bool:
+    """ Las claves de la base de datos son alfanumericas; una sesion firmada contiene ':' """
+    return bool(session_key) and ':' in session_key
+
+
+def borrar_expiradas(modelo, lote=None, pausa=0):
+    """Elimina las sesiones expiradas en lotes cortos, sin bloquear la tabla en un solo DELETE.
+
+    Args:
+        modelo: Modelo de las sesiones (SessionStore.get_model_class()).
+        lote (int): Sesiones por DELETE, por defecto SESIONES_LOTE.
+        pausa (float): Segundos entre lotes, para dejar pasar a las escrituras.
+    Yields:
+        int: Sesiones eliminadas en cada lote.
+    """
+    lote = lote or settings.SESIONES_LOTE
+    ahora = timezone.now() # Fijo, para no perseguir sesiones que expiran durante la limpieza
+    while True:
+        claves = list(modelo.objects.filter(expire_date__lt=ahora).values_list('session_key', flat=True)[:lote])
+        if not claves: # No quedan sesiones expiradas
+            return
+        yield modelo.objects.filter(session_key__in=claves).delete()[0] # Un DELETE corto por lote
+        if len(claves) < lote: # Era el ultimo lote
+            return
+        time.sleep(pausa)
+
+
+class SessionStore(CachedDBStore):
+    """ Sesion firmada en la cookie mientras no haya login, cached_db despues """
+
+    def autenticada(self)-> bool:
+        """ La sesion pertenece a un usuario que inicio sesion """
+        return SESSION_KEY in self._session
+
+    async def aautenticada(self)-> bool:
+        """ Version async de autenticada """
+        return SESSION_KEY in await self._aget_session()
+
+    def firmar(self):
+        """ Guarda la sesion anonima en la clave misma, como signed_cookies """
+        self._session_key = signing.dumps(self._session, compress=True, salt=SAL_FIRMADA,
+                                          serializer=self.serializer)
+        self.modified = True
+
+    def load(self):
+        """ Lee la sesion firmada de la cookie o la de la cache/base de datos """
+        if not es_firmada(self.session_key):
+            return super().load()
+        try:
+            return signing.loads(self.session_key, salt=SAL_FIRMADA, serializer=self.serializer,
+                                 max_age=self.get_session_cookie_age())
+        except Exception: # pylint: disable=broad-except
+            # Firma invalida o vencida: empezar una sesion nueva
+            self._session_key = None
+            return {}
+
+    async def aload(self):
+        """ Version async de load """
+        if not es_firmada(self.session_key):
+            return await super().aload()
+        return self.load() # Sin I/O
+
+    def exists(self, session_key):
+        """ Una sesion firmada no existe en el servidor """
+        return not es_firmada(session_key) and super().exists(session_key)
+
+    async def aexists(self, session_key):
+        """ Version async de exists """
+        return not es_firmada(session_key) and await super().aexists(session_key)
+
+    def create(self):
+        """ Una sesion anonima nueva no necesita una clave unica en la base de datos """
+        if not self.autenticada():
+            self.firmar()
+            return
+        super().create()
+
+    async def acreate(self):
+        """ Version async de create """
+        if not await self.aautenticada():
+            self.firmar()
+            return
+        await super().acreate()
+
+    def save(self, must_create=False):
+        """ Firma la sesion anonima; con login la guarda en cached_db con una clave nueva """
+        if not self.autenticada():
+            self.firmar()
+            return
+        if es_firmada(self.session_key): # Acaba de iniciar sesion
+            self._session_key = None # db.save crea la fila con una clave nueva
+        super().save(must_create)
+
+    async def asave(self, must_create=False):
+        """ Version async de save """
+        if not await self.aautenticada():
+            self.firmar()
+            return
+        if es_firmada(self.session_key):
+            self._session_key = None
+        await super().asave(must_create)
+
+    def delete(self, session_key=None):
+        """ Una sesion firmada no tiene nada que borrar en el servidor """
+        if es_firmada(session_key or self.session_key):
+            return
+        super().delete(session_key)
+
+    async def adelete(self, session_key=None):
+        """ Version async de delete """
+        if es_firmada(session_key or self.session_key):
+            return
+        await super().adelete(session_key)
+
+    @classmethod
+    def clear_expired(cls):
+        """ clearsessions tambien borra en lotes """
+        for _ in borrar_expiradas(cls.get_model_class(), pausa=settings.SESIONES_PAUSA):
+            pass
+
+    @classmethod
+    async def aclear_expired(cls):
+        """ Version async de clear_expired """
+        await sync_to_async(cls.clear_expired)()
@@ -0,0 +1,38 @@
+""" Señales de la aplicacion users """
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .backends import invalidar_usuarios
+from .disponibilidad import agregar_usuario
+from .fragmentos import CAMPOS_LISTA, invalidar_lista
+from .models import User
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidar_cache_usuario(sender, instance, using=None, **kwargs):
+    """ Quitar de la cache de autenticacion al usuario guardado o eliminado, despues del commit """
+    invalidar_usuarios(instance.pk, using=using)
+
+
+@receiver(post_save, sender=User)
+def invalidar_lista_guardado(sender, instance, created, update_fields=None, using=None, **kwargs):
+    """ Invalidar la lista cacheada si cambio un campo que se muestra (no en cada last_login) """
+    if created or update_fields is None or CAMPOS_LISTA & set(update_fields):
+        # Despues del commit, para que otra peticion no vuelva a cachear la lista sin el cambio
+        transaction.on_commit(invalidar_lista, using=using)
+
+
+@receiver(post_save, sender=User)
+def agregar_disponibilidad(sender, instance, using=None, **kwargs):
+    """ Marcar como ocupados el username y el email del usuario guardado en el filtro de este proceso """
+    username, email = instance.username, instance.email
+    transaction.on_commit(lambda: agregar_usuario(username, email), using=using)
+
+
+@receiver(post_delete, sender=User)
+def invalidar_lista_eliminado(sender, instance, using=None, **kwargs):
+    """ Invalidar la lista cacheada al eliminar un usuario """
+    transaction.on_commit(invalidar_lista, using=using)
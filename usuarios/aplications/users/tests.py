@@ -1,3 +1,450 @@
-from django.test import TestCase
+""" Tests de la aplicacion de usuarios """
 
-# Create your tests here.
+import json
+import tempfile
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.core.management import call_command
+from django.core.cache import caches
+from django.core import mail
+from django.core.mail import get_connection
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.http import HttpResponse
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from aplications.home.metricas import exportar
+
+from .backends import UsuarioCacheBackend, _clave, _local, _registro
+from .busqueda import buscar_usuarios
+from .correos import despachar_pendientes
+from .disponibilidad import construir, disponible
+from .fragmentos import version_lista
+from .limitador import ip_cliente, metricas_rechazos
+from .middleware import ReplicaMiddleware
+from .models import CodigoVerificacion, ContadorUsuarios, CorreoPendiente, User
+from .routers import ReplicaRouter, alias_lectura
+from .views import ExportarUsuariosAsyncView, UserListaAsync
+
+
+def limpiar_cache_autenticacion():
+    """ Los ids se repiten entre tests y la cache de autenticacion solo se invalida al confirmar """
+    _local.clear()
+    caches[settings.AUTH_CACHE].clear()
+
+
+class ImportUsersTest(TestCase):
+    """ Comando import_users """
+
+    def importar(self, contenido):
+        """ Importa un CSV con el contenido dado y retorna los rechazos """
+        with tempfile.TemporaryDirectory() as directorio:
+            archivo = Path(directorio) / 'usuarios.csv'
+            archivo.write_text('username,email,nombres,apellidos,genero,password\n' + contenido, encoding='utf-8')
+            call_command('import_users', str(archivo), workers=1, stdout=StringIO())
+            with open(f'{archivo}.rechazos.jsonl', encoding='utf-8') as rechazos:
+                return [json.loads(linea) for linea in rechazos]
+
+    def test_email_repetido_sin_importar_mayusculas(self):
+        """ Un email que solo cambia en mayusculas se rechaza, en el lote y contra la base de datos """
+        User.objects.create_user('existente', 'Pepe@X.com', 'clave12345')
+        rechazos = self.importar('ana,ana@x.com,A,B,F,clave12345\n'
+                                 'ana2,Ana@X.com,A,B,F,clave12345\n'
+                                 'pepe,pepe@x.com,P,P,M,clave12345\n')
+        self.assertEqual(list(User.objects.order_by('username').values_list('username', flat=True)),
+                         ['ana', 'existente'])
+        self.assertEqual([r['fila']['username'] for r in rechazos], ['ana2', 'pepe'])
+        self.assertTrue(all(r['errores']['email'][0]['code'] == 'unique' for r in rechazos))
+        self.assertFalse(any('password' in r['fila'] for r in rechazos)) # Sin contraseñas en texto plano
+
+
+class IpClienteTest(TestCase):
+    """ IP del cliente para el limite de logins """
+
+    def ip(self, **meta):
+        """ ip_cliente de una peticion con los META dados """
+        return ip_cliente(RequestFactory().get('/', **meta))
+
+    def test_remote_addr_por_defecto(self):
+        """ Sin proxy se ignora X-Forwarded-For """
+        self.assertEqual(self.ip(REMOTE_ADDR='10.0.0.5', HTTP_X_FORWARDED_FOR='1.1.1.1'), '10.0.0.5')
+
+    @override_settings(LOGIN_LIMITE_IP_HEADER='HTTP_X_FORWARDED_FOR', LOGIN_LIMITE_PROXIES=1)
+    def test_ignora_ips_escritas_por_el_cliente(self):
+        """ Se toma la IP que agrego el proxy, no la de la izquierda que manda el cliente """
+        self.assertEqual(self.ip(REMOTE_ADDR='127.0.0.1', HTTP_X_FORWARDED_FOR='6.6.6.6, 203.0.113.9'),
+                         '203.0.113.9')
+        self.assertEqual(self.ip(REMOTE_ADDR='127.0.0.1', HTTP_X_FORWARDED_FOR='203.0.113.9'), '203.0.113.9')
+
+    @override_settings(LOGIN_LIMITE_IP_HEADER='HTTP_X_FORWARDED_FOR', LOGIN_LIMITE_PROXIES=2)
+    def test_varios_proxies(self):
+        """ Con dos proxies el cliente es la penultima IP; si faltan saltos se usa REMOTE_ADDR """
+        self.assertEqual(self.ip(REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR='6.6.6.6, 203.0.113.9, 10.0.0.1'),
+                         '203.0.113.9')
+        self.assertEqual(self.ip(REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR='10.0.0.1'), '10.0.0.2')
+
+
+@override_settings(LOGIN_LIMITE_IP=2, CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class LimiteLoginTest(TestCase):
+    """ Limite de intentos de login y su metrica """
+
+    def test_rechazos_en_metrics(self):
+        """ Los rechazos por IP se cuentan y se exponen en /metrics; el log avisa una vez por ventana """
+        with self.assertLogs('aplications.users.limitador', 'WARNING') as logs:
+            for _ in range(5):
+                respuesta = self.client.post(reverse('users:login'), {'username': 'nadie', 'password': 'x'})
+        self.assertEqual(respuesta.status_code, 429)
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(metricas_rechazos()['ip'], 3)
+        self.assertIn('usuarios_login_rechazos_total{motivo="ip"} 3', exportar())
+
+
+class RegistroTest(TestCase):
+    """ Registro de usuarios: consultas, hash y errores de unicidad """
+
+    datos = {'username': 'ana', 'email': 'Ana@X.com', 'nombres': 'Ana', 'apellidos': 'B', 'genero': 'F',
+             'password': 'clave12345', 'password2': 'clave12345'}
+
+    def registrar(self, **cambios):
+        """ POST al registro con los datos base y los cambios dados """
+        return self.client.post(reverse('users:register'), dict(self.datos, **cambios))
+
+    def test_consultas_y_un_solo_hash(self):
+        """ El registro no consulta la unicidad antes del INSERT y hashea la contraseña una vez """
+        with mock.patch('django.contrib.auth.base_user.make_password', side_effect=hashers.make_password) as hash_:
+            # SAVEPOINT, INSERT del usuario, upsert del contador (UPDATE y, por ser el primero,
+            # SAVEPOINT + INSERT + RELEASE), codigo de verificacion, outbox del correo y RELEASE
+            with self.assertNumQueries(9):
+                respuesta = self.registrar()
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertEqual(hash_.call_count, 1)
+        self.assertTrue(User.objects.get(username='ana').check_password('clave12345'))
+
+    def test_username_repetido(self):
+        """ Un username repetido es un error del formulario, no un 500 """
+        self.registrar()
+        respuesta = self.registrar(email='otra@x.com')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(list(respuesta.context['form'].errors), ['username'])
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_email_repetido_en_otras_mayusculas(self):
+        """ Un email que solo cambia en mayusculas viola user_email_lower_unico y es un error del formulario """
+        self.registrar()
+        respuesta = self.registrar(username='ana2', email='ana@x.com')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['form'].errors, {'email': ['El correo electronico ya esta en uso.']})
+        self.assertEqual(User.objects.count(), 1)
+
+
+@override_settings(CORREOS_MAX_INTENTOS=3, CORREOS_BACKOFF=10)
+class OutboxTest(TestCase):
+    """ Cola de correos (CorreoPendiente) y worker de envio """
+
+    def encolar(self, destinatario='ana@x.com'):
+        """ Encola un correo de prueba """
+        return CorreoPendiente.objects.encolar('Asunto', 'Mensaje', 'no-reply@x.com', destinatario)
+
+    def test_transaccion_revertida(self):
+        """ Un correo encolado en una transaccion que se revierte no queda en la cola """
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            self.encolar()
+            raise RuntimeError
+        self.assertFalse(CorreoPendiente.objects.exists())
+
+    def test_despachar_por_lotes(self):
+        """ Cada lote se envia por una sola conexion y los correos quedan marcados como enviados """
+        for i in range(3):
+            self.encolar(f'u{i}@x.com')
+        with mock.patch('aplications.users.correos.get_connection', wraps=get_connection) as conexiones:
+            self.assertEqual(despachar_pendientes(lote=2)[:2], (2, 0))
+            self.assertEqual(despachar_pendientes(lote=2)[:2], (1, 0))
+            self.assertEqual(despachar_pendientes(lote=2)[:2], (0, 0)) # Cola vacia: no abre conexion
+        self.assertEqual(conexiones.call_count, 2)
+        self.assertEqual(sorted(m.to[0] for m in mail.outbox), ['u0@x.com', 'u1@x.com', 'u2@x.com'])
+        self.assertEqual(CorreoPendiente.objects.filter(estado=CorreoPendiente.ENVIADO, enviado__isnull=False).count(), 3)
+
+    def test_reintentos_con_backoff(self):
+        """ Cada fallo reprograma el correo con backoff exponencial hasta CORREOS_MAX_INTENTOS """
+        correo = self.encolar()
+        with mock.patch('aplications.users.correos.get_connection', side_effect=OSError('smtp caido')):
+            for intento, espera in ((1, 10), (2, 20)):
+                antes = timezone.now()
+                self.assertEqual(despachar_pendientes().fallidos, 1)
+                correo.refresh_from_db()
+                self.assertEqual((correo.estado, correo.intentos, correo.ultimo_error),
+                                 (CorreoPendiente.PENDIENTE, intento, 'smtp caido'))
+                self.assertGreaterEqual(correo.proximo_intento, antes + timedelta(seconds=espera))
+                self.assertLessEqual(correo.proximo_intento, timezone.now() + timedelta(seconds=espera))
+                self.assertFalse(CorreoPendiente.objects.pendientes().exists()) # Espera el backoff
+                CorreoPendiente.objects.update(proximo_intento=timezone.now()) # Vencer el backoff
+            despachar_pendientes()
+        correo.refresh_from_db()
+        self.assertEqual((correo.estado, correo.intentos), (CorreoPendiente.FALLIDO, 3))
+        self.assertFalse(CorreoPendiente.objects.pendientes().exists())
+
+
+class AdminBusquedaTest(TestCase):
+    """ Busqueda del changelist de usuarios """
+
+    def setUp(self):
+        limpiar_cache_autenticacion()
+        admin = User.objects.create_superuser('admin', 'admin@x.com', 'clave12345')
+        self.client.force_login(admin)
+        User.objects.create_user('aaa', 'aaa@x.com', 'clave12345', nombres='Mariana Martinez')
+        User.objects.create_user('zzz', 'zzz@x.com', 'clave12345', nombres='Mariano')
+
+    def usernames(self, **parametros):
+        """ Usernames del changelist en el orden en que se muestran """
+        respuesta = self.client.get(reverse('admin:users_user_changelist'), parametros)
+        return [usuario.username for usuario in respuesta.context['cl'].result_list]
+
+    def test_orden_por_relevancia(self):
+        """ Sin columna elegida se conserva el orden de buscar_usuarios, no el ordering del admin """
+        esperado = list(buscar_usuarios('marian').values_list('username', flat=True))
+        self.assertEqual(esperado, ['zzz', 'aaa'])
+        self.assertEqual(self.usernames(q='marian'), esperado)
+
+    def test_columna_elegida(self):
+        """ Con una columna elegida se ordena por ella """
+        self.assertEqual(self.usernames(q='marian', o='-1'), ['zzz', 'aaa'])
+        self.assertEqual(self.usernames(q='marian', o='1'), ['aaa', 'zzz'])
+
+    def test_sin_conteos_por_filtro(self):
+        """ ?_facets= no agrega los COUNT de cada opcion de los filtros """
+        respuesta = self.client.get(reverse('admin:users_user_changelist'), {'_facets': 'True'})
+        self.assertFalse(respuesta.context['cl'].add_facets)
+
+
+class VistasAsyncTest(TestCase):
+    """ Vistas async: sin consultas ni render en el event loop """
+
+    def peticion(self, ruta, usuario, **parametros):
+        """ Peticion async autenticada como usuario """
+        request = AsyncRequestFactory().get(ruta, parametros)
+        request.user = usuario
+
+        async def auser():
+            return usuario
+        request.auser = auser
+        return request
+
+    async def test_exportar_con_iterador_async(self):
+        """ La exportacion se transmite con un iterador async (bajo ASGI no se acumula en memoria) """
+        staff = await User.objects.acreate(username='staff', email='staff@x.com', is_staff=True)
+        response = await ExportarUsuariosAsyncView.as_view()(self.peticion('/users/export/', staff, formato='jsonl'))
+        self.assertTrue(response.is_async)
+        filas = [json.loads(linea) async for linea in response.streaming_content]
+        self.assertEqual([fila['username'] for fila in filas], ['staff'])
+
+    async def test_lista_por_cursor(self):
+        """ La pagina por cursor se arma fuera del event loop y la segunda sale del fragmento cacheado """
+        usuario = await User.objects.acreate(username='ana', email='ana@x.com', is_active=True)
+        for _ in range(2):
+            response = await UserListaAsync.as_view()(self.peticion('/users/lista/', usuario))
+            await sync_to_async(response.render)()
+            self.assertContains(response, 'ana@x.com')
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class FragmentosListaTest(TestCase):
+    """ Cache del fragmento de la lista de usuarios, invalidada por version """
+
+    def setUp(self):
+        limpiar_cache_autenticacion()
+        self.ana = User.objects.create_user('ana', 'ana@x.com', 'clave12345', genero='F')
+        self.client.force_login(self.ana)
+
+    def test_escritura_cambia_la_version(self):
+        """ Sin señales se sirve el fragmento cacheado; un save cambia la version con incr y la lista se vuelve a armar """
+        self.assertContains(self.client.get(reverse('users:user-list')), 'ana@x.com')
+        User.objects.filter(pk=self.ana.pk).update(email='nueva@x.com') # Sin señales: no invalida
+        self.assertContains(self.client.get(reverse('users:user-list')), 'ana@x.com')
+        version = version_lista()
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user('pepe', 'pepe@x.com', 'clave12345', genero='M')
+        self.assertEqual(version_lista(), version + 1)
+        respuesta = self.client.get(reverse('users:user-list'))
+        self.assertContains(respuesta, 'nueva@x.com')
+        self.assertContains(respuesta, 'pepe@x.com')
+
+
+class DisponibilidadTest(TestCase):
+    """ Filtro de Bloom de usernames y emails """
+
+    @override_settings(DISPONIBILIDAD_LIMITE_IP=2,
+                       CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_limite_por_ip(self):
+        """ Pasado el limite la IP recibe 429 sin consultar el filtro ni la base de datos """
+        url = reverse('users:disponible')
+        for _ in range(2):
+            self.assertEqual(self.client.get(url, {'username': 'ana'}, REMOTE_ADDR='203.0.113.9').status_code, 200)
+        with mock.patch('aplications.users.views.disponible') as disponible_:
+            respuesta = self.client.get(url, {'username': 'ana'}, REMOTE_ADDR='203.0.113.9')
+        self.assertEqual(respuesta.status_code, 429)
+        disponible_.assert_not_called()
+        self.assertEqual(self.client.get(url, {'username': 'ana'}, REMOTE_ADDR='203.0.113.10').status_code, 200)
+
+    @override_settings(DISPONIBILIDAD_REFRESCO=0, DISPONIBILIDAD_RECONSTRUCCION=3600)
+    def test_reconstruccion_completa(self):
+        """ Un id confirmado fuera de orden o un email cambiado en otro proceso aparecen al reconstruir """
+        ana = User.objects.create_user('ana', 'ana@x.com', 'clave12345')
+        User.objects.create_user('pepe', 'pepe@x.com', 'clave12345', id=ana.pk + 10)
+        construir(1000)
+        # Otro proceso, sin pasar por las señales de este: un id menor al ultimo recorrido y un UPDATE
+        User.objects.bulk_create([User(id=ana.pk + 5, username='tarde', email='tarde@x.com')])
+        User.objects.filter(pk=ana.pk).update(email='nueva@x.com')
+        self.assertTrue(disponible('username', 'tarde')) # El refresco por id no los ve
+        self.assertTrue(disponible('email', 'nueva@x.com'))
+        with override_settings(DISPONIBILIDAD_RECONSTRUCCION=0):
+            self.assertFalse(disponible('username', 'tarde'))
+            self.assertFalse(disponible('email', 'Nueva@x.com'))
+
+
+class CodigoVerificacionTest(TestCase):
+    """ CodigoVerificacion.objects.redimir """
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('ana', 'ana@x.com', 'clave12345', genero='F')
+        User.objects.eliminar_usuarios(['ana']) # Pendiente de verificacion, en el contador de inactivos
+        CodigoVerificacion.objects.emitir(self.usuario, 'ABC123')
+
+    def activo(self)-> bool:
+        """ Estado actual del usuario """
+        return User.objects.values_list('is_active', flat=True).get(pk=self.usuario.pk)
+
+    def test_un_solo_uso(self):
+        """ El codigo activa al usuario, mueve los contadores y no se puede volver a usar """
+        self.assertTrue(CodigoVerificacion.objects.redimir('ana', ' abc123'))
+        self.assertTrue(self.activo())
+        self.assertFalse(CodigoVerificacion.objects.filter(user=self.usuario).exists())
+        self.assertEqual((User.objects.contar_usuarios_activos(), User.objects.contar_usuarios_inactivos()), (1, 0))
+        self.assertFalse(CodigoVerificacion.objects.redimir('ana', 'ABC123'))
+
+    def test_expirado(self):
+        """ Un codigo expirado no activa al usuario """
+        CodigoVerificacion.objects.filter(user=self.usuario).update(expira=timezone.now())
+        self.assertFalse(CodigoVerificacion.objects.redimir('ana', 'ABC123'))
+        self.assertFalse(self.activo())
+
+    @override_settings(CODIGO_VERIFICACION_MAX_INTENTOS=3)
+    def test_limite_de_intentos(self):
+        """ Agotados los intentos ni el codigo correcto activa al usuario """
+        for _ in range(3):
+            self.assertFalse(CodigoVerificacion.objects.redimir('ana', 'ZZZ999'))
+        self.assertFalse(CodigoVerificacion.objects.redimir('ana', 'ABC123'))
+        self.assertFalse(self.activo())
+        self.assertEqual(CodigoVerificacion.objects.get(user=self.usuario).intentos, 4)
+
+
+class ContadorUsuariosTest(TestCase):
+    """ Los contadores coinciden con un COUNT(*) despues de cada escritura """
+
+    def setUp(self):
+        limpiar_cache_autenticacion()
+        self.admin = User.objects.create_superuser('admin', 'admin@x.com', 'clave12345', genero='M')
+        self.client.force_login(self.admin)
+
+    def assertContadoresExactos(self): # pylint: disable=invalid-name
+        """ reconciliar no encuentra diferencias con la tabla de usuarios """
+        self.assertEqual(ContadorUsuarios.objects.reconciliar(User.objects.all()), {})
+
+    def test_altas_y_cambios_masivos(self):
+        """ create_user, crear_usuarios, eliminar_usuarios y activar_usuarios """
+        User.objects.create_user('ana', 'ana@x.com', 'clave12345', genero='F')
+        User.objects.crear_usuarios([User(username=f'u{i}', email=f'u{i}@x.com', genero='FMO'[i % 3],
+                                          is_active=bool(i % 2)) for i in range(6)])
+        self.assertContadoresExactos()
+        User.objects.eliminar_usuarios(['ana', 'u1', 'u2', 'no-existe'], lote=2)
+        self.assertContadoresExactos()
+        User.objects.activar_usuarios(User.objects.filter(genero='O').values_list('username', flat=True))
+        self.assertContadoresExactos()
+        User.objects.eliminar_usuario('u3')
+        User.objects.activar_usuario('ana')
+        self.assertContadoresExactos()
+        self.assertEqual(User.objects.contar_usuarios(), User.objects.contar_usuarios(exacto=True))
+
+    def test_admin(self):
+        """ Guardar, eliminar y la accion de eliminar del admin """
+        ana = User.objects.create_user('ana', 'ana@x.com', 'clave12345', genero='F')
+        pepe = User.objects.create_user('pepe', 'pepe@x.com', 'clave12345', genero='M')
+        luz = User.objects.create_user('luz', 'luz@x.com', 'clave12345', genero='F')
+        respuesta = self.client.post(reverse('admin:users_user_change', args=[ana.pk]), {
+            'username': 'ana', 'email': 'ana@x.com', 'password': ana.password, 'nombres': 'Ana',
+            'apellidos': 'B', 'genero': 'O', # Cambia de genero y queda inactiva (is_active sin marcar)
+        })
+        self.assertEqual(respuesta.status_code, 302)
+        self.assertContadoresExactos()
+        self.client.post(reverse('admin:users_user_delete', args=[pepe.pk]), {'post': 'yes'})
+        self.assertContadoresExactos()
+        self.client.post(reverse('admin:users_user_changelist'),
+                         {'action': 'delete_selected', '_selected_action': [ana.pk, luz.pk], 'post': 'yes'})
+        self.assertEqual(list(User.objects.values_list('username', flat=True)), ['admin'])
+        self.assertContadoresExactos()
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_COOKIE='leer_primaria', REPLICA_LAG_TOLERANCIA=10)
+class ReplicaMiddlewareTest(SimpleTestCase):
+    """ Lecturas en la replica y cookie que fija al cliente a la primaria despues de escribir """
+
+    def peticion(self, escribe=False, **cookies):
+        """ Pasa una peticion por ReplicaMiddleware; retorna (alias de lectura, respuesta) """
+        lecturas = []
+
+        def vista(request):
+            lecturas.append(alias_lectura())
+            if escribe:
+                ReplicaRouter().db_for_write(User)
+                lecturas.append(alias_lectura())
+            return HttpResponse()
+        factory = RequestFactory()
+        factory.cookies.load(cookies)
+        return lecturas, ReplicaMiddleware(vista)(factory.get('/'))
+
+    def test_lectura_en_replica(self):
+        """ Sin escribir se lee de la replica y no se deja la cookie """
+        lecturas, respuesta = self.peticion()
+        self.assertEqual(lecturas, ['replica'])
+        self.assertNotIn('leer_primaria', respuesta.cookies)
+
+    def test_escritura_fija_la_primaria(self):
+        """ Despues de escribir, el resto de la peticion y las siguientes del cliente leen de la primaria """
+        lecturas, respuesta = self.peticion(escribe=True)
+        self.assertEqual(lecturas, ['replica', DEFAULT_DB_ALIAS])
+        self.assertEqual(respuesta.cookies['leer_primaria']['max-age'], 10)
+        lecturas, _ = self.peticion(leer_primaria='1')
+        self.assertEqual(lecturas, [DEFAULT_DB_ALIAS])
+
+    def test_fuera_de_una_peticion(self):
+        """ Comandos y workers leen de la primaria """
+        self.assertEqual(alias_lectura(), DEFAULT_DB_ALIAS)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class CacheAutenticacionTest(TestCase):
+    """ Cache del usuario autenticado (UsuarioCacheBackend) """
+
+    def test_cambio_de_contraseña_en_transaccion(self):
+        """ Lo que otra peticion guarde en la cache antes del commit se borra al confirmar """
+        limpiar_cache_autenticacion()
+        usuario = User.objects.create_user('ana', 'ana@x.com', 'clave12345')
+        self.client.force_login(usuario)
+        self.assertEqual(self.client.get(reverse('users:user-list')).status_code, 200) # Llena la cache
+        viejo = _registro(User.objects.get(pk=usuario.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                usuario.set_password('otra-clave-123')
+                usuario.save()
+                # Una peticion concurrente lee la fila sin el cambio y la vuelve a cachear
+                caches['default'].set(_clave(usuario.pk), viejo)
+        self.assertIsNone(caches['default'].get(_clave(usuario.pk)))
+        self.assertEqual(UsuarioCacheBackend().get_user(usuario.pk).get_session_auth_hash(),
+                         usuario.get_session_auth_hash())
+        self.assertEqual(self.client.get(reverse('users:user-list')).status_code, 302) # La sesion vieja ya no vale
@@ -1,15 +1,38 @@
 """ ENdpoint de urls para la aplicacion de usuarios """
 
+from django.conf import settings
 from django.urls import path
-from .views import UserRegisterView, LoginView, UserLogoutView, UserLista, UpdatePasswordView, VerificarCodigoView
+from .views import UserRegisterView, LoginView, UserLogoutView, UserLista, UpdatePasswordView, VerificarCodigoView, ExportarUsuariosView
+from .views import DisponibilidadView
+from .views import UserRegisterAsyncView, LoginAsyncView, UserLogoutAsyncView, UserListaAsync, VerificarCodigoAsyncView
+from .views import ExportarUsuariosAsyncView
 
 app_name = 'users'
 
-urlpatterns = [
+# Vistas comunes a los dos despliegues
+urlpatterns_comunes = [
+    path('update-password/', UpdatePasswordView.as_view(), name='update-password'),
+    path('disponible/', DisponibilidadView.as_view(), name='disponible'),
+]
+
+# Despliegue WSGI (usuarios.wsgi)
+urlpatterns_sync = [
     path('register/', UserRegisterView.as_view(), name='register'),
     path('login/', LoginView.as_view(), name='login'),
     path('logout/', UserLogoutView.as_view(), name='logout'),
     path('lista/', UserLista.as_view(), name='user-list'),
-    path('update-password/', UpdatePasswordView.as_view(), name='update-password'),
     path('verificar-codigo/', VerificarCodigoView.as_view(), name='verificar-codigo'),
-]
+    path('export/', ExportarUsuariosView.as_view(), name='user-export'),
+] + urlpatterns_comunes
+
+# Despliegue ASGI (usuarios.asgi): sin el adaptador sync -> async por peticion
+urlpatterns_async = [
+    path('register/', UserRegisterAsyncView.as_view(), name='register'),
+    path('login/', LoginAsyncView.as_view(), name='login'),
+    path('logout/', UserLogoutAsyncView.as_view(), name='logout'),
+    path('lista/', UserListaAsync.as_view(), name='user-list'),
+    path('verificar-codigo/', VerificarCodigoAsyncView.as_view(), name='verificar-codigo'),
+    path('export/', ExportarUsuariosAsyncView.as_view(), name='user-export'),
+] + urlpatterns_comunes
+
+urlpatterns = urlpatterns_async if settings.VISTAS_ASYNC else urlpatterns_sync
@@ -1,23 +1,41 @@
 """" Views de la aplicacion users """
 
-from django.core.mail import send_mail # Importar la función para enviar correos
+from asgiref.sync import sync_to_async # Importar sync_to_async para el codigo sincronico en vistas async
+from django.db import IntegrityError, transaction # Importar transaction para guardar usuario y correo juntos
 from django.views.generic.edit import FormView # Importar la vista genérica edicion FormView
 from django.views.generic import ListView # Importar la vista genérica ListView
 from django.views import View # Importar la vista genérica View
-from django.contrib.auth.mixins import LoginRequiredMixin # Importar el mixin para requerir login
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin # Importar los mixins de acceso
+from django.http import StreamingHttpResponse, HttpResponseRedirect, JsonResponse # Importar las respuestas
 # Importar las funciones de autenticación
 from django.contrib.auth import (login, logout) # Importar las funciones para login y logout
+from django.contrib.auth import (aauthenticate, alogin, alogout) # Versiones async para las vistas async
+from django.contrib.auth.views import redirect_to_login # Importar la redireccion al login
+from django.core.exceptions import PermissionDenied # Importar el error de permisos
 from django.contrib.auth.forms import AuthenticationForm # Importar el formulario de autenticación
 from django.shortcuts import redirect # Importar la función para redirigir
+from django.template.loader import render_to_string # Importar el render de fragmentos
 from django.urls import reverse_lazy # Importar reverse_lazy para redirecciones perezosas
 from usuarios.settings.base import get_secret # Importar la función get_secret para obtener secretos
-from .models import User # Importar el modelo User
+from .models import User, CodigoVerificacion, ContadorUsuarios # Importar los modelos
 # Importar los formularios
 from .forms import (UserRegisterForm,
                     # UserLoginForm,
                     UpdatePasswordForm,
-                    CodigoVerificacionForm)
+                    CodigoVerificacionForm,
+                    LoginAsyncForm)
 from .processor import code_generator # Importar la función para generar códigos aleatorios
+from .correos import encolar_codigo_verificador # Importar la función para encolar el correo verificador
+from .limitador import verificar_login, registrar_intento, limpiar_usuario, ip_cliente # Limite de logins
+from .limitador import limitar_disponibilidad # Limite de consultas de disponibilidad por IP
+from .busqueda import buscar_usuarios # Importar la busqueda de usuarios
+from .paginacion import PaginadorEstimado # Total estimado en tablas grandes
+from .exportar import filas_usuarios, exportar_csv, exportar_jsonl, convertir_booleano # Exportacion en streaming
+from .exportar import afilas_usuarios, aexportar_csv, aexportar_jsonl # Exportacion con iteradores async
+from .disponibilidad import CAMPOS_DISPONIBILIDAD, disponible # Filtro de Bloom de usernames y emails
+# Cache de fragmentos de la lista
+from .fragmentos import (FRAGMENTO_LISTA, clave_fragmento, version_lista, rol_usuario, leer_fragmento,
+                         guardar_fragmento, aversion_lista, aleer_fragmento, aguardar_fragmento)
 
 # Create your views here.
 
@@ -32,23 +50,34 @@ class UserRegisterView(FormView):
 
     def form_valid(self, form):
         """ Si el formulario es valido, guardar el usuario """
-        user = form.save(commit=False) # Crear el usuario sin guardar
-        user.set_password(form.cleaned_data['password']) # Establecer la contraseña hasheada
-        user.is_active = False # Desactivar el usuario hasta que verifique su correo
-        codigo = code_generator() # Generar un codigo verificador
-        user.codigo_verificador = codigo # Asignar el codigo verificador al usuario
-        user.save() # Guardar el usuario
-        # Enviar correo con el codigo verificador
-        send_mail(
-            'Codigo Verificador', # Asunto del correo
-            f'Tu codigo verificador es: {codigo}', # Mensaje del correo
-            get_secret('EMAIL_HOST_USER'), # Correo remitente
-            [user.email], # Correo destinatario
-            fail_silently=False, # No fallar silenciosamente
-        )
+        if self.registrar(form) is None: # Username o correo ya en uso
+            return self.form_invalid(form)
         # Redirigir a la verificacion de codigo
         return super(UserRegisterView, self).form_valid(form)
 
+    def registrar(self, form):
+        """Guarda el usuario inactivo, el hash de su codigo y encola el correo en una transaccion.
+
+        La unicidad de username y email no se consulta antes: si el INSERT la viola se
+        revierte la transaccion, el error queda en el formulario y se retorna None.
+        """
+        user = form.save(commit=False) # Crear el usuario sin guardar, ya con la contraseña hasheada
+        user.is_active = False # Desactivar el usuario hasta que verifique su correo
+        codigo = code_generator() # Generar un codigo verificador
+        # Guardar el usuario y encolar el correo en la misma transaccion,
+        # el worker enviar_correos se encarga del envio por SMTP
+        try:
+            with transaction.atomic():
+                user.save() # Guardar el usuario
+                ContadorUsuarios.objects.ajustar(user.is_active, user.genero, 1) # Sumar el usuario a su contador
+                CodigoVerificacion.objects.emitir(user, codigo) # Guardar el hash del codigo con su expiracion
+                encolar_codigo_verificador(user, codigo, get_secret('EMAIL_HOST_USER'))
+        except IntegrityError as error:
+            if not form.agregar_error_unicidad(error): # Otra restriccion: es un error real
+                raise
+            return None
+        return user
+
 
 class VerificarCodigoView(FormView):
     """ Vista para verificar el codigo de verificacion """
@@ -60,13 +89,12 @@ class VerificarCodigoView(FormView):
 
     def form_valid(self, form):
         """ Si el formulario es valido, verificar el codigo """
-        # Recuperamos el usuario validado desde el formulario
         username = form.cleaned_data['username'] # Obtener el nombre de usuario ejemplo: Usuario123
-        usuario = User.objects.get(username=username) # Obtener el usuario por su nombre de usuario
-
-        # Activamos el usuario
-        usuario.is_active = True
-        usuario.save() # Guardar los cambios en el usuario
+        codigo = form.cleaned_data['codigo_verificador'] # Obtener el codigo ingresado
+        # Activamos el usuario solo si el codigo coincide y sigue vigente (un solo UPDATE)
+        if not CodigoVerificacion.objects.redimir(username, codigo):
+            form.add_error('codigo_verificador', 'El código de verificación es incorrecto o expiró.')
+            return self.form_invalid(form)
         # Redirigir al login
         return super(VerificarCodigoView, self).form_valid(form)
 
@@ -78,11 +106,26 @@ class LoginView(FormView):
     form_class = AuthenticationForm # Formulario de autenticacion
     success_url = reverse_lazy('home:home') # Redirigir a la pagina principal despues del login
 
+    def post(self, request, *args, **kwargs):
+        """ Rechazar el intento antes de validar el formulario (y hashear) si se supero el limite """
+        ip = ip_cliente(request) # IP del cliente
+        username = request.POST.get('username', '') # Usuario enviado, sin consultar la base de datos
+        motivo = verificar_login(ip, username)
+        if motivo:
+            # Formulario sin datos: renderizar uno con datos ejecutaria la autenticacion
+            context = self.get_context_data(form=self.form_class(request),
+                                            error_limite='Demasiados intentos de inicio de sesión. '
+                                                         'Intente nuevamente en unos minutos.')
+            return self.render_to_response(context, status=429)
+        registrar_intento(ip, username) # Contar el intento antes de hashear
+        return super().post(request, *args, **kwargs)
+
     def form_valid(self, form):
         """ Si el formulario es valido, autenticar y loguear al usuario """
 
         user = form.get_user()  # El usuario ya viene autenticado
         login(self.request, user) # Loguear al usuario
+        limpiar_usuario(user.get_username()) # Reiniciar el contador del usuario
         return super().form_valid(form) # Redirigir a la pagina principal
 
 
@@ -96,12 +139,19 @@ class UserLogoutView(View):
 
 
 class UserLista(LoginRequiredMixin, ListView):
-    """ Vista para listar los usuarios """
+    """ Vista para listar los usuarios
+
+    Por defecto pagina por cursor (?after=<username> / ?before=<username>) sobre el
+    indice unico de username, sin COUNT(*). Con ?page=N usa la paginacion por OFFSET,
+    con el total estimado por el planner en tablas grandes.
+    Con ?q=texto busca por subcadena y ordena por relevancia.
+    La lista renderizada se cachea por parametros y rol; un acierto no consulta la tabla.
+    """
 
     login_url = reverse_lazy('users:login') # Redirigir al login si no esta autenticado
     model = User # Modelo de usuario
-    queryset = User.objects.listar_usuarios() # Queryset de usuarios
     template_name = 'users/user_list.html' # Template para listar los usuarios
+    template_fragmento = 'users/user_list_fragmento.html' # Lista y paginacion, cacheadas
     context_object_name = 'users' # Nombre del contexto para los usuarios
     paginate_by = 10 # Paginacion de 10 usuarios por pagina
     ordering = ['username'] # Ordenar por nombre de usuario
@@ -109,12 +159,71 @@ class UserLista(LoginRequiredMixin, ListView):
     allow_empty = True # Permitir lista vacia
     page_kwarg = 'page' # Nombre del parametro de pagina
     paginate_orphans = 0 # Numero de objetos huérfanos permitidos en la última página
+    paginator_class = PaginadorEstimado # ?page=N sin COUNT(*) sobre tablas grandes
     extra_context = {'title': 'Lista de Usuarios'} # Contexto extra para el template
 
+    def busqueda(self):
+        """ Texto buscado en ?q= """
+        return self.request.GET.get('q', '').strip()
+
+    def modo_cursor(self):
+        """ Indica si la peticion usa paginacion por cursor """
+        return self.page_kwarg not in self.request.GET and not self.busqueda()
 
     def get_queryset(self):
-        """ Retorna el queryset de usuarios """
-        return self.queryset # Retornar el queryset de usuarios
+        """ Retorna un queryset nuevo de usuarios por cada peticion """
+        if self.busqueda(): # Resultados ordenados por relevancia
+            return buscar_usuarios(self.busqueda(), User.objects.listar_usuarios())
+        return User.objects.listar_usuarios().order_by(*self.ordering) # Retornar el queryset de usuarios
+
+    def clave_lista(self, usuario, version):
+        """ Clave del fragmento: version de la lista, rol y parametros de pagina o cursor """
+        parametros = [self.request.GET.get(p, '') for p in ('q', self.page_kwarg, 'after', 'before')]
+        return clave_fragmento(FRAGMENTO_LISTA, version, rol_usuario(usuario), *parametros)
+
+    def cursor(self):
+        """ Parametros de la pagina por cursor """
+        return {
+            'after': self.request.GET.get('after'), # Username despues del cual empieza la pagina
+            'before': self.request.GET.get('before'), # Username antes del cual termina la pagina
+            'cantidad': self.paginate_by,
+        }
+
+    def respuesta_cacheada(self, lista_html):
+        """ Respuesta con el fragmento cacheado: solo se renderiza base.html a su alrededor """
+        self.object_list = [] # Sin consulta; la lista ya esta en el fragmento
+        return self.render_to_response({'view': self, 'q': self.busqueda(), 'lista_html': lista_html,
+                                        **self.extra_context})
+
+    def respuesta_cursor(self, usuarios, anterior, siguiente):
+        """ Respuesta de una pagina por cursor ya leida """
+        self.object_list = usuarios
+        context = self.get_context_data(cursor_anterior=anterior, cursor_siguiente=siguiente)
+        return self.render_to_response(context)
+
+    def get_context_data(self, **kwargs):
+        """ Agregar el texto buscado al contexto y renderizar el fragmento de la lista """
+        kwargs.setdefault('q', self.busqueda())
+        context = super().get_context_data(**kwargs)
+        context['lista_html'] = render_to_string(self.template_fragmento, context, self.request)
+        return context
+
+    def get_paginate_by(self, queryset):
+        """ La paginacion por OFFSET solo se usa con ?page=N """
+        return None if self.modo_cursor() else self.paginate_by
+
+    def get(self, request, *args, **kwargs):
+        """ Listar usuarios por cursor o por OFFSET segun los parametros """
+        self.clave = self.clave_lista(request.user, version_lista())
+        lista_html = leer_fragmento(self.clave)
+        if lista_html is not None: # Acierto de la cache de fragmentos
+            return self.respuesta_cacheada(lista_html)
+        if not self.modo_cursor():
+            response = super().get(request, *args, **kwargs)
+        else: # Pagina por cursor: solo se leen paginate_by + 1 filas, sin COUNT(*)
+            response = self.respuesta_cursor(*User.objects.pagina_por_username(**self.cursor()))
+        guardar_fragmento(self.clave, response.context_data['lista_html'])
+        return response
 
 
 class UpdatePasswordView(LoginRequiredMixin, FormView):
@@ -145,3 +254,201 @@ class UpdatePasswordView(LoginRequiredMixin, FormView):
 
         return super().form_valid(form) # Redirigir a la pagina principal
 
+
+class ExportarUsuariosView(LoginRequiredMixin, UserPassesTestMixin, View):
+    """ Vista para exportar el directorio de usuarios en streaming (solo staff)
+
+    Parametros: ?formato=csv|jsonl, ?is_active=true|false, ?genero=M|F|O
+    """
+
+    login_url = reverse_lazy('users:login') # Redirigir al login si no esta autenticado
+
+    def test_func(self):
+        """ Solo el staff puede exportar usuarios """
+        return self.request.user.is_staff
+
+    def filtros(self):
+        """ Filtros de la exportacion tomados de los parametros """
+        return {'is_active': convertir_booleano(self.request.GET.get('is_active')),
+                'genero': self.request.GET.get('genero') or None}
+
+    def respuesta(self, filas, csv, jsonl):
+        """ StreamingHttpResponse con las lineas que genera csv(filas) o jsonl(filas) segun ?formato= """
+        if self.request.GET.get('formato') == 'jsonl':
+            response = StreamingHttpResponse(jsonl(filas), content_type='application/x-ndjson')
+            formato = 'jsonl'
+        else:
+            response = StreamingHttpResponse(csv(filas), content_type='text/csv')
+            formato = 'csv'
+        response['Content-Disposition'] = f'attachment; filename="usuarios.{formato}"'
+        return response
+
+    def get(self, request):
+        """ Exportar los usuarios sin cargarlos en memoria """
+        return self.respuesta(filas_usuarios(**self.filtros()), exportar_csv, exportar_jsonl)
+
+
+class DisponibilidadView(View):
+    """ Vista JSON para consultar si un username o email esta libre mientras se llena el registro
+
+    Parametros: ?username=... o ?email=... (uno solo por consulta). Cada IP tiene
+    DISPONIBILIDAD_LIMITE_IP consultas por ventana del limitador de logins.
+    """
+
+    http_method_names = ['get']
+
+    def get(self, request):
+        """ Consultar el filtro de Bloom y, solo si probablemente esta ocupado, la base de datos """
+        if limitar_disponibilidad(ip_cliente(request)):
+            return JsonResponse({'error': 'Demasiadas consultas, intente mas tarde.'}, status=429)
+        campos = [campo for campo in CAMPOS_DISPONIBILIDAD if campo in request.GET]
+        if len(campos) != 1:
+            return JsonResponse({'error': 'Indique username o email.'}, status=400)
+        campo = campos[0]
+        valor = request.GET[campo].strip()
+        if not valor or len(valor) > User._meta.get_field(campo).max_length: # Nunca podria registrarse
+            return JsonResponse({'error': f'El {campo} no es valido.'}, status=400)
+        return JsonResponse({'campo': campo, 'valor': valor, 'disponible': disponible(campo, valor)})
+
+
+# Vistas async para el despliegue ASGI (VISTAS_ASYNC = True).
+# Reutilizan templates, formularios y urls de las vistas sincronicas; lo que no tiene
+# API async en Django (validacion de formularios con consultas, transacciones) corre en
+# sync_to_async. El correo no bloquea: solo se encola y lo envia el worker enviar_correos.
+
+
+class UserRegisterAsyncView(UserRegisterView):
+    """ Vista async para el registro de usuarios """
+
+    http_method_names = ['get', 'post'] # Sin el put sincronico de FormView
+
+    async def get(self, request, *args, **kwargs):
+        """ Mostrar el formulario vacio """
+        return self.render_to_response(self.get_context_data())
+
+    async def post(self, request, *args, **kwargs):
+        """ Validar y registrar; la validacion no consulta la base de datos """
+        form = self.get_form()
+        if not form.is_valid():
+            return self.form_invalid(form)
+        if await sync_to_async(self.registrar)(form) is None: # Una transaccion: usuario, codigo y correo
+            return self.form_invalid(form)
+        return HttpResponseRedirect(self.get_success_url())
+
+
+class VerificarCodigoAsyncView(VerificarCodigoView):
+    """ Vista async para verificar el codigo de verificacion """
+
+    http_method_names = ['get', 'post']
+
+    async def get(self, request, *args, **kwargs):
+        """ Mostrar el formulario vacio """
+        return self.render_to_response(self.get_context_data())
+
+    async def post(self, request, *args, **kwargs):
+        """ Activar al usuario con un solo UPDATE condicional """
+        form = self.get_form()
+        if not form.is_valid(): # El formulario no consulta la base de datos
+            return self.form_invalid(form)
+        redimido = await sync_to_async(CodigoVerificacion.objects.redimir)(
+            form.cleaned_data['username'], form.cleaned_data['codigo_verificador'])
+        if not redimido:
+            form.add_error('codigo_verificador', 'El código de verificación es incorrecto o expiró.')
+            return self.form_invalid(form)
+        return HttpResponseRedirect(self.get_success_url())
+
+
+class LoginAsyncView(LoginView):
+    """ Vista async para el login; el hash se verifica fuera del hilo de las consultas """
+
+    http_method_names = ['get', 'post']
+
+    async def get(self, request, *args, **kwargs):
+        """ Mostrar el formulario vacio """
+        return self.render_to_response(self.get_context_data())
+
+    async def post(self, request, *args, **kwargs):
+        """ Limite de intentos, aauthenticate y alogin """
+        ip = ip_cliente(request) # IP del cliente
+        username = request.POST.get('username', '') # Usuario enviado, sin consultar la base de datos
+        if await sync_to_async(verificar_login)(ip, username):
+            context = self.get_context_data(form=self.form_class(request),
+                                            error_limite='Demasiados intentos de inicio de sesión. '
+                                                         'Intente nuevamente en unos minutos.')
+            return self.render_to_response(context, status=429)
+        await sync_to_async(registrar_intento)(ip, username) # Contar el intento antes de hashear
+
+        password = request.POST.get('password', '')
+        usuario = None
+        if username and password:
+            # aget_by_natural_key y acheck_password: el hasher corre en un hilo aparte
+            usuario = await aauthenticate(request, username=username, password=password)
+        form = LoginAsyncForm(request, usuario=usuario, **self.get_form_kwargs())
+        if not form.is_valid():
+            return self.form_invalid(form)
+        await alogin(request, form.get_user()) # Loguear al usuario
+        await sync_to_async(limpiar_usuario)(form.get_user().get_username()) # Reiniciar el contador
+        return HttpResponseRedirect(self.get_success_url())
+
+
+class UserLogoutAsyncView(View):
+    """ Vista async para el logout de usuarios """
+
+    async def get(self, request):
+        """ Cerrar sesion del usuario """
+        await alogout(request) # Cerrar sesion del usuario
+        return redirect('home:home') # Redirigir a la pagina principal
+
+
+class UserListaAsync(UserLista):
+    """ Vista async para listar los usuarios con la cache de fragmentos y el cursor async """
+
+    http_method_names = ['get']
+
+    async def dispatch(self, request, *args, **kwargs):
+        """ LoginRequiredMixin con request.auser(); request.user cargaria la sesion de forma sincronica """
+        self.usuario = await request.auser()
+        if not self.usuario.is_authenticated:
+            return redirect_to_login(request.get_full_path(), self.get_login_url(), self.get_redirect_field_name())
+        return await View.dispatch(self, request, *args, **kwargs)
+
+    async def get(self, request, *args, **kwargs):
+        """ Listar usuarios por cursor (ORM async) o por OFFSET (paginator sincronico)
+
+        El contexto y el fragmento se arman en sync_to_async: el render corre los context
+        processors, que pueden leer la sesion o la base de datos.
+        """
+        self.clave = self.clave_lista(self.usuario, await aversion_lista())
+        lista_html = await aleer_fragmento(self.clave)
+        if lista_html is not None: # Acierto de la cache de fragmentos
+            return self.respuesta_cacheada(lista_html)
+        if not self.modo_cursor(): # El Paginator cuenta y corta el queryset de forma sincronica
+            response = await sync_to_async(ListView.get)(self, request, *args, **kwargs)
+        else:
+            pagina = await User.objects.apagina_por_username(**self.cursor())
+            response = await sync_to_async(self.respuesta_cursor)(*pagina)
+        await aguardar_fragmento(self.clave, response.context_data['lista_html'])
+        return response
+
+
+class ExportarUsuariosAsyncView(ExportarUsuariosView):
+    """ Vista async para exportar usuarios: StreamingHttpResponse con iteradores async
+
+    Con un iterador sincronico, StreamingHttpResponse bajo ASGI lo consume completo
+    antes de enviar la primera linea.
+    """
+
+    http_method_names = ['get']
+
+    async def dispatch(self, request, *args, **kwargs):
+        """ Login y staff con request.auser(), como UserListaAsync """
+        self.usuario = await request.auser()
+        if not self.usuario.is_authenticated:
+            return redirect_to_login(request.get_full_path(), self.get_login_url(), self.get_redirect_field_name())
+        if not self.usuario.is_staff:
+            raise PermissionDenied(self.get_permission_denied_message())
+        return await View.dispatch(self, request, *args, **kwargs)
+
+    async def get(self, request):
+        """ Exportar los usuarios con aiterator, sin cargarlos en memoria """
+        return self.respuesta(afilas_usuarios(**self.filtros()), aexportar_csv, aexportar_jsonl)
@@ -0,0 +1,34 @@
+""" Configuracion de gunicorn para produccion: precarga la app antes de crear los workers
+
+Uso:
+    DJANGO_SETTINGS_MODULE=usuarios.settings.produ gunicorn usuarios.wsgi
+"""
+
+import multiprocessing
+
+wsgi_app = 'usuarios.wsgi:application'
+bind = '0.0.0.0:8000'
+workers = multiprocessing.cpu_count() * 2 + 1
+# Importar usuarios.wsgi una vez en el master (settings, secrets.json, templates y urls);
+# cada worker hereda todo por fork en lugar de repetirlo
+preload_app = True
+
+
+def when_ready(server):
+    """ Construye el filtro de disponibilidad en el master, para que los workers lo hereden """
+    from aplications.home.calentamiento import cerrar_conexiones
+    from aplications.users.disponibilidad import construir
+
+    estadisticas = construir().estadisticas()
+    cerrar_conexiones() # Ninguna conexion ni pool debe cruzar el fork
+    server.log.info('Filtro de disponibilidad: %s elementos, %s bytes, %.4f falsos positivos estimados',
+                    estadisticas['elementos'], estadisticas['bytes'], estadisticas['falsos_positivos'])
+
+
+def post_fork(server, worker):
+    """ Abre las conexiones (el pool de psycopg) en el worker, nunca antes del fork """
+    from aplications.home.calentamiento import abrir_conexiones
+
+    tiempos = abrir_conexiones()
+    server.log.info('Worker %s con conexiones abiertas: %s', worker.pid,
+                    ', '.join(f'{alias} {ms:.1f}ms' for alias, ms in tiempos.items()))
@@ -11,6 +11,12 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'usuarios.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'usuarios.settings.local')
 
 application = get_asgi_application()
+
+# Se importa despues de get_*_application, que ya ejecuto django.setup()
+from aplications.home.calentamiento import precargar
+
+# Templates y urls listos antes del fork (gunicorn --preload); las conexiones se abren en post_fork
+precargar()
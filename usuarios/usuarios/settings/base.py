@@ -52,6 +52,8 @@ THIRD_PARTY_APPS = []
 INSTALLED_APPS = DJANGO_APPS + LOCAL_APPS + THIRD_PARTY_APPS
 
 MIDDLEWARE = [
+    'aplications.home.middleware.MetricasMiddleware', # Primero para medir la peticion completa
+    'aplications.users.middleware.ReplicaMiddleware', # Lecturas en replicas salvo despues de escribir
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -81,6 +83,15 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'usuarios.wsgi.application'
 
+# Replicas de lectura (aplications.users.routers); alias de DATABASES solo de lectura
+DATABASE_ROUTERS = ['aplications.users.routers.ReplicaRouter']
+DATABASE_REPLICAS = [] # Sin replicas todo se lee de la primaria
+REPLICA_LAG_TOLERANCIA = 5 # Segundos que un cliente que escribio sigue leyendo de la primaria
+REPLICA_COOKIE = 'leer_primaria' # Cookie que fija al cliente a la primaria
+
+# Vistas async de users (aplications.users.urls); activar al desplegar con usuarios.asgi
+VISTAS_ASYNC = False
+
 
 
 # Password validation
@@ -103,6 +114,20 @@ AUTH_PASSWORD_VALIDATORS = [
 
 AUTH_USER_MODEL = 'users.User'
 
+# Hashers con factor de trabajo configurable (python manage.py tune_hashers).
+# El primero se usa para hashear; los hashes con otro factor se actualizan al iniciar sesion.
+PASSWORD_HASHERS = [
+    'aplications.users.hashers.PBKDF2AjustadoHasher',
+    'aplications.users.hashers.Argon2AjustadoHasher',
+    'aplications.users.hashers.ScryptAjustadoHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+HASHER_PBKDF2_ITERACIONES = None # None usa las iteraciones por defecto de Django
+HASHER_ARGON2_TIME_COST = None
+HASHER_ARGON2_MEMORY_COST = None
+HASHER_SCRYPT_WORK_FACTOR = None
+
 # Internationalization
 # https://docs.djangoproject.com/en/6.0/topics/i18n/
 
@@ -123,3 +148,62 @@ EMAIL_HOST_USER = get_secret('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = get_secret('EMAIL_HOST_PASSWORD')
 
 
+# Outbox de correos (python manage.py enviar_correos)
+CORREOS_LOTE = 50 # Correos reservados por ciclo y enviados por una misma conexion SMTP
+CORREOS_FLUSH = 2 # Segundos maximos que un correo espera a que se complete un lote
+CORREOS_BLOQUEO = 300 # Segundos que un correo queda reservado por un worker
+CORREOS_MAX_INTENTOS = 5 # Intentos antes de marcar un correo como fallido
+CORREOS_BACKOFF = 30 # Segundos base del backoff exponencial entre intentos
+
+# Hash de contraseñas en paralelo (aplications.users.hashing)
+HASH_WORKERS = None # Procesos del pool de hashing, None usa todos los nucleos
+
+# Busqueda de usuarios (aplications.users.busqueda)
+BUSQUEDA_LIMITE = 1000 # Maximo de resultados ordenados por relevancia en SQLite
+
+# Codigos de verificacion (aplications.users.models.CodigoVerificacion)
+CODIGO_VERIFICACION_TTL = 60 * 60 * 24 # Segundos de vigencia de un codigo
+CODIGO_VERIFICACION_MAX_INTENTOS = 5 # Intentos fallidos antes de invalidar el codigo
+
+# Limite de intentos de login (aplications.users.limitador)
+LOGIN_LIMITE_CACHE = 'default' # Alias de CACHES donde se guardan los contadores
+LOGIN_LIMITE_VENTANA = 60 # Segundos de la ventana deslizante
+LOGIN_LIMITE_IP = 20 # Intentos por IP dentro de la ventana
+LOGIN_LIMITE_USUARIO = 5 # Intentos por username dentro de la ventana
+LOGIN_LIMITE_IP_HEADER = 'REMOTE_ADDR' # Usar 'HTTP_X_FORWARDED_FOR' detras de un proxy confiable
+LOGIN_LIMITE_PROXIES = 1 # Proxies confiables que agregan una IP a X-Forwarded-For (se toma la de ese salto)
+
+# Cache del usuario autenticado (aplications.users.backends)
+AUTHENTICATION_BACKENDS = ['aplications.users.backends.UsuarioCacheBackend']
+AUTH_CACHE = 'default' # Alias de CACHES compartido entre procesos
+AUTH_CACHE_TIMEOUT = 300 # Segundos en la cache compartida
+AUTH_CACHE_LOCAL_TIMEOUT = 5 # Segundos en la cache local de cada proceso
+AUTH_CACHE_LOCAL_MAX = 10000 # Usuarios maximos en la cache local
+
+# Cache de fragmentos de paginas (aplications.users.fragmentos)
+FRAGMENTOS_CACHE = 'default' # Alias de CACHES donde se guardan los fragmentos
+FRAGMENTOS_TIMEOUT = 600 # Segundos de vida de un fragmento; las escrituras lo invalidan antes
+
+# Sesiones (aplications.users.sesiones); tambien se puede usar
+# 'django.contrib.sessions.backends.cached_db' o 'django.contrib.sessions.backends.db'
+SESSION_ENGINE = 'aplications.users.sesiones' # Cookie firmada sin login, cached_db con login
+SESSION_CACHE_ALIAS = 'default' # Alias de CACHES de las sesiones con login
+SESIONES_LOTE = 1000 # Sesiones expiradas por DELETE en limpiar_sesiones y clearsessions
+SESIONES_PAUSA = 0.05 # Segundos entre lotes de la limpieza
+
+# Paginacion con total estimado (aplications.users.paginacion)
+PAGINACION_UMBRAL = 100000 # Filas estimadas desde las que no se hace COUNT(*) (solo PostgreSQL)
+
+# Disponibilidad de username y email (aplications.users.disponibilidad)
+DISPONIBILIDAD_CAPACIDAD = 1000000 # Usernames + emails esperados; con 1% de falsos positivos ocupa ~1.2 MB por proceso
+DISPONIBILIDAD_FALSOS_POSITIVOS = 0.01 # Tasa de falsos positivos con la capacidad llena
+DISPONIBILIDAD_REFRESCO = 30 # Segundos entre recorridos de los usuarios creados por otros procesos
+DISPONIBILIDAD_RECONSTRUCCION = 600 # Segundos entre reconstrucciones completas (ids fuera de orden, emails cambiados)
+DISPONIBILIDAD_LIMITE_IP = 30 # Consultas por IP dentro de LOGIN_LIMITE_VENTANA
+
+# Instrumentacion por peticion (aplications.home.middleware)
+METRICAS_NAMESPACES = ('users', 'home') # Namespaces de url que se miden
+METRICAS_CACHE = 'default' # Alias de CACHES donde se suman las metricas de todos los procesos
+METRICAS_VOLCADO = 5 # Segundos entre volcados de las metricas de cada proceso a la cache
+METRICAS_SERVER_TIMING = True # Agregar la cabecera Server-Timing a las respuestas
+METRICAS_IPS = ['127.0.0.1', '::1'] # IPs de cliente (ver LOGIN_LIMITE_IP_HEADER) que pueden leer /metrics
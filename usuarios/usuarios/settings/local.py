@@ -22,6 +22,9 @@ DATABASES = {
 
     }
 }
+# Replica local: la misma base con otra conexion, para probar el router sin replicacion real
+DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+DATABASE_REPLICAS = ['replica']
 
 # Static files (CSS, JavaScript, Images)
 # https://docs.djangoproject.com/en/6.0/howto/static-files/
@@ -0,0 +1,84 @@
+""" Archivo de configuración para entorno de produccion """
+
+
+from .base import *
+
+DEBUG = False
+
+ALLOWED_HOSTS = get_secret("allowed_hosts") # Lista de dominios del sitio
+
+# Database
+# https://docs.djangoproject.com/en/6.0/ref/settings/#databases
+
+# Pool de conexiones de psycopg 3: cada worker reutiliza conexiones abiertas en vez
+# de pagar el handshake TCP/TLS y la autenticacion de PostgreSQL en cada peticion.
+# Con el pool CONN_MAX_AGE debe quedar en 0 (la conexion vuelve al pool al terminar).
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': get_secret("db_name"),
+        'USER': get_secret("user"),
+        'PASSWORD': get_secret("db_password"),
+        'HOST': get_secret("db_host"),
+        'PORT': get_secret("db_port"),
+        'CONN_MAX_AGE': 0,
+        'CONN_HEALTH_CHECKS': True, # Con pool, Django pasa check=ConnectionPool.check_connection al pool
+        'OPTIONS': {
+            'pool': {
+                'min_size': 2, # Conexiones abiertas por worker aunque no haya trafico
+                'max_size': 10, # Tope por worker: workers * max_size <= max_connections
+                'timeout': 10, # Segundos esperando una conexion libre antes de fallar
+                'max_idle': 300, # Cerrar conexiones ociosas pasado este tiempo
+            },
+        },
+    }
+}
+# Sin pool (p. ej. detras de PgBouncer en modo transaccion) usar conexiones persistentes:
+# DATABASES['default'].pop('OPTIONS'); DATABASES['default']['CONN_MAX_AGE'] = 600
+
+# Replicas de lectura: misma configuracion con otro host (secreto "db_replicas", lista de hosts)
+for i, host in enumerate(get_secret("db_replicas")):
+    DATABASES[f'replica{i}'] = {**DATABASES['default'], 'HOST': host}
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+REPLICA_LAG_TOLERANCIA = 10 # Mayor que el retraso de replicacion observado
+
+# Cache compartida entre procesos: limite de login y cache del usuario autenticado
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': get_secret("cache_location"), # redis://host:6379/0
+        'TIMEOUT': 300,
+    }
+}
+
+# Templates compilados una sola vez por proceso
+TEMPLATES[0]['APP_DIRS'] = False
+TEMPLATES[0]['OPTIONS']['loaders'] = [
+    ('django.template.loaders.cached.Loader', [
+        'django.template.loaders.filesystem.Loader',
+        'django.template.loaders.app_directories.Loader',
+    ]),
+]
+
+# Seguridad (python manage.py check --deploy)
+SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https') # TLS terminado en el proxy
+# Detras del proxy REMOTE_ADDR es el proxy: la IP del cliente es la que el proxy agrega a X-Forwarded-For
+LOGIN_LIMITE_IP_HEADER = 'HTTP_X_FORWARDED_FOR'
+LOGIN_LIMITE_PROXIES = 1 # Un solo proxy (nginx) delante de gunicorn
+SECURE_SSL_REDIRECT = True
+SECURE_HSTS_SECONDS = 60 * 60 * 24 * 365
+SECURE_HSTS_INCLUDE_SUBDOMAINS = True
+SECURE_CONTENT_TYPE_NOSNIFF = True
+SESSION_COOKIE_SECURE = True
+CSRF_COOKIE_SECURE = True
+X_FRAME_OPTIONS = 'DENY'
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/6.0/howto/static-files/
+
+STATIC_URL = 'static/'
+STATICFILES_DIRS = [BASE_DIR / 'static']
+STATIC_ROOT = BASE_DIR / 'staticfiles' # python manage.py collectstatic
+
+MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
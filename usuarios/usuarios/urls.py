@@ -5,9 +5,11 @@ from django.contrib import admin
 from django.urls import path, include
 from aplications.users import urls
 from aplications.home import urls as home_urls
+from aplications.home.views import MetricasView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', MetricasView.as_view(), name='metrics'), # Scrape de Prometheus
     path('users/', include(urls, namespace='users')),
     path('', include(home_urls, namespace='home')),
 ]
@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'usuarios.settings.local')
 
 application = get_wsgi_application()
+
+# Se importa despues de get_*_application, que ya ejecuto django.setup()
+from aplications.home.calentamiento import precargar
+
+# Templates y urls listos antes del fork (gunicorn --preload); las conexiones se abren en post_fork
+precargar()